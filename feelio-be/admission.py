@@ -0,0 +1,400 @@
+"""
+Admission control for LLM calls.
+Caps how many chat turns wait on the model at once, globally and per
+session. Turns over the global cap wait in a bounded FIFO queue; when the
+queue is full, or a turn waits too long, it is rejected at once with a
+Retry-After hint (HTTP 429) instead of piling onto a slow upstream. Crisis
+replies and /health never call the model, so they never pass through here.
+One controller serves threads (Flask) and coroutines (Quart).
+
+SessionLocks orders requests within a session the same way: one turn per
+session at a time, later ones queued FIFO behind it, while different
+sessions run in parallel.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Union
+
+from config import Config
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """A turn was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """One queued turn; `granted` is set under the controller lock."""
+
+    __slots__ = ("signal", "loop", "granted")
+
+    def __init__(self, signal: Union[threading.Event, asyncio.Future], loop=None):
+        self.signal = signal
+        self.loop = loop
+        self.granted = False
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.signal.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.signal)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class Permit:
+    """An admitted turn's slot or session lock; released on exit (safe to release twice)."""
+
+    __slots__ = ("_controller", "_session_id", "_start", "_released")
+
+    def __init__(self, controller: Optional["AdmissionController"], session_id: str):
+        self._controller = controller
+        self._session_id = session_id
+        self._start = time.perf_counter()
+        self._released = controller is None  # admission control off
+
+    def release(self) -> None:
+        """Give the slot to the next queued turn."""
+        if not self._released:
+            self._released = True
+            self._controller._release(self._session_id, time.perf_counter() - self._start)
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """Global + per-session concurrency limits with a bounded wait queue."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 32,
+        max_per_session: int = 2,
+        max_queue: int = 64,
+        max_wait: float = 10.0,
+        enabled: bool = True,
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrent: Turns allowed on the model at once.
+            max_per_session: Turns one session may have running or queued.
+            max_queue: Turns allowed to wait for a slot; more are rejected.
+            max_wait: Seconds a queued turn waits before it is rejected.
+            enabled: When False every turn is admitted immediately.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._queue: Deque[_Waiter] = deque()
+        self._sessions: Dict[str, int] = {}
+        self.in_flight = 0
+        self._hold = 1.0  # moving average of seconds a slot is held
+
+    def set_limits(self, max_concurrent: int, max_queue: int) -> None:
+        """
+        Change the global limits (e.g. for the async server, which holds many more turns).
+
+        Args:
+            max_concurrent: Turns allowed on the model at once.
+            max_queue: Turns allowed to wait for a slot.
+        """
+        with self._lock:
+            self.max_concurrent = max_concurrent
+            self.max_queue = max_queue
+            # Slots added by a higher limit go to the oldest waiters
+            while self._queue and self.in_flight < self.max_concurrent:
+                waiter = self._queue.popleft()
+                waiter.granted = True
+                waiter.wake()
+                self.in_flight += 1
+
+    @property
+    def queue_depth(self) -> int:
+        """Turns currently waiting for a slot."""
+        return len(self._queue)
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue ahead has likely drained."""
+        rounds = (len(self._queue) + 1) / self.max_concurrent
+        return max(1, math.ceil(rounds * self._hold))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.inc("feelio_admission_rejections_total", reason=reason)
+        logger.warning(f"🚦 Turn rejected: {reason}")
+        return AdmissionRejected(reason, self._retry_after())
+
+    def _enter(self, session_id: str, waiter: _Waiter) -> Optional[_Waiter]:
+        """Take a slot or a queue place (caller holds the lock)."""
+        if self._sessions.get(session_id, 0) >= self.max_per_session:
+            raise self._reject("session busy")
+        if self.in_flight < self.max_concurrent and not self._queue:
+            self.in_flight += 1
+            waiter = None
+        elif len(self._queue) >= self.max_queue:
+            raise self._reject("queue full")
+        else:
+            self._queue.append(waiter)
+        self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+        return waiter
+
+    def _leave_session(self, session_id: str) -> None:
+        count = self._sessions.get(session_id, 0) - 1
+        if count > 0:
+            self._sessions[session_id] = count
+        else:
+            self._sessions.pop(session_id, None)
+
+    def _abandon(self, session_id: str, waiter: _Waiter) -> bool:
+        """
+        Drop a waiter that stopped waiting.
+
+        Returns:
+            bool: True if a slot was granted to it meanwhile (it now owns it).
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queue.remove(waiter)
+            self._leave_session(session_id)
+            return False
+
+    def _release(self, session_id: str, held: float) -> None:
+        with self._lock:
+            self._leave_session(session_id)
+            self._hold += (held - self._hold) * 0.2
+            if self._queue:
+                # Hand the slot straight to the oldest waiter
+                waiter = self._queue.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self.in_flight -= 1
+
+    def admit(self, session_id: str) -> Permit:
+        """
+        Wait (bounded) for a slot for one turn.
+
+        Args:
+            session_id: Session the turn belongs to.
+
+        Returns:
+            Permit: Release it (or use it as a context manager) when the call ends.
+
+        Raises:
+            AdmissionRejected: The session or queue is full, or the wait timed out.
+        """
+        if not self.enabled:
+            return Permit(None, session_id)
+
+        start = time.perf_counter()
+        with self._lock:
+            waiter = self._enter(session_id, _Waiter(threading.Event()))
+        if waiter is not None and not waiter.signal.wait(self.max_wait):
+            if not self._abandon(session_id, waiter):
+                raise self._reject("wait timeout")
+        metrics.observe("feelio_admission_wait_seconds", time.perf_counter() - start)
+        return Permit(self, session_id)
+
+    async def admit_async(self, session_id: str) -> Permit:
+        """Async variant of admit; waits without blocking the event loop."""
+        if not self.enabled:
+            return Permit(None, session_id)
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = self._enter(session_id, _Waiter(loop.create_future(), loop))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.signal, self.max_wait)
+            except asyncio.TimeoutError:
+                if not self._abandon(session_id, waiter):
+                    raise self._reject("wait timeout") from None
+            except BaseException:
+                # Client went away while queued: give back whatever we hold
+                if self._abandon(session_id, waiter):
+                    self._release(session_id, 0.0)
+                raise
+        metrics.observe("feelio_admission_wait_seconds", time.perf_counter() - start)
+        return Permit(self, session_id)
+
+    def stats(self) -> Dict[str, float]:
+        """Current load, limits and queue depth."""
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "avg_hold_ms": round(self._hold * 1000, 1),
+        }
+
+
+class _SessionQueue:
+    """Waiters behind the turn currently running for one session."""
+
+    __slots__ = ("waiters",)
+
+    def __init__(self):
+        self.waiters: Deque[_Waiter] = deque()
+
+
+class SessionLocks:
+    """
+    FIFO lock per session id, for threads and coroutines alike.
+
+    Entries exist only while a session has a turn running, so idle sessions
+    cost nothing. Within one process only: across workers, a shared session
+    backend still sees last-writer-wins.
+    """
+
+    def __init__(self, max_pending: int = 4, max_wait: float = 30.0, enabled: bool = True):
+        """
+        Initialize the locks.
+
+        Args:
+            max_pending: Turns one session may have running or queued.
+            max_wait: Seconds a queued turn waits before it is rejected.
+            enabled: When False requests are not serialized.
+        """
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _SessionQueue] = {}
+
+    def __len__(self) -> int:
+        """Sessions with a turn running."""
+        return len(self._sessions)
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.inc("feelio_admission_rejections_total", reason=reason)
+        logger.warning(f"🚦 Turn rejected: {reason}")
+        return AdmissionRejected(reason, max(1, math.ceil(self.max_wait / self.max_pending)))
+
+    def _enter(self, session_id: str, waiter: _Waiter) -> Optional[_Waiter]:
+        """Take the session or a place in its queue (caller holds the lock)."""
+        queue = self._sessions.get(session_id)
+        if queue is None:
+            self._sessions[session_id] = _SessionQueue()
+            return None
+        if len(queue.waiters) + 1 >= self.max_pending:
+            raise self._reject("session queue full")
+        queue.waiters.append(waiter)
+        return waiter
+
+    def _abandon(self, session_id: str, waiter: _Waiter) -> bool:
+        """Drop a waiter that stopped waiting; True if it was handed the lock meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._sessions[session_id].waiters.remove(waiter)
+            return False
+
+    def _release(self, session_id: str, held: float) -> None:
+        with self._lock:
+            queue = self._sessions[session_id]
+            if queue.waiters:
+                waiter = queue.waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                del self._sessions[session_id]
+
+    def hold(self, session_id: str) -> Permit:
+        """
+        Wait (bounded) until this request is the session's only running turn.
+
+        Args:
+            session_id: The session.
+
+        Returns:
+            Permit: Release it when the turn, including any stream, is done.
+
+        Raises:
+            AdmissionRejected: Too many turns queued for the session, or the wait timed out.
+        """
+        if not self.enabled:
+            return Permit(None, session_id)
+
+        start = time.perf_counter()
+        with self._lock:
+            waiter = self._enter(session_id, _Waiter(threading.Event()))
+        if waiter is not None:
+            if not waiter.signal.wait(self.max_wait) and not self._abandon(session_id, waiter):
+                raise self._reject("session wait timeout")
+            metrics.observe("feelio_session_wait_seconds", time.perf_counter() - start)
+        return Permit(self, session_id)
+
+    async def hold_async(self, session_id: str) -> Permit:
+        """Async variant of hold; waits without blocking the event loop."""
+        if not self.enabled:
+            return Permit(None, session_id)
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = self._enter(session_id, _Waiter(loop.create_future(), loop))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.signal, self.max_wait)
+            except asyncio.TimeoutError:
+                if not self._abandon(session_id, waiter):
+                    raise self._reject("session wait timeout") from None
+            except BaseException:
+                if self._abandon(session_id, waiter):
+                    self._release(session_id, 0.0)
+                raise
+            metrics.observe("feelio_session_wait_seconds", time.perf_counter() - start)
+        return Permit(self, session_id)
+
+
+def build_admission() -> AdmissionController:
+    """Build the controller from Config."""
+    return AdmissionController(
+        max_concurrent=Config.ADMISSION_MAX_CONCURRENT,
+        max_per_session=Config.ADMISSION_MAX_PER_SESSION,
+        max_queue=Config.ADMISSION_MAX_QUEUE,
+        max_wait=Config.ADMISSION_MAX_WAIT_SECONDS,
+        enabled=Config.ADMISSION_CONTROL,
+    )
+
+
+def build_session_locks() -> SessionLocks:
+    """Build the per-session locks from Config."""
+    return SessionLocks(
+        max_pending=Config.SESSION_MAX_PENDING,
+        max_wait=Config.SESSION_WAIT_SECONDS,
+        enabled=Config.SESSION_SERIALIZE,
+    )
+
+
+# Shared by both servers (one per process)
+admission = build_admission()
+session_locks = build_session_locks()
+metrics.gauge("feelio_admission_queue_depth", lambda: admission.queue_depth)
+metrics.gauge("feelio_admission_in_flight", lambda: admission.in_flight)
+metrics.gauge("feelio_sessions_busy", lambda: len(session_locks))
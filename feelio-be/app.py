@@ -4,23 +4,41 @@ Provides endpoints for frontend integration
 """
 
 import os
+import json
 import logging
-from flask import Flask, request, jsonify
+import time
+from contextlib import ExitStack
+from typing import Iterator, Tuple
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import google.generativeai as genai
-from collections import deque
 
+import llm
 from config import Config
-from therapy_utils import (
-    update_emotion_history,
-    summarize_trajectory,
-    detect_contradiction,
-    detect_high_risk,
-    select_playbook,
-    build_fusion_prompt,
-    build_crisis_response,
-    extract_word_count,
-    determine_pace_hint,
+from metrics import registry as metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from routing import router
+from admission import AdmissionRejected, admission, session_locks
+from chat_service import (
+    sessions,
+    get_or_create_session,
+    end_session as drop_session,
+    parse_chat_request,
+    parse_idempotency_key,
+    replay_reply,
+    remember_reply,
+    get_fallback_response,
+    log_turn,
+    analyze_message,
+    handle_crisis,
+    build_turn_prompt,
+    route_turn,
+    RoutedCall,
+    compact_history,
+    schedule_compaction,
+    validate_response_text,
+    chat_payload,
+    chat_error_payload,
+    busy_payload,
+    summary_payload,
 )
 
 # Initialize Flask app
@@ -28,7 +46,7 @@ app = Flask(__name__)
 
 # Configure CORS
 cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
-CORS(app, origins=cors_origins, supports_credentials=True)
+CORS(app, origins=cors_origins, supports_credentials=True, expose_headers=["Retry-After"])
 
 # Setup logging
 logging.basicConfig(
@@ -37,72 +55,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Gemini
-try:
-    Config.validate()
-    genai.configure(api_key=Config.GEMINI_API_KEY)
-    logger.info("✅ Gemini API configured")
-except Exception as e:
-    logger.error(f"❌ Failed to configure Gemini: {e}")
-
-# Session storage (in production, use Redis or database)
-sessions = {}
-
-THERAPIST_INSTRUCTIONS = """
-You are Dr. Libra, a highly experienced Clinical Psychologist (PhD).
-You do not "fix" patients; you guide them to their own insight using CBT, ACT, and Humanistic techniques.
-
---- YOUR CLINICAL FRAMEWORK ---
-
-1.  **THE "HOLDING SPACE" RULE:**
-    * Before offering ANY solution, you must fully "hold" the user's pain.
-    * *Bad:* "You're sad? Try going for a walk."
-    * *Good:* "I can hear how heavy that sadness feels right now. It makes sense you feel drained."
-
-2.  **SOCRATIC INQUIRY (The Art of Questioning):**
-    * Do not just give answers. Ask questions that challenge the user's logic.
-    * *Example:* "You mentioned you are a 'failure.' What specific evidence do you have for that thought, and what evidence argues against it?"
-
-3.  **SPOT COGNITIVE DISTORTIONS:**
-    * Listen for these patterns and gently point them out:
-        * *Catastrophizing:* "It sounds like your mind is jumping to the worst-case scenario. Is that guaranteed to happen?"
-        * *All-or-Nothing Thinking:* "You seem to be seeing this as black or white. Is there a middle ground?"
-        * *Mind Reading:* "You feel your friend hates you, but have they actually said that?"
-
-4.  **MULTIMODAL DECODING:**
-    * **Conflict:** If Face = SAD but Words = "I'm fine" -> SAY: "My sensors see pain in your eyes, even though your words say you're fine. I'm listening to your eyes right now."
-    * **Silence:** If the user gives short answers, gently probe: "I notice you're quiet today. Is it hard to find the words?"
-
---- RESPONSE STRUCTURE ---
-(Keep it conversational, not a list)
-1.  **Reflection:** Mirror back what they said + the underlying emotion.
-2.  **The "Deepen" Question:** Ask something to explore *why* they feel this way.
-3.  **The Tool (Optional):** Only offer a tool if they seem stuck or ask for help.
-
---- TONE ---
-* **Pacing:** Slow, thoughtful, unhurried.
-* **Voice:** Warm, anchoring, steady.
-* **Safety:** If SUICIDE/SELF-HARM is detected -> DROP therapy. Switch to CRISIS INTERVENTION immediately.
-
-Keep responses concise (2-3 sentences max) and empathetic.
-"""
+
+# Request timing for /metrics (streams are timed to the first byte)
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    start = g.pop("request_start", None)
+    if start is not None and request.endpoint:
+        metrics.observe("feelio_request_seconds", time.perf_counter() - start, endpoint=request.endpoint)
+    return response
 
 
 # ========== HELPER FUNCTIONS ==========
 
-def get_or_create_session(session_id: str) -> dict:
-    """Get or create a session."""
-    if session_id not in sessions:
-        model = genai.GenerativeModel(
-            Config.MODEL_NAME,
-            system_instruction=THERAPIST_INSTRUCTIONS,
-        )
-        sessions[session_id] = {
-            "chat": model.start_chat(history=[]),
-            "emotion_history": deque(maxlen=180),
-            "turns": []
-        }
-    return sessions[session_id]
+def sse_event(event: str, payload: dict) -> str:
+    """Format a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def sse_response(events: Iterator[str]) -> Response:
+    """Wrap an event generator in an unbuffered text/event-stream response."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def release_after(events: Iterator[str], releases: ExitStack) -> Iterator[str]:
+    """Pass events through, releasing the turn's session lock and LLM slot when the stream ends."""
+    try:
+        yield from events
+    finally:
+        releases.close()
+
+
+def too_busy(error: AdmissionRejected) -> Tuple[Response, int, dict]:
+    """429 with Retry-After for a turn that admission control turned away."""
+    return jsonify(busy_payload(error)), 429, {"Retry-After": str(error.retry_after)}
 
 
 # ========== API ENDPOINTS ==========
@@ -117,22 +114,42 @@ def health_check():
     }), 200
 
 
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    """Live session store counters and model construction cost."""
+    return jsonify({
+        "success": True,
+        "sessions": sessions.stats(),
+        "llm": llm.model_stats(),
+        "routing": router.stats(),
+        "admission": admission.stats()
+    }), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Per-stage latency histograms and counters in Prometheus text format."""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route("/api/session/start", methods=["POST"])
 def start_session():
     """Start a new therapy session."""
     try:
         data = request.get_json() or {}
         session_id = data.get("session_id") or os.urandom(16).hex()
-        
+
+        start = time.perf_counter()
         get_or_create_session(session_id)
-        
-        logger.info(f"✅ Session started: {session_id}")
+        setup_ms = (time.perf_counter() - start) * 1000
+
+        logger.info(f"✅ Session started: {session_id} ({setup_ms:.2f} ms setup)")
         return jsonify({
             "success": True,
             "session_id": session_id,
             "message": "Session started successfully"
         }), 200
-        
+
     except Exception as e:
         logger.error(f"❌ Error starting session: {e}")
         return jsonify({
@@ -143,125 +160,194 @@ def start_session():
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
-    """Process user message and return AI response."""
+    """
+    Process user message and return AI response.
+
+    Turns of one session run in arrival order; a retry carrying the same
+    Idempotency-Key gets the stored reply instead of a new LLM call.
+    """
+    held = ExitStack()
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                "success": False,
-                "error": "No data provided"
-            }), 400
-        
-        session_id = data.get("session_id")
-        user_text = data.get("message", "").strip()
-        emotion = data.get("emotion", "neutral")
-        
-        if not session_id or not user_text:
+        fields, error = parse_chat_request(request.get_json())
+        idempotency_key, key_error = parse_idempotency_key(request.headers.get("Idempotency-Key"))
+
+        if error or key_error:
             return jsonify({
                 "success": False,
-                "error": "session_id and message are required"
+                "error": error or key_error
             }), 400
-        
+
+        session_id, user_text, emotion = fields
+
+        # One turn per session at a time; other sessions run in parallel
+        try:
+            held.callback(session_locks.hold(session_id).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
         # Get or create session
         session = get_or_create_session(session_id)
-        
-        # Check for high-risk content
-        if Config.ENABLE_SAFETY_NET and detect_high_risk(user_text):
-            crisis_response = build_crisis_response()
-            logger.warning(f"🚨 High-risk content detected in session: {session_id}")
-            
-            session["turns"].append({
-                "user": user_text,
-                "therapist": crisis_response,
-                "emotion": emotion,
-                "crisis": True
-            })
-            
+
+        replayed, key_error = replay_reply(session, idempotency_key, user_text)
+        if key_error:
             return jsonify({
-                "success": True,
-                "response": crisis_response,
-                "emotion": emotion,
-                "crisis_detected": True
-            }), 200
-        
-        # Update emotion history
-        update_emotion_history(emotion, session["emotion_history"])
-        
-        # Build context
-        trajectory = summarize_trajectory(session["emotion_history"])
-        contradiction = detect_contradiction(user_text, emotion)
-        playbook = select_playbook(emotion, user_text)
-        
-        word_count = extract_word_count(user_text)
-        pace_hint = determine_pace_hint(word_count)
-        
-        # Build fusion prompt with more unique context
-        fusion_prompt = build_fusion_prompt(
-            user_text=user_text,
-            emotion=emotion,
-            trajectory=trajectory,
-            contradiction=contradiction,
-            playbook=playbook,
-            pace_hint=pace_hint,
-        )
-        
-        # Add session turn context to make responses more unique
-        turn_num = len(session["turns"]) + 1
-        fusion_prompt += f"\n[CONVERSATION TURN: {turn_num}]"
-        
+                "success": False,
+                "error": key_error
+            }), 422
+        if replayed:
+            return jsonify(replayed), 200
+
+        # One pass over the text: risk, intents, contradiction, pacing
+        analysis = analyze_message(user_text, emotion)
+        crisis = handle_crisis(session, session_id, user_text, emotion, analysis, idempotency_key)
+        if crisis:
+            return jsonify(crisis), 200
+
+        # Crisis replies above never wait; the LLM call below needs a slot
+        try:
+            held.callback(admission.admit(session_id).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
+        fusion_prompt, playbook, turn_num = build_turn_prompt(session, user_text, emotion, analysis)
+        route = route_turn(session, analysis)
+
         # Generate response with temperature for variety
         try:
-            response = session["chat"].send_message(fusion_prompt)
-            ai_text = response.text.strip()
-            
-            # Validate response
-            if not ai_text or len(ai_text) < 5:
-                logger.warning(f"⚠️ Empty or too short response for session: {session_id}")
-                ai_text = "I'm listening. Could you tell me more about what you're feeling?"
-                
+            with metrics.span("llm"), RoutedCall(session, route, fusion_prompt) as call:
+                raw_text = call.reply = session["chat"].send_message(fusion_prompt, route.model_name)
+            ai_text, _ = validate_response_text(session_id, raw_text)
+
         except Exception as e:
-            logger.error(f"❌ Gemini API error: {e}")
-            # Fallback responses based on emotion
-            fallback_responses = {
-                "happy": "I can hear the warmth in your words. What's brought you this joy?",
-                "sad": "I sense sadness in what you're sharing. I'm here to listen more deeply.",
-                "anxious": "There's some worry coming through. Let's slow down and explore what's underneath.",
-                "calm": "You sound grounded right now. What's helped you get to this place?",
-                "neutral": "I'm sensing you might have a lot on your mind. Where would you like to start?"
-            }
-            ai_text = fallback_responses.get(emotion, "I'm here to listen. Please go on.")
-        
-        # Log turn
-        session["turns"].append({
-            "user": user_text,
-            "therapist": ai_text,
-            "emotion": emotion,
-            "crisis": False
-        })
-        
+            logger.error(f"❌ LLM backend error: {e}")
+            metrics.inc("feelio_llm_errors_total")
+            ai_text = get_fallback_response(emotion)
+
+        # Log turn (persists the stored reply with it)
+        payload = chat_payload(ai_text, emotion, playbook)
+        remember_reply(session, idempotency_key, user_text, payload)
+        log_turn(session, user_text, ai_text, emotion, crisis=False)
+
         logger.info(f"✅ Response generated for session: {session_id} (turn {turn_num})")
-        
-        return jsonify({
-            "success": True,
-            "response": ai_text,
-            "emotion": emotion,
-            "crisis_detected": False,
-            "playbook": playbook
-        }), 200
-        
+
+        with metrics.span("serialize"):
+            response = jsonify(payload)
+        # Compact after the reply; the session stays locked until then
+        schedule_compaction(session, held.pop_all())
+        return response, 200
+
     except Exception as e:
         logger.error(f"❌ Error in chat endpoint: {e}", exc_info=True)
-        fallback_text = "I'm sensing some strong emotions. Could you tell me more about what's on your mind?"
-        
-        return jsonify({
-            "success": True,
-            "response": fallback_text,
-            "emotion": "neutral",
-            "crisis_detected": False,
-            "playbook": None,
-            "fallback": True
-        }), 200
+        return jsonify(chat_error_payload()), 200
+
+    finally:
+        held.close()
+
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Process user message and stream the AI response as Server-Sent Events.
+
+    Emits one `token` event per partial chunk from the LLM, followed by a
+    single `done` event carrying the same payload as /api/chat. The `done`
+    payload's `response` is authoritative: if generation fails or comes back
+    too short, it holds the fallback text that was logged for the turn.
+    Session ordering and Idempotency-Key replay work as for /api/chat; a
+    replayed reply arrives as a single `done` frame.
+    """
+    held = ExitStack()
+    try:
+        fields, error = parse_chat_request(request.get_json())
+        idempotency_key, key_error = parse_idempotency_key(request.headers.get("Idempotency-Key"))
+
+        if error or key_error:
+            return jsonify({
+                "success": False,
+                "error": error or key_error
+            }), 400
+
+        session_id, user_text, emotion = fields
+
+        try:
+            held.callback(session_locks.hold(session_id).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
+        session = get_or_create_session(session_id)
+
+        replayed, key_error = replay_reply(session, idempotency_key, user_text)
+        if key_error:
+            return jsonify({
+                "success": False,
+                "error": key_error
+            }), 422
+        if replayed:
+            return sse_response(iter([sse_event("done", replayed)]))
+
+        analysis = analyze_message(user_text, emotion)
+
+        # Crisis responses are never streamed - send them in one frame
+        crisis = handle_crisis(session, session_id, user_text, emotion, analysis, idempotency_key)
+        if crisis:
+            return sse_response(iter([sse_event("done", crisis)]))
+
+        try:
+            held.callback(admission.admit(session_id).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
+        fusion_prompt, playbook, turn_num = build_turn_prompt(session, user_text, emotion, analysis)
+        route = route_turn(session, analysis)
+
+        # The stream now owns the session lock and the LLM slot
+        releases = held.pop_all()
+
+    except Exception as e:
+        logger.error(f"❌ Error in chat stream endpoint: {e}", exc_info=True)
+        return sse_response(iter([sse_event("done", chat_error_payload())]))
+
+    finally:
+        held.close()
+
+    def generate() -> Iterator[str]:
+        chunks = []
+        start = time.perf_counter()
+
+        try:
+            with RoutedCall(session, route, fusion_prompt) as call:
+                for text in session["chat"].send_message_stream(fusion_prompt, route.model_name):
+                    if not chunks:
+                        metrics.observe("feelio_stage_seconds", time.perf_counter() - start, stage="llm_first_token")
+                    chunks.append(text)
+                    yield sse_event("token", {"text": text})
+                call.reply = "".join(chunks)
+
+            metrics.observe("feelio_stage_seconds", time.perf_counter() - start, stage="llm_stream")
+            ai_text, fallback = validate_response_text(session_id, "".join(chunks))
+
+        except Exception as e:
+            logger.error(f"❌ LLM backend error while streaming: {e}")
+            metrics.inc("feelio_llm_errors_total")
+            ai_text = get_fallback_response(emotion)
+            fallback = True
+
+        # Log turn once the stream has finished
+        payload = chat_payload(ai_text, emotion, playbook, fallback=fallback)
+        remember_reply(session, idempotency_key, user_text, payload)
+        log_turn(session, user_text, ai_text, emotion, crisis=False)
+
+        logger.info(f"✅ Response streamed for session: {session_id} (turn {turn_num})")
+
+        yield sse_event("done", payload)
+
+        # Compact after the client has its reply
+        compact_history(session)
+
+    response = sse_response(release_after(generate(), releases))
+    # Also covers a client that disconnects before the stream starts
+    response.call_on_close(releases.close)
+    return response
 
 
 @app.route("/api/session/summary", methods=["POST"])
@@ -270,40 +356,17 @@ def get_session_summary():
     try:
         data = request.get_json()
         session_id = data.get("session_id")
-        
-        if not session_id or session_id not in sessions:
+
+        session = sessions.get(session_id) if session_id else None
+
+        if session is None:
             return jsonify({
                 "success": False,
                 "error": "Invalid session_id"
             }), 400
-        
-        session = sessions[session_id]
-        turns = session["turns"]
-        
-        if not turns:
-            return jsonify({
-                "success": True,
-                "summary": "No conversation yet",
-                "turn_count": 0
-            }), 200
-        
-        # Build summary
-        summary_lines = []
-        emotion_counts = {}
-        
-        for turn in turns:
-            emotion = turn["emotion"]
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-        
-        summary = f"Session had {len(turns)} exchanges. Primary emotions: {', '.join(emotion_counts.keys())}"
-        
-        return jsonify({
-            "success": True,
-            "summary": summary,
-            "turn_count": len(turns),
-            "emotions": emotion_counts
-        }), 200
-        
+
+        return jsonify(summary_payload(session)), 200
+
     except Exception as e:
         logger.error(f"❌ Error getting summary: {e}")
         return jsonify({
@@ -317,17 +380,13 @@ def end_session():
     """End a therapy session."""
     try:
         data = request.get_json()
-        session_id = data.get("session_id")
-        
-        if session_id and session_id in sessions:
-            del sessions[session_id]
-            logger.info(f"✅ Session ended: {session_id}")
-        
+        drop_session(data.get("session_id"))
+
         return jsonify({
             "success": True,
             "message": "Session ended"
         }), 200
-        
+
     except Exception as e:
         logger.error(f"❌ Error ending session: {e}")
         return jsonify({
@@ -360,12 +419,12 @@ def internal_error(error):
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
-    
+
     logger.info(f"🚀 Starting Feelio API on {host}:{port}")
     logger.info(f"Environment: {Config.APP_ENV}")
-    
+
     app.run(
         host=host,
         port=port,
         debug=Config.DEBUG_MODE
-    )
\ No newline at end of file
+    )
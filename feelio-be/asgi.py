@@ -0,0 +1,466 @@
+"""
+Async ASGI API for Feelio.
+Serves the same endpoints as app.py, but awaits Gemini instead of blocking a
+worker, so a single process can hold hundreds of in-flight chats.
+
+Run with:
+    hypercorn asgi:app --bind 0.0.0.0:$PORT
+"""
+
+import os
+import json
+import asyncio
+import logging
+import time
+from contextlib import ExitStack
+from typing import AsyncIterator, Tuple
+from quart import Quart, Response, g, request, jsonify
+from quart_cors import cors
+
+import llm
+from config import Config
+from metrics import registry as metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from routing import router
+from admission import AdmissionRejected, admission, session_locks
+from chat_service import (
+    sessions,
+    get_or_create_session,
+    end_session as drop_session,
+    parse_chat_request,
+    parse_idempotency_key,
+    replay_reply,
+    remember_reply,
+    get_fallback_response,
+    log_turn,
+    analyze_message,
+    handle_crisis,
+    build_turn_prompt,
+    route_turn,
+    RoutedCall,
+    compact_history,
+    schedule_compaction,
+    validate_response_text,
+    chat_payload,
+    chat_error_payload,
+    busy_payload,
+    summary_payload,
+)
+
+# One coroutine per turn instead of one thread: admit as many turns as user-facing concurrency needs
+admission.set_limits(Config.ADMISSION_ASYNC_MAX_CONCURRENT, Config.ADMISSION_ASYNC_MAX_QUEUE)
+
+# Initialize Quart app
+app = Quart(__name__)
+
+# Configure CORS (credentials cannot be combined with a wildcard origin)
+cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
+app = cors(
+    app,
+    allow_origin="*" if "*" in cors_origins else cors_origins,
+    allow_credentials="*" not in cors_origins,
+    allow_headers=["Content-Type", "Idempotency-Key"],
+    expose_headers=["Retry-After"],
+)
+
+# Setup logging
+logging.basicConfig(
+    level=getattr(logging, Config.LOG_LEVEL),
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+# Request timing for /metrics (streams are timed to the first byte)
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+async def record_request_time(response):
+    start = g.pop("request_start", None)
+    if start is not None and request.endpoint:
+        metrics.observe("feelio_request_seconds", time.perf_counter() - start, endpoint=request.endpoint)
+    return response
+
+
+# ========== HELPER FUNCTIONS ==========
+
+def sse_event(event: str, payload: dict) -> str:
+    """Format a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> Response:
+    """Wrap an async event generator in an unbuffered text/event-stream response."""
+    response = Response(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    return response
+
+
+async def release_after(events: AsyncIterator[str], releases: ExitStack) -> AsyncIterator[str]:
+    """Pass events through, releasing the turn's session lock and LLM slot when the stream ends."""
+    try:
+        async for event in events:
+            yield event
+    finally:
+        releases.close()
+
+
+def release_on_request_end(releases: ExitStack) -> None:
+    """
+    Also release when the request task ends, however it ends.
+
+    A generator that never started runs no finally block, so a client that
+    disconnects before the first frame would otherwise keep the holds.
+    ExitStack.close runs its callbacks once, so the normal path is unaffected.
+    """
+    asyncio.current_task().add_done_callback(lambda _task: releases.close())
+
+
+async def session_io(fn, *args, **kwargs):
+    """
+    Run a session-store call (load, save, delete) without stalling the loop.
+
+    With a SQLite or Redis backend the call blocks on I/O, so it runs in a
+    worker thread; the in-memory store is fast enough to call directly.
+    """
+    if sessions.backend is None:
+        return fn(*args, **kwargs)
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+def too_busy(error: AdmissionRejected) -> Tuple[Response, int, dict]:
+    """429 with Retry-After for a turn that admission control turned away."""
+    return jsonify(busy_payload(error)), 429, {"Retry-After": str(error.retry_after)}
+
+
+async def single_event(event: str, payload: dict) -> AsyncIterator[str]:
+    """Async generator yielding exactly one SSE frame."""
+    yield sse_event(event, payload)
+
+
+# ========== API ENDPOINTS ==========
+
+@app.route("/health", methods=["GET"])
+async def health_check():
+    """Health check endpoint for Render."""
+    return jsonify({
+        "status": "healthy",
+        "service": "feelio-backend",
+        "version": "1.0.0"
+    }), 200
+
+
+@app.route("/api/stats", methods=["GET"])
+async def stats():
+    """Live session store counters and model construction cost."""
+    return jsonify({
+        "success": True,
+        "sessions": sessions.stats(),
+        "llm": llm.model_stats(),
+        "routing": router.stats(),
+        "admission": admission.stats()
+    }), 200
+
+
+@app.route("/metrics", methods=["GET"])
+async def prometheus_metrics():
+    """Per-stage latency histograms and counters in Prometheus text format."""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/api/session/start", methods=["POST"])
+async def start_session():
+    """Start a new therapy session."""
+    try:
+        data = await request.get_json(silent=True) or {}
+        session_id = data.get("session_id") or os.urandom(16).hex()
+
+        start = time.perf_counter()
+        await session_io(get_or_create_session, session_id)
+        setup_ms = (time.perf_counter() - start) * 1000
+
+        logger.info(f"✅ Session started: {session_id} ({setup_ms:.2f} ms setup)")
+        return jsonify({
+            "success": True,
+            "session_id": session_id,
+            "message": "Session started successfully"
+        }), 200
+
+    except Exception as e:
+        logger.error(f"❌ Error starting session: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route("/api/chat", methods=["POST"])
+async def chat():
+    """
+    Process user message and return AI response without blocking the loop.
+
+    Turns of one session run in arrival order; a retry carrying the same
+    Idempotency-Key gets the stored reply instead of a new LLM call.
+    """
+    held = ExitStack()
+    try:
+        fields, error = parse_chat_request(await request.get_json(silent=True))
+        idempotency_key, key_error = parse_idempotency_key(request.headers.get("Idempotency-Key"))
+
+        if error or key_error:
+            return jsonify({
+                "success": False,
+                "error": error or key_error
+            }), 400
+
+        session_id, user_text, emotion = fields
+
+        # One turn per session at a time; other sessions run in parallel
+        try:
+            held.callback((await session_locks.hold_async(session_id)).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
+        # Get or create session
+        session = await session_io(get_or_create_session, session_id)
+
+        replayed, key_error = replay_reply(session, idempotency_key, user_text)
+        if key_error:
+            return jsonify({
+                "success": False,
+                "error": key_error
+            }), 422
+        if replayed:
+            return jsonify(replayed), 200
+
+        # One pass over the text: risk, intents, contradiction, pacing
+        analysis = analyze_message(user_text, emotion)
+        crisis = await session_io(handle_crisis, session, session_id, user_text, emotion, analysis, idempotency_key)
+        if crisis:
+            return jsonify(crisis), 200
+
+        # Crisis replies above never wait; the LLM call below needs a slot
+        try:
+            held.callback((await admission.admit_async(session_id)).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
+        fusion_prompt, playbook, turn_num = build_turn_prompt(session, user_text, emotion, analysis)
+        route = route_turn(session, analysis)
+
+        try:
+            with metrics.span("llm"), RoutedCall(session, route, fusion_prompt) as call:
+                raw_text = call.reply = await session["chat"].send_message_async(fusion_prompt, route.model_name)
+            ai_text, _ = validate_response_text(session_id, raw_text)
+
+        except Exception as e:
+            logger.error(f"❌ LLM backend error: {e}")
+            metrics.inc("feelio_llm_errors_total")
+            ai_text = get_fallback_response(emotion)
+
+        # Log turn (persists the stored reply with it)
+        payload = chat_payload(ai_text, emotion, playbook)
+        remember_reply(session, idempotency_key, user_text, payload)
+        await session_io(log_turn, session, user_text, ai_text, emotion, crisis=False)
+
+        logger.info(f"✅ Response generated for session: {session_id} (turn {turn_num})")
+
+        with metrics.span("serialize"):
+            response = jsonify(payload)
+        # Compact after the reply; the session stays locked until then
+        schedule_compaction(session, held.pop_all())
+        return response, 200
+
+    except Exception as e:
+        logger.error(f"❌ Error in chat endpoint: {e}", exc_info=True)
+        return jsonify(chat_error_payload()), 200
+
+    finally:
+        held.close()
+
+
+@app.route("/api/chat/stream", methods=["POST"])
+async def chat_stream():
+    """
+    Process user message and stream the AI response as Server-Sent Events.
+
+    Same event protocol as the Flask endpoint: `token` frames followed by
+    one authoritative `done` frame.
+    Session ordering and Idempotency-Key replay work as for /api/chat; a
+    replayed reply arrives as a single `done` frame.
+    """
+    held = ExitStack()
+    try:
+        fields, error = parse_chat_request(await request.get_json(silent=True))
+        idempotency_key, key_error = parse_idempotency_key(request.headers.get("Idempotency-Key"))
+
+        if error or key_error:
+            return jsonify({
+                "success": False,
+                "error": error or key_error
+            }), 400
+
+        session_id, user_text, emotion = fields
+
+        try:
+            held.callback((await session_locks.hold_async(session_id)).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
+        session = await session_io(get_or_create_session, session_id)
+
+        replayed, key_error = replay_reply(session, idempotency_key, user_text)
+        if key_error:
+            return jsonify({
+                "success": False,
+                "error": key_error
+            }), 422
+        if replayed:
+            return sse_response(single_event("done", replayed))
+
+        analysis = analyze_message(user_text, emotion)
+
+        # Crisis responses are never streamed - send them in one frame
+        crisis = await session_io(handle_crisis, session, session_id, user_text, emotion, analysis, idempotency_key)
+        if crisis:
+            return sse_response(single_event("done", crisis))
+
+        try:
+            held.callback((await admission.admit_async(session_id)).release)
+        except AdmissionRejected as e:
+            return too_busy(e)
+
+        fusion_prompt, playbook, turn_num = build_turn_prompt(session, user_text, emotion, analysis)
+        route = route_turn(session, analysis)
+
+        # The stream now owns the session lock and the LLM slot
+        releases = held.pop_all()
+
+    except Exception as e:
+        logger.error(f"❌ Error in chat stream endpoint: {e}", exc_info=True)
+        return sse_response(single_event("done", chat_error_payload()))
+
+    finally:
+        held.close()
+
+    async def generate() -> AsyncIterator[str]:
+        chunks = []
+        start = time.perf_counter()
+
+        try:
+            with RoutedCall(session, route, fusion_prompt) as call:
+                async for text in session["chat"].send_message_stream_async(fusion_prompt, route.model_name):
+                    if not chunks:
+                        metrics.observe("feelio_stage_seconds", time.perf_counter() - start, stage="llm_first_token")
+                    chunks.append(text)
+                    yield sse_event("token", {"text": text})
+                call.reply = "".join(chunks)
+
+            metrics.observe("feelio_stage_seconds", time.perf_counter() - start, stage="llm_stream")
+            ai_text, fallback = validate_response_text(session_id, "".join(chunks))
+
+        except Exception as e:
+            logger.error(f"❌ LLM backend error while streaming: {e}")
+            metrics.inc("feelio_llm_errors_total")
+            ai_text = get_fallback_response(emotion)
+            fallback = True
+
+        # Log turn once the stream has finished
+        payload = chat_payload(ai_text, emotion, playbook, fallback=fallback)
+        remember_reply(session, idempotency_key, user_text, payload)
+        await session_io(log_turn, session, user_text, ai_text, emotion, crisis=False)
+
+        logger.info(f"✅ Response streamed for session: {session_id} (turn {turn_num})")
+
+        yield sse_event("done", payload)
+
+        # Compact after the client has its reply (summary call runs off-loop)
+        await asyncio.to_thread(compact_history, session)
+
+    # Also covers a client that disconnects before the stream starts
+    release_on_request_end(releases)
+    return sse_response(release_after(generate(), releases))
+
+
+@app.route("/api/session/summary", methods=["POST"])
+async def get_session_summary():
+    """Get session summary."""
+    try:
+        data = await request.get_json(silent=True) or {}
+        session_id = data.get("session_id")
+
+        session = await session_io(sessions.get, session_id) if session_id else None
+
+        if session is None:
+            return jsonify({
+                "success": False,
+                "error": "Invalid session_id"
+            }), 400
+
+        return jsonify(summary_payload(session)), 200
+
+    except Exception as e:
+        logger.error(f"❌ Error getting summary: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route("/api/session/end", methods=["POST"])
+async def end_session():
+    """End a therapy session."""
+    try:
+        data = await request.get_json(silent=True) or {}
+        await session_io(drop_session, data.get("session_id"))
+
+        return jsonify({
+            "success": True,
+            "message": "Session ended"
+        }), 200
+
+    except Exception as e:
+        logger.error(f"❌ Error ending session: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+# ========== ERROR HANDLERS ==========
+
+@app.errorhandler(404)
+async def not_found(error):
+    return jsonify({
+        "success": False,
+        "error": "Endpoint not found"
+    }), 404
+
+
+@app.errorhandler(500)
+async def internal_error(error):
+    logger.error(f"Internal server error: {error}")
+    return jsonify({
+        "success": False,
+        "error": "Internal server error"
+    }), 500
+
+
+# ========== MAIN ==========
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 8000))
+    host = os.getenv("HOST", "0.0.0.0")
+
+    logger.info(f"🚀 Starting Feelio async API on {host}:{port}")
+    logger.info(f"Environment: {Config.APP_ENV}")
+
+    app.run(
+        host=host,
+        port=port,
+        debug=Config.DEBUG_MODE
+    )
@@ -0,0 +1,136 @@
+"""
+Latency under a traffic spike, with and without admission control.
+
+The stub upstream here has limited capacity: a call's latency grows with
+the number of calls in flight beyond that capacity, as a shared model
+endpoint does. A burst of concurrent /api/chat requests (one session each)
+is fired at the Flask app. Without admission control every request lands
+on the upstream at once and all of them slow down together; with it, at
+most `capacity` run, a bounded queue waits, and the rest get 429 +
+Retry-After straight away. Also checks the per-session limit with a burst
+from a single session.
+
+Usage:
+    python benchmarks/bench_admission.py [--burst 128] [--capacity 8] [--latency-ms 50]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+logging.disable(logging.CRITICAL)
+
+import llm  # noqa: E402
+from admission import admission, session_locks  # noqa: E402
+from app import app  # noqa: E402
+
+
+class ContendedStub(llm.StubBackend):
+    """Stub whose latency scales with concurrent calls past its capacity."""
+
+    def __init__(self, latency_ms: float, capacity: int):
+        super().__init__(latency_ms=latency_ms, tokens_per_sec=0)
+        self.capacity = capacity
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, history, prompt, model_name=None):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            load = max(1.0, self.in_flight / self.capacity)
+        try:
+            time.sleep(self.latency_ms / 1000 * load)
+            return self._reply(history, prompt)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def fire(burst: int, session_ids):
+    barrier = threading.Barrier(burst)
+
+    def one(i):
+        client = app.test_client()
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.post("/api/chat", json={
+            "session_id": session_ids[i], "message": "Work has been heavy this week", "emotion": "sad"
+        })
+        return response.status_code, time.perf_counter() - start, response.headers.get("Retry-After")
+
+    with ThreadPoolExecutor(max_workers=burst) as pool:
+        return list(pool.map(one, range(burst)))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--burst", type=int, default=128)
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    admission.max_concurrent = args.capacity
+    admission.max_queue = args.capacity * 4
+    admission.max_wait = 1.0
+
+    results = {}
+    print(f"{'admission':<11}{'200s':>6}{'429s':>6}{'p50 ms':>9}{'p99 ms':>9}{'429 p99 ms':>12}"
+          f"{'peak upstream':>15}{'elapsed s':>11}")
+    for enabled in (False, True):
+        admission.enabled = enabled
+        stub = ContendedStub(args.latency_ms, args.capacity)
+        llm.set_backend(stub)
+        start = time.perf_counter()
+        outcomes = fire(args.burst, [f"spike-{enabled}-{i}" for i in range(args.burst)])
+        elapsed = time.perf_counter() - start
+        ok = [t for status, t, _ in outcomes if status == 200]
+        busy = [(t, retry) for status, t, retry in outcomes if status == 429]
+        results[enabled] = (ok, busy, stub.peak)
+        print(f"{'on' if enabled else 'off':<11}{len(ok):>6}{len(busy):>6}"
+              f"{percentile(ok, 50) * 1000:>9.0f}{percentile(ok, 99) * 1000:>9.0f}"
+              f"{percentile([t for t, _ in busy], 99) * 1000:>12.0f}{stub.peak:>15}{elapsed:>11.2f}")
+
+    # One session bursting: only max_per_session may run or queue at once
+    # (session ordering off, or it would queue the burst before admission)
+    admission.max_per_session = 2
+    session_locks.enabled = False
+    outcomes = fire(6, ["one-session"] * 6)
+    session_busy = sum(1 for status, _, _ in outcomes if status == 429)
+    print(f"\nsingle-session burst of 6: {6 - session_busy} admitted, {session_busy} rejected")
+
+    off_ok, _, _ = results[False]
+    on_ok, on_busy, on_peak = results[True]
+    if on_peak > args.capacity:
+        print(f"FAIL: {on_peak} upstream calls in flight with a limit of {args.capacity}")
+        return 1
+    if not on_busy or any(retry is None for _, retry in on_busy):
+        print("FAIL: the spike was not shed with 429 + Retry-After")
+        return 1
+    if percentile(on_ok, 99) >= percentile(off_ok, 99):
+        print("FAIL: admitted turns were not faster than the unlimited spike")
+        return 1
+    if session_busy != 4:
+        print("FAIL: the per-session limit did not hold")
+        return 1
+    print(f"OK: admitted p99 {percentile(on_ok, 99) * 1000:.0f} ms vs {percentile(off_ok, 99) * 1000:.0f} ms "
+          f"unlimited; {len(on_busy)} turns shed in p99 {percentile([t for t, _ in on_busy], 99) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
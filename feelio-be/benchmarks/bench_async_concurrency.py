@@ -0,0 +1,68 @@
+"""
+Concurrency check for the async ASGI API (asgi.py).
+
+Uses the stub LLM backend with a fixed reply delay, then fires N
+concurrent /api/chat requests through the Quart test client. With the LLM
+call awaited, N chats should finish in roughly the time of one.
+
+Usage:
+    python benchmarks/bench_async_concurrency.py [--chats 200] [--delay 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import llm  # noqa: E402
+from admission import admission  # noqa: E402
+from asgi import app  # noqa: E402
+
+
+async def timed_chats(count: int) -> float:
+    client = app.test_client()
+
+    async def one(i: int) -> None:
+        response = await client.post("/api/chat", json={
+            "session_id": f"bench-{count}-{i}",
+            "message": "I have been feeling stressed at work",
+            "emotion": "sad",
+        })
+        body = await response.get_json()
+        assert body["success"] and not body.get("fallback"), body
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return time.perf_counter() - start
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=200, help="concurrent chats")
+    parser.add_argument("--delay", type=float, default=0.5, help="stub LLM delay (s)")
+    args = parser.parse_args()
+
+    llm.set_backend(llm.StubBackend(latency_ms=args.delay * 1000, tokens_per_sec=0))
+    # This measures the event loop, not admission control: let every chat in at once
+    admission.set_limits(max(admission.max_concurrent, args.chats), admission.max_queue)
+
+    single = await timed_chats(1)
+    many = await timed_chats(args.chats)
+
+    print(f"1 chat:      {single:.3f}s")
+    print(f"{args.chats} chats:  {many:.3f}s  ({many / single:.2f}x single)")
+
+    # Serial handling would take chats * delay; allow generous scheduling slack.
+    if many > 2 * single:
+        print("FAIL: concurrent chats did not overlap")
+        return 1
+    print("OK: concurrent chats overlapped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
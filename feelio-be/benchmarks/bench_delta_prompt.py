@@ -0,0 +1,98 @@
+"""
+Token cost of full vs delta prompts.
+
+Drives /api/chat for a conversation against the stub backend in both
+PROMPT_MODE settings and records, per request, the turn prompt and the total
+input (system instruction + history + turn prompt). Delta mode pays for the
+per-turn instructions once in the system instruction and then sends only
+context fields that changed, so both numbers should drop.
+
+Usage:
+    python benchmarks/bench_delta_prompt.py [--turns 40]
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+logging.disable(logging.INFO)
+
+import chat_service  # noqa: E402
+import llm  # noqa: E402
+from app import app  # noqa: E402
+from config import Config  # noqa: E402
+from history import estimate_tokens  # noqa: E402
+
+# Emotions change every few turns, as they do in a real session
+SCRIPT = [
+    ("Work has been piling up and I can't switch off at night", "sad"),
+    ("I keep thinking my manager is disappointed in me", "sad"),
+    ("I'm fine, honestly, just tired", "sad"),
+    ("My sister called and we argued again", "angry"),
+    ("I tried the breathing thing and it helped a little", "neutral"),
+    ("Tonight I just want to rest", "neutral"),
+]
+
+
+class RecordingBackend(llm.StubBackend):
+    """Instant stub backend that records the tokens of every chat call."""
+
+    def __init__(self):
+        super().__init__(latency_ms=0, tokens_per_sec=0)
+        self.turn_tokens = []
+        self.input_tokens = []
+
+    def generate(self, history, prompt, model_name=None):
+        system = estimate_tokens(llm.system_instruction())
+        self.turn_tokens.append(estimate_tokens(prompt))
+        self.input_tokens.append(
+            system + sum(estimate_tokens(text) for _, text in history) + estimate_tokens(prompt)
+        )
+        return "That sounds heavy. What feels most pressing about it right now?"
+
+
+def run(mode: str, turns: int) -> RecordingBackend:
+    Config.PROMPT_MODE = mode
+    backend = RecordingBackend()
+    llm.set_backend(backend)
+    client = app.test_client()
+    session_id = f"bench-{mode}"
+
+    for i in range(turns):
+        message, emotion = SCRIPT[i % len(SCRIPT)]
+        client.post("/api/chat", json={"session_id": session_id, "message": message, "emotion": emotion})
+
+    chat_service.end_session(session_id)
+    return backend
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40)
+    args = parser.parse_args()
+
+    full = run("full", args.turns)
+    delta = run("delta", args.turns)
+
+    def avg(values):
+        return sum(values) / len(values)
+
+    print(f"{'':<8}{'prompt tok/turn':>17}{'input tok/request':>19}{'input tok total':>17}")
+    for name, backend in (("full", full), ("delta", delta)):
+        print(f"{name:<8}{avg(backend.turn_tokens):>17.0f}{avg(backend.input_tokens):>19.0f}"
+              f"{sum(backend.input_tokens):>17}")
+
+    saved = 1 - sum(delta.input_tokens) / sum(full.input_tokens)
+    print(f"\ninput tokens saved over {args.turns} turns: {saved:.0%}")
+    if saved <= 0:
+        print("FAIL: delta prompts did not reduce input tokens")
+        return 1
+    print("OK: delta prompts send less context")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
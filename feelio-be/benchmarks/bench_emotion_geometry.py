@@ -0,0 +1,108 @@
+"""
+Landmark-to-emotion classification: per-frame Python vs one NumPy call.
+
+Generates N faces (default 100,000) of Face Mesh-shaped landmarks with mouth
+shapes spread over all four labels, then labels them with the per-frame
+rules VisionSystem used to run inline (attribute access on one face at a
+time) and with emotion_geometry.classify_landmarks on the whole
+(N, 468, 3) array and on the (N, 4, 3) mouth points. Checks that all three
+agree on every label and score and that the vectorized call is at least
+--min-speedup times faster.
+
+Usage:
+    python benchmarks/bench_emotion_geometry.py [--frames 100000] [--min-speedup 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from emotion_geometry import MOUTH_POINTS, classify_landmarks, default_thresholds  # noqa: E402
+
+
+def make_landmarks(n: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    landmarks = rng.random((n, 468, 3))
+    upper = rng.uniform(0.55, 0.7, n)
+    lower = upper + rng.uniform(0.0, 0.08, n)  # mouth opening
+    corners = (upper + lower) / 2 - rng.uniform(-0.035, 0.035, n)  # raised or dropped corners
+    for index, y in zip(MOUTH_POINTS, (upper, lower, corners + rng.normal(0, 0.002, n), corners)):
+        landmarks[:, index, 1] = y
+    return landmarks
+
+
+def classify_per_frame(faces, t):
+    """The pre-vectorization rules, one face at a time."""
+    labels, scores = [], []
+    for landmarks in faces:
+        upper_lip, lower_lip = landmarks[13].y, landmarks[14].y
+        left_corner, right_corner = landmarks[61].y, landmarks[291].y
+        mouth_open_dist = lower_lip - upper_lip
+        smile_ratio = (upper_lip + lower_lip) / 2 - (left_corner + right_corner) / 2
+        if smile_ratio > t.happy_smile:
+            labels.append("happy")
+        elif mouth_open_dist > t.surprise_open:
+            labels.append("surprise")
+        elif smile_ratio < t.sad_smile:
+            labels.append("sad")
+        else:
+            labels.append("neutral")
+        scores.append((smile_ratio, mouth_open_dist))
+    return labels, scores
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100_000)
+    parser.add_argument("--min-speedup", type=float, default=5.0)
+    args = parser.parse_args()
+
+    thresholds = default_thresholds()
+    landmarks = make_landmarks(args.frames)
+    mouth = np.ascontiguousarray(landmarks[:, MOUTH_POINTS])
+    # Like MediaPipe's landmark lists (objects with .x/.y/.z), built outside the timed loop;
+    # only the four mouth points are filled in to keep 100k faces in memory
+    faces = [{i: SimpleNamespace(x=p[0], y=p[1], z=p[2]) for i, p in zip(MOUTH_POINTS, face)}
+             for face in mouth.tolist()]
+
+    (ref_labels, ref_scores), loop_s = timed(classify_per_frame, faces, thresholds)
+    full, full_s = timed(classify_landmarks, landmarks, thresholds)
+    points, points_s = timed(classify_landmarks, mouth, thresholds)
+
+    print(f"{'method':<22}{'ms':>10}{'frames/s':>14}")
+    for name, seconds in (("per-frame loop", loop_s), ("numpy (N, 468, 3)", full_s), ("numpy (N, 4, 3)", points_s)):
+        print(f"{name:<22}{seconds * 1000:>10.1f}{args.frames / seconds:>14,.0f}")
+    counts = {label: ref_labels.count(label) for label in sorted(set(ref_labels))}
+    print(f"\nlabels: {counts}")
+
+    ref_scores = np.array(ref_scores)
+    for name, result in (("(N, 468, 3)", full), ("(N, 4, 3)", points)):
+        if result.labels.tolist() != ref_labels:
+            print(f"FAIL: {name} labels differ from the per-frame rules")
+            return 1
+        if not np.allclose(result.smile_ratio, ref_scores[:, 0]) or not np.allclose(result.mouth_open, ref_scores[:, 1]):
+            print(f"FAIL: {name} scores differ from the per-frame rules")
+            return 1
+    speedup = loop_s / full_s
+    if speedup < args.min_speedup:
+        print(f"FAIL: vectorized is only {speedup:.1f}x faster (want {args.min_speedup:g}x)")
+        return 1
+    print(f"OK: identical labels on {args.frames:,} frames, {speedup:.0f}x faster on full landmarks, "
+          f"{loop_s / points_s:.0f}x on mouth points")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
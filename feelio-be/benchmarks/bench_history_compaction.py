@@ -0,0 +1,93 @@
+"""
+Prompt-size check for rolling history compaction.
+
+Drives /api/chat for many turns against the stub backend, recording how many
+tokens each request carries (history + new fusion prompt), with compaction
+off and on. With compaction on, turn 200 should cost about as much as the
+first turns after the budget is reached instead of growing linearly.
+
+Usage:
+    python benchmarks/bench_history_compaction.py [--turns 200] [--budget 3000] [--keep 6]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import chat_service  # noqa: E402
+import llm  # noqa: E402
+from app import app  # noqa: E402
+from history import HistoryCompactor, estimate_tokens  # noqa: E402
+
+MESSAGES = [
+    "Work has been piling up and I can't switch off at night",
+    "I keep thinking my manager is disappointed in me",
+    "I'm fine, honestly, just tired",
+    "My sister called and we argued again",
+    "I tried the breathing thing and it helped a little",
+]
+
+
+class RecordingBackend(llm.StubBackend):
+    """Instant stub backend that records the prompt tokens of every chat call."""
+
+    def __init__(self):
+        super().__init__(latency_ms=0, tokens_per_sec=0)
+        self.prompt_tokens = []
+
+    def generate(self, history, prompt, model_name=None):
+        if "USER SAID:" not in prompt:
+            # One-shot summarizer call
+            return "- trend: mixed\n- concerns: work stress\n- actions: breathing"
+        tokens = sum(estimate_tokens(text) for _, text in history) + estimate_tokens(prompt)
+        self.prompt_tokens.append(tokens)
+        return "That sounds heavy. What feels most pressing about it right now?"
+
+
+def run(turns: int, compactor) -> list:
+    chat_service.compactor = compactor
+    backend = RecordingBackend()
+    llm.set_backend(backend)
+    client = app.test_client()
+    session_id = f"bench-{'on' if compactor else 'off'}"
+
+    for i in range(turns):
+        client.post("/api/chat", json={
+            "session_id": session_id,
+            "message": MESSAGES[i % len(MESSAGES)],
+            "emotion": "sad" if i % 3 else "neutral",
+        })
+
+    chat_service.end_session(session_id)
+    return backend.prompt_tokens
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=3000, help="history token budget")
+    parser.add_argument("--keep", type=int, default=6, help="raw turns kept")
+    args = parser.parse_args()
+
+    off = run(args.turns, None)
+    on = run(args.turns, HistoryCompactor(args.budget, args.keep, summarizer=llm.generate))
+
+    print(f"{'mode':<12}{'turn 1':>10}{'turn ' + str(args.turns):>12}{'max':>10}")
+    print(f"{'full':<12}{off[0]:>10}{off[-1]:>12}{max(off):>10}")
+    print(f"{'compacted':<12}{on[0]:>10}{on[-1]:>12}{max(on):>10}")
+
+    # Compacted prompts stay bounded by the budget plus one new turn
+    bound = args.budget + 2 * max(on[:2])
+    if max(on) > bound:
+        print(f"FAIL: compacted prompt exceeded {bound} tokens")
+        return 1
+    print(f"OK: compacted prompt stayed under {bound} tokens "
+          f"({off[-1] / on[-1]:.1f}x smaller than full history at turn {args.turns})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
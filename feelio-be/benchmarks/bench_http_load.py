@@ -0,0 +1,370 @@
+"""
+HTTP load test and latency benchmark for the Flask API (app.py).
+
+Starts app.py locally against the stub LLM backend, then drives concurrent
+session lifecycles (start -> N chats -> summary -> end) over real HTTP.
+For every (workers, concurrency) point in the sweep it reports requests/sec,
+p50/p95/p99 latency (overall and per endpoint), errors, and memory per
+session, measured as server RSS growth while a batch of sessions is held
+open. Results are written as JSON so runs can be compared between commits.
+
+Usage:
+    python benchmarks/bench_http_load.py [--workers 1,2] [--concurrency 1,8,32]
+        [--lifecycles 5] [--chats 5] [--stub-latency-ms 50] [--out results.json]
+
+--server gunicorn (default) runs `gunicorn -w W --threads T app:app`;
+--server flask runs the threaded development server (one worker only).
+With more than one worker, sessions are shared through a temporary SQLite
+session backend unless --session-backend says otherwise.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = [
+    "Work has been piling up and I can't switch off at night",
+    "I keep thinking my manager is disappointed in me",
+    "I'm fine, honestly, just tired",
+    "My sister called and we argued again",
+    "I tried the breathing thing and it helped a little",
+]
+EMOTIONS = ["sad", "neutral", "fear", "happy", "angry"]
+
+
+# ========== SERVER ==========
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """app.py running in a child process (gunicorn or the Flask dev server)."""
+
+    def __init__(self, args, workers: int, threads: int):
+        self.port = free_port()
+        self.tmpdir = tempfile.mkdtemp(prefix="feelio-bench-")
+
+        env = dict(os.environ)
+        env.update({
+            "LLM_BACKEND": "stub",
+            "STUB_LATENCY_MS": str(args.stub_latency_ms),
+            "STUB_TOKENS_PER_SEC": str(args.stub_tokens_per_sec),
+            "STUB_FAILURE_RATE": str(args.stub_failure_rate),
+            "LOG_LEVEL": "WARNING",
+            "PORT": str(self.port),
+            "HOST": "127.0.0.1",
+            "DEBUG_MODE": "False",
+            "SESSION_MAX_COUNT": str(max(args.mem_sessions * 2, 1000)),
+        })
+        backend = args.session_backend
+        if backend is None:
+            backend = "sqlite" if workers > 1 else ""
+        env["SESSION_BACKEND"] = backend
+        env["SESSION_DB_PATH"] = os.path.join(self.tmpdir, "sessions.db")
+
+        if args.server == "gunicorn":
+            cmd = [
+                sys.executable, "-m", "gunicorn", "app:app",
+                "-w", str(workers), "--threads", str(threads),
+                "-b", f"127.0.0.1:{self.port}", "--log-level", "warning",
+            ]
+        else:
+            cmd = [sys.executable, "app.py"]
+
+        self.proc = subprocess.Popen(
+            cmd, cwd=BACKEND_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self._wait_ready()
+
+    def _wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.proc.returncode}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=1)
+                conn.request("GET", "/health")
+                if conn.getresponse().status == 200:
+                    conn.close()
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("Server did not become healthy in time")
+
+    def pids(self) -> List[int]:
+        """Server process plus its workers (Linux /proc)."""
+        pids = [self.proc.pid]
+        try:
+            with open(f"/proc/{self.proc.pid}/task/{self.proc.pid}/children") as f:
+                pids += [int(p) for p in f.read().split()]
+        except OSError:
+            pass
+        return pids
+
+    def rss_bytes(self) -> Optional[int]:
+        """Total resident memory of the server processes, or None if unavailable."""
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+                            break
+            except OSError:
+                return None
+        return total
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+# ========== CLIENT ==========
+
+class Client:
+    """One keep-alive HTTP connection per virtual user."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def post(self, path: str, body: dict) -> dict:
+        payload = json.dumps(body)
+        for attempt in range(2):
+            try:
+                self.conn.request("POST", path, payload, {"Content-Type": "application/json"})
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"{path} -> HTTP {response.status}")
+                return json.loads(data)
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed the keep-alive connection; reconnect once
+                self.conn.close()
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency samples."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def timed(self, client: Client, name: str, path: str, body: dict) -> Optional[dict]:
+        start = time.perf_counter()
+        try:
+            result = client.post(path, body)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return None
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed)
+        return result
+
+
+def lifecycle(client: Client, rec: Recorder, user: int, n: int, chats: int, end: bool = True) -> str:
+    """Run start -> chats -> summary (-> end) for one session."""
+    started = rec.timed(client, "start", "/api/session/start", {})
+    session_id = (started or {}).get("session_id") or f"bench-{user}-{n}"
+    for i in range(chats):
+        rec.timed(client, "chat", "/api/chat", {
+            "session_id": session_id,
+            "message": MESSAGES[(user + i) % len(MESSAGES)],
+            "emotion": EMOTIONS[(n + i) % len(EMOTIONS)],
+        })
+    rec.timed(client, "summary", "/api/session/summary", {"session_id": session_id})
+    if end:
+        rec.timed(client, "end", "/api/session/end", {"session_id": session_id})
+    return session_id
+
+
+# ========== STATS ==========
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+
+# ========== RUN ==========
+
+def run_point(args, workers: int, concurrency: int) -> dict:
+    threads = args.threads or max(1, -(-concurrency // workers))
+    server = Server(args, workers, threads)
+    try:
+        # Warm-up: import paths, first model handle, connection setup
+        warm = Client(server.port)
+        lifecycle(warm, Recorder(), 0, 0, 1)
+        warm.close()
+
+        rec = Recorder()
+
+        def user(u: int) -> None:
+            client = Client(server.port)
+            try:
+                for n in range(args.lifecycles):
+                    lifecycle(client, rec, u, n, args.chats)
+            finally:
+                client.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(user, range(concurrency)))
+        wall = time.perf_counter() - start
+
+        all_samples = [v for values in rec.samples.values() for v in values]
+        memory = measure_memory(args, server) if args.mem_sessions else {}
+
+        point = {
+            "workers": workers,
+            "threads": threads,
+            "concurrency": concurrency,
+            "lifecycles": concurrency * args.lifecycles,
+            "requests": len(all_samples),
+            "errors": rec.errors,
+            "wall_s": round(wall, 3),
+            "requests_per_sec": round(len(all_samples) / wall, 1) if wall else 0.0,
+            "latency": latency_summary(all_samples),
+            "endpoints": {name: latency_summary(v) for name, v in sorted(rec.samples.items())},
+            "memory": memory,
+        }
+    finally:
+        server.stop()
+    return point
+
+
+def measure_memory(args, server: Server) -> dict:
+    """Hold mem_sessions sessions open and attribute RSS growth to them."""
+    before = server.rss_bytes()
+    client = Client(server.port)
+    rec = Recorder()
+    try:
+        for n in range(args.mem_sessions):
+            lifecycle(client, rec, 0, 10_000 + n, args.chats, end=False)
+    finally:
+        client.close()
+    after = server.rss_bytes()
+
+    result = {"sessions_held": args.mem_sessions}
+    if before is not None and after is not None:
+        result["rss_delta_bytes"] = after - before
+        result["bytes_per_session"] = round((after - before) / args.mem_sessions)
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(results: List[dict]) -> None:
+    print(f"{'workers':>7}{'conc':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+          f"{'errors':>8}{'B/session':>11}")
+    for r in results:
+        lat = r["latency"]
+        per_session = r["memory"].get("bytes_per_session", "-")
+        print(f"{r['workers']:>7}{r['concurrency']:>6}{r['requests_per_sec']:>9}"
+              f"{lat['p50_ms']:>9}{lat['p95_ms']:>9}{lat['p99_ms']:>9}"
+              f"{r['errors']:>8}{per_session:>11}")
+
+
+def int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", choices=["gunicorn", "flask"], default="gunicorn")
+    parser.add_argument("--workers", type=int_list, default=[1, 2], help="comma-separated sweep")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32], help="comma-separated sweep")
+    parser.add_argument("--threads", type=int, default=0, help="threads per worker (0 = derive from concurrency)")
+    parser.add_argument("--lifecycles", type=int, default=5, help="session lifecycles per virtual user")
+    parser.add_argument("--chats", type=int, default=5, help="chats per session")
+    parser.add_argument("--mem-sessions", type=int, default=200, help="sessions held open for the memory probe (0 = skip)")
+    parser.add_argument("--session-backend", default=None, help="override SESSION_BACKEND for the server")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0)
+    parser.add_argument("--stub-tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    parser.add_argument("--out", default=None, help="JSON results path (default: benchmarks/results/http_load-<commit>.json)")
+    args = parser.parse_args()
+
+    if args.server == "flask" and any(w != 1 for w in args.workers):
+        parser.error("--server flask supports --workers 1 only")
+
+    results = []
+    for workers in args.workers:
+        for concurrency in args.concurrency:
+            print(f"▶ workers={workers} concurrency={concurrency}", flush=True)
+            results.append(run_point(args, workers, concurrency))
+
+    commit = git_commit()
+    report = {
+        "benchmark": "http_load",
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+
+    out = args.out or os.path.join(BACKEND_DIR, "benchmarks", "results", f"http_load-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_table(results)
+    print(f"Results written to {out}")
+    return 1 if any(r["errors"] for r in results) and not args.stub_failure_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
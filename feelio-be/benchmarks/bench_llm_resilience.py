@@ -0,0 +1,127 @@
+"""
+Turn latency under upstream degradation, with and without the resilience layer.
+
+Drives /api/chat against a stub backend in three phases: degraded (a share
+of calls stall far past normal latency), outage (every call fails after its
+usual latency) and recovery. The bare stub is compared with the same stub
+wrapped in ResilientBackend (deadline, hedged retry, circuit breaker).
+Every turn must still get a reply (fallback text when the call is given up
+on); with resilience, p99 in the degraded phase must stay within the
+deadline, the breaker must short-circuit during the outage and close again
+once upstream recovers.
+
+Usage:
+    python benchmarks/bench_llm_resilience.py [--turns 50] [--latency-ms 40]
+        [--stall-ms 1500] [--stall-rate 0.1] [--deadline 0.5] [--hedge-after 0.12]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+logging.disable(logging.CRITICAL)
+
+import chat_service  # noqa: E402
+import llm  # noqa: E402
+from app import app  # noqa: E402
+from metrics import registry as metrics  # noqa: E402
+from resilience import CLOSED, ResilientBackend  # noqa: E402
+
+RESET_SECONDS = 1.0
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def drive(client, session_id: str, turns: int):
+    latencies = []
+    for i in range(turns):
+        start = time.perf_counter()
+        response = client.post("/api/chat", json={
+            "session_id": session_id, "message": f"Still thinking about work, day {i}", "emotion": "sad"
+        })
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200 or not response.get_json().get("response"):
+            raise SystemExit(f"FAIL: turn {i} got no reply ({response.status_code})")
+    return latencies
+
+
+def run(args, resilient: bool):
+    stub = llm.StubBackend(latency_ms=args.latency_ms, tokens_per_sec=0, seed=1)
+    backend = stub
+    if resilient:
+        backend = ResilientBackend(
+            stub, deadline=args.deadline, hedge_after=args.hedge_after,
+            failure_threshold=5, reset_seconds=RESET_SECONDS,
+        )
+    llm.set_backend(backend)
+    client = app.test_client()
+    session_id = f"bench-resilience-{resilient}"
+    phases = {}
+
+    stub.slow_rate, stub.slow_ms = args.stall_rate, args.stall_ms
+    phases["degraded"] = drive(client, session_id, args.turns)
+    stub.slow_rate = 0.0
+
+    stub.failure_rate = 1.0
+    phases["outage"] = drive(client, session_id, args.turns)
+    stub.failure_rate = 0.0
+
+    time.sleep(RESET_SECONDS)
+    phases["recovery"] = drive(client, session_id, max(5, args.turns // 5))
+
+    chat_service.end_session(session_id)
+    return phases, backend
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--stall-ms", type=float, default=1500.0)
+    parser.add_argument("--stall-rate", type=float, default=0.1)
+    parser.add_argument("--deadline", type=float, default=0.5)
+    parser.add_argument("--hedge-after", type=float, default=0.12)
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'backend':<11}{'phase':<10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for resilient in (False, True):
+        phases, backend = run(args, resilient)
+        results[resilient] = (phases, backend)
+        for phase, latencies in phases.items():
+            print(f"{'resilient' if resilient else 'bare':<11}{phase:<10}"
+                  f"{percentile(latencies, 50) * 1000:>9.0f}{percentile(latencies, 99) * 1000:>9.0f}"
+                  f"{max(latencies) * 1000:>9.0f}")
+
+    total = metrics.counter_total
+    trips, shorts = total("feelio_breaker_trips_total"), total("feelio_llm_short_circuits_total")
+    print(f"\nhedges {total('feelio_llm_hedges_total'):.0f} (won {total('feelio_llm_hedge_wins_total'):.0f}), "
+          f"deadlines {total('feelio_llm_deadlines_total'):.0f}, breaker trips {trips:.0f}, short-circuits {shorts:.0f}")
+
+    bare_phases, _ = results[False]
+    phases, backend = results[True]
+    p99 = percentile(phases["degraded"], 99)
+    if p99 > args.deadline + 0.1 or p99 >= percentile(bare_phases["degraded"], 99):
+        print(f"FAIL: degraded p99 {p99 * 1000:.0f} ms is not bounded by the deadline")
+        return 1
+    if not trips or not shorts:
+        print("FAIL: the circuit breaker never short-circuited during the outage")
+        return 1
+    if backend.breaker().state != CLOSED:
+        print("FAIL: the circuit breaker did not close after recovery")
+        return 1
+    print(f"OK: degraded p99 {p99 * 1000:.0f} ms (bare {percentile(bare_phases['degraded'], 99) * 1000:.0f} ms); "
+          f"outage mean {sum(phases['outage']) / len(phases['outage']) * 1000:.0f} ms "
+          f"(bare {sum(bare_phases['outage']) / len(bare_phases['outage']) * 1000:.0f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Overhead check for per-stage latency instrumentation (metrics.py).
+
+Measures the raw cost of one timing span and one counter increment, then
+the cost of a full /api/chat request (stub backend with zero latency) with
+metrics enabled and disabled. Spans should cost a few microseconds per turn,
+a negligible fraction of a real LLM round trip.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py [--requests 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import llm  # noqa: E402
+from app import app  # noqa: E402
+from metrics import registry  # noqa: E402
+
+
+def per_call_ns(fn, n: int = 200_000) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def span_once() -> None:
+    with registry.span("bench"):
+        pass
+
+
+def inc_once() -> None:
+    registry.inc("feelio_bench_total")
+
+
+def chat_us(count: int) -> float:
+    client = app.test_client()
+    start = time.perf_counter()
+    for i in range(count):
+        client.post("/api/chat", json={
+            "session_id": f"bench-{i % 50}",
+            "message": "Work has been piling up and I can't switch off",
+            "emotion": "sad",
+        })
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    llm.set_backend(llm.StubBackend(latency_ms=0, tokens_per_sec=0))
+
+    registry.enabled = True
+    span_ns = per_call_ns(span_once)
+    inc_ns = per_call_ns(inc_once)
+    chat_us(200)  # warm-up
+    on = chat_us(args.requests)
+
+    registry.enabled = False
+    null_ns = per_call_ns(span_once)
+    off = chat_us(args.requests)
+
+    print(f"span (enabled):   {span_ns:8.0f} ns")
+    print(f"span (disabled):  {null_ns:8.0f} ns")
+    print(f"counter inc:      {inc_ns:8.0f} ns")
+    print(f"/api/chat on:     {on:8.1f} us/request")
+    print(f"/api/chat off:    {off:8.1f} us/request  (overhead {on - off:+.1f} us)")
+
+    # ~8 spans and a few counters per request; keep well under 50 us
+    if span_ns > 5_000:
+        print("FAIL: span overhead too high to leave enabled")
+        return 1
+    print("OK: instrumentation overhead is negligible next to an LLM call")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Latency of per-turn model routing vs always using the full model.
+
+Drives /api/chat for a conversation that mixes short check-ins with longer,
+conflicted messages against a stub backend whose fast model answers sooner
+than the full one. Runs once with routing off and once with it on, then
+reports per-tier turns and latency from the router, mean turn latency, and
+checks that both tiers wrote into one coherent chat history.
+
+Usage:
+    python benchmarks/bench_model_routing.py [--turns 40] [--full-ms 120] [--fast-ms 30]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+logging.disable(logging.INFO)
+
+import chat_service  # noqa: E402
+import llm  # noqa: E402
+from app import app  # noqa: E402
+from config import Config  # noqa: E402
+from routing import FAST, FULL, router  # noqa: E402
+
+SCRIPT = [
+    ("Hi again", "neutral"),
+    ("Work has been piling up and I can't switch off at night, even on weekends", "sad"),
+    ("Yeah", "sad"),
+    ("I'm fine, honestly, just tired", "sad"),
+    ("Thanks, that helps", "neutral"),
+    ("My sister called and we argued again about who looks after our dad", "sad"),
+    ("Maybe", "sad"),
+    ("Okay", "neutral"),
+]
+
+
+def run(enabled: bool, turns: int, full_ms: float, fast_ms: float):
+    router.enabled = enabled
+    router.reset_stats()
+    llm.set_backend(llm.StubBackend(
+        latency_ms=full_ms, tokens_per_sec=0, model_latency_ms={Config.FAST_MODEL_NAME: fast_ms}
+    ))
+    client = app.test_client()
+    session_id = f"bench-routing-{'on' if enabled else 'off'}"
+
+    latencies = []
+    for i in range(turns):
+        message, emotion = SCRIPT[i % len(SCRIPT)]
+        start = time.perf_counter()
+        client.post("/api/chat", json={"session_id": session_id, "message": message, "emotion": emotion})
+        latencies.append(time.perf_counter() - start)
+
+    session = chat_service.sessions.get(session_id)
+    history_ok = session is not None and len(session["chat"].history) == 2 * turns
+    chat_service.end_session(session_id)
+    return latencies, router.stats(), history_ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--full-ms", type=float, default=120.0)
+    parser.add_argument("--fast-ms", type=float, default=30.0)
+    args = parser.parse_args()
+
+    # Keep every exchange in the chat history so coherence is easy to check
+    Config.HISTORY_COMPACTION = False
+    Config.HISTORY_RETRIEVAL = False
+
+    results = {}
+    print(f"{'routing':<9}{'tier':<6}{'turns':>7}{'avg ms':>9}{'prompt tok':>12}")
+    for enabled in (False, True):
+        latencies, stats, history_ok = run(enabled, args.turns, args.full_ms, args.fast_ms)
+        results[enabled] = (sum(latencies) / len(latencies), stats, history_ok)
+        for tier in (FAST, FULL):
+            s = stats[tier]
+            print(f"{'on' if enabled else 'off':<9}{tier:<6}{s['turns']:>7}{s['avg_latency_ms']:>9.1f}"
+                  f"{s['prompt_tokens']:>12}")
+
+    off_mean, _, off_history = results[False]
+    on_mean, on_stats, on_history = results[True]
+    print(f"\nmean turn latency: off {off_mean * 1000:.1f} ms, on {on_mean * 1000:.1f} ms")
+
+    if not (off_history and on_history):
+        print("FAIL: chat history does not hold every exchange")
+        return 1
+    if not (on_stats[FAST]["turns"] and on_stats[FULL]["turns"]):
+        print("FAIL: routing did not use both tiers")
+        return 1
+    if on_mean >= off_mean:
+        print("FAIL: routing did not reduce mean turn latency")
+        return 1
+    print(f"OK: routing cut mean turn latency by {1 - on_mean / off_mean:.0%} with one shared history")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
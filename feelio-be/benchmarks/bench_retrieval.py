@@ -0,0 +1,76 @@
+"""
+Latency check for the per-session BM25 turn index (retrieval.py).
+
+Indexes thousands of synthetic turns incrementally, then times top-k
+lookups for realistic user messages. Lookups should stay sub-millisecond.
+
+Usage:
+    python benchmarks/bench_retrieval.py [--turns 5000] [--queries 2000] [--k 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import TurnIndex  # noqa: E402
+
+TOPICS = {
+    "work": "deadline manager meeting project overtime promotion email boss colleague",
+    "sleep": "insomnia night awake tired nightmare bed rest exhausted alarm",
+    "family": "mother father sister brother argument dinner visit call parents",
+    "panic": "heart racing breath chest panic attack dizzy shaking scared",
+    "friends": "lonely party message ignored friend trust weekend plans",
+    "health": "doctor pain appointment medication diet exercise gym headache",
+}
+FILLER = "i have been thinking about how this makes me feel and what to do next".split()
+REPLY = "It sounds like that has been weighing on you. What part of it feels heaviest?"
+
+
+def synthetic_turn(rng: random.Random) -> str:
+    topic = rng.choice(list(TOPICS.values())).split()
+    words = rng.sample(topic, 3) + rng.sample(FILLER, 6)
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    index = TurnIndex()
+
+    start = time.perf_counter()
+    for turn in range(args.turns):
+        index.add(turn, f"{synthetic_turn(rng)} {REPLY}")
+    add_us = (time.perf_counter() - start) / args.turns * 1e6
+
+    queries = [synthetic_turn(rng) for _ in range(args.queries)]
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k=args.k, exclude_from=args.turns - 2)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"turns indexed:      {args.turns} ({add_us:.1f} us/turn)")
+    print(f"search p50 / p99:   {p50:.3f} ms / {p99:.3f} ms")
+
+    if p50 >= 1.0:
+        print("FAIL: median lookup is not sub-millisecond")
+        return 1
+    print("OK: sub-millisecond retrieval")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark for the compiled safety matcher (safety_matcher.py).
+
+Times one scan of messages of increasing length against lexicons of
+increasing size, for the Aho-Corasick matcher and for the old
+`any(phrase in lowered ...)` scan. The matcher's cost should grow with
+input length only; the old scan also grows with the number of phrases.
+
+Usage:
+    python benchmarks/bench_safety_matcher.py [--repeat 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from safety_matcher import PhraseMatcher, build_matcher  # noqa: E402
+
+LEXICON_SIZES = [10, 100, 1000, 5000]
+INPUT_LENGTHS = [200, 2000, 20000]
+
+WORDS = (
+    "work sleep tired sister manager call night week heavy worry breathe "
+    "walk talk feel better again honestly maybe still today tomorrow"
+).split()
+
+
+def synthetic_lexicon(size: int, rng: random.Random) -> list:
+    """Random multi-word phrases that never occur in the benign text."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [
+        " ".join("".join(rng.choice(letters) for _ in range(rng.randint(4, 8)))
+                 for _ in range(rng.randint(1, 3)))
+        for _ in range(size)
+    ]
+
+
+def benign_text(length: int, rng: random.Random) -> str:
+    words = []
+    total = 0
+    while total < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def time_us(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = {n: benign_text(n, rng) for n in INPUT_LENGTHS}
+
+    print(f"{'phrases':>8}{'chars':>8}{'matcher us':>12}{'ns/char':>9}{'any() us':>11}")
+    per_char = {}
+    for size in LEXICON_SIZES:
+        phrases = synthetic_lexicon(size, rng)
+        matcher = PhraseMatcher(phrases)
+        lowered_phrases = [p.lower() for p in phrases]
+
+        def old_scan(text: str) -> bool:
+            lowered = text.lower()
+            return any(phrase in lowered for phrase in lowered_phrases)
+
+        for length in INPUT_LENGTHS:
+            text = texts[length]
+            repeat = max(1, args.repeat * 200 // length)
+            new_us = time_us(matcher.match, text, repeat)
+            old_us = time_us(old_scan, text, repeat)
+            per_char[(size, length)] = new_us * 1000 / length
+            print(f"{size:>8}{length:>8}{new_us:>12.1f}{per_char[(size, length)]:>9.0f}{old_us:>11.1f}")
+
+    # Sanity: the bundled lexicon still catches obfuscated phrasing
+    bundled = build_matcher()
+    assert bundled.match("I want to k1ll   myself") == ["kill myself"]
+    assert not bundled.match("I have the skill myself")
+
+    longest = INPUT_LENGTHS[-1]
+    small, large = per_char[(LEXICON_SIZES[0], longest)], per_char[(LEXICON_SIZES[-1], longest)]
+    growth = large / small
+    print(f"\nns/char at {longest} chars: {small:.0f} ({LEXICON_SIZES[0]} phrases) vs "
+          f"{large:.0f} ({LEXICON_SIZES[-1]} phrases) -> {growth:.2f}x")
+    if growth > 2.0:
+        print("FAIL: matcher cost grew with lexicon size")
+        return 1
+    print("OK: matcher cost is linear in input length and flat in lexicon size")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Per-session ordering and idempotent retries under double-submits.
+
+A client that double-submits sends every message twice at the same time.
+Runs a conversation that way against /api/chat with and without an
+Idempotency-Key and counts upstream LLM calls. With serialization, the
+chat history must stay well-formed: alternating user/model entries where
+each reply is the one generated for the prompt before it. A second burst
+across many sessions checks that different sessions still run in parallel.
+
+Usage:
+    python benchmarks/bench_session_ordering.py [--messages 20] [--sessions 16] [--latency-ms 40]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+logging.disable(logging.CRITICAL)
+
+import chat_service  # noqa: E402
+import llm  # noqa: E402
+from app import app  # noqa: E402
+from config import Config  # noqa: E402
+
+
+class CountingStub(llm.StubBackend):
+    """Stub backend that counts generate calls."""
+
+    def __init__(self, latency_ms: float):
+        super().__init__(latency_ms=latency_ms, tokens_per_sec=0)
+        self.calls = 0
+        self._count_lock = threading.Lock()
+
+    def generate(self, history, prompt, model_name=None):
+        with self._count_lock:
+            self.calls += 1
+        return super().generate(history, prompt, model_name)
+
+
+def double_submit(session_id: str, messages: int, use_keys: bool) -> None:
+    """Send each message twice concurrently, as a double-clicking client does."""
+    client_a, client_b = app.test_client(), app.test_client()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for i in range(messages):
+            body = {"session_id": session_id, "message": f"Message number {i} about my week", "emotion": "sad"}
+            headers = {"Idempotency-Key": f"{session_id}-{i}"} if use_keys else {}
+            list(pool.map(lambda client: client.post("/api/chat", json=body, headers=headers), (client_a, client_b)))
+
+
+def well_formed(stub: llm.StubBackend, history) -> bool:
+    """Alternating user/model entries, each reply matching its own prompt."""
+    for i in range(0, len(history), 2):
+        (user_role, prompt), (model_role, reply) = history[i], history[i + 1]
+        if user_role != "user" or model_role != "model" or reply != stub._reply([], prompt):
+            return False
+    return len(history) % 2 == 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    # Keep every exchange in the chat history so it can be checked
+    Config.HISTORY_COMPACTION = False
+    Config.HISTORY_RETRIEVAL = False
+
+    print(f"{'double-submit':<22}{'LLM calls':>10}{'turns':>7}{'history ok':>12}")
+    calls = {}
+    ok = True
+    for use_keys in (False, True):
+        stub = CountingStub(args.latency_ms)
+        llm.set_backend(stub)
+        session_id = f"double-{use_keys}"
+        double_submit(session_id, args.messages, use_keys)
+        session = chat_service.sessions.get(session_id)
+        history_ok = well_formed(stub, session["chat"].history)
+        calls[use_keys] = stub.calls
+        ok &= history_ok
+        print(f"{'with Idempotency-Key' if use_keys else 'without key':<22}{stub.calls:>10}"
+              f"{session['turns'].total:>7}{str(history_ok):>12}")
+        chat_service.end_session(session_id)
+
+    # Different sessions must not wait on each other
+    llm.set_backend(CountingStub(args.latency_ms))
+
+    def one(i):
+        app.test_client().post("/api/chat", json={
+            "session_id": f"parallel-{i}", "message": "Just checking in", "emotion": "neutral"
+        })
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        list(pool.map(one, range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    serial = args.sessions * args.latency_ms / 1000
+    print(f"\n{args.sessions} sessions at once: {elapsed * 1000:.0f} ms (one after another: {serial * 1000:.0f} ms)")
+
+    if not ok:
+        print("FAIL: chat history is not well-formed")
+        return 1
+    if calls[True] != args.messages:
+        print(f"FAIL: {calls[True]} LLM calls for {args.messages} messages with idempotency keys")
+        return 1
+    if elapsed >= serial / 2:
+        print("FAIL: different sessions were serialized")
+        return 1
+    print(f"OK: idempotency keys cut LLM calls from {calls[False]} to {calls[True]}; sessions stay parallel")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Cost of /api/session/summary as sessions grow, and the background summary.
+
+Builds sessions of increasing length and times summary_payload against the
+previous implementation, which walked every held turn to count emotions.
+Then drives /api/chat with SESSION_LLM_SUMMARY on against a slow stub and
+checks the summary endpoint stays fast while model summaries are written in
+the background every SESSION_SUMMARY_EVERY turns.
+
+Usage:
+    python benchmarks/bench_session_summary.py [--sizes 10,100,1000,10000] [--summary-ms 300]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ["SESSION_LLM_SUMMARY"] = "true"
+os.environ.setdefault("SESSION_SUMMARY_EVERY", "5")
+os.environ["SESSION_MAX_TURNS"] = "0"  # keep every turn, so the old walk sees them all
+logging.disable(logging.CRITICAL)
+
+import chat_service  # noqa: E402
+import llm  # noqa: E402
+from app import app  # noqa: E402
+from config import Config  # noqa: E402
+from turn_store import Turn  # noqa: E402
+
+EMOTIONS = ["neutral", "happy", "sad", "surprise", "fear", "angry"]
+
+
+def legacy_summary(session: dict) -> dict:
+    """summary_payload as it was: count emotions over every held turn."""
+    turns = session["turns"]
+    emotion_counts = {}
+    for turn in turns:
+        emotion_counts[turn.emotion] = emotion_counts.get(turn.emotion, 0) + 1
+    summary = f"Session had {turns.total} exchanges. Primary emotions: {', '.join(emotion_counts.keys())}"
+    return {"success": True, "summary": summary, "turn_count": turns.total, "emotions": emotion_counts}
+
+
+def time_call(fn, session, repeat: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(session)
+    return (time.perf_counter() - start) / repeat
+
+
+class SlowSummaryStub(llm.StubBackend):
+    """Stub whose one-shot summary calls (no history) are slow."""
+
+    def __init__(self, summary_ms: float):
+        super().__init__(latency_ms=5, tokens_per_sec=0)
+        self.summary_ms = summary_ms
+        self.summaries = 0
+
+    def generate(self, history, prompt, model_name=None):
+        if not history and prompt.startswith("You are an AI therapist preparing"):
+            time.sleep(self.summary_ms / 1000)
+            self.summaries += 1
+            return "- Mostly sad, easing\n- Work stress\n- One short walk a day"
+        return super().generate(history, prompt, model_name)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    parser.add_argument("--summary-ms", type=float, default=300.0)
+    parser.add_argument("--turns", type=int, default=12)
+    args = parser.parse_args()
+
+    print(f"{'turns':>7}{'before us':>12}{'after us':>11}")
+    ok = True
+    for size in (int(n) for n in args.sizes.split(",")):
+        session = chat_service.new_session()
+        for i in range(size):
+            session["turns"].append(Turn("How are you", "I'm here", EMOTIONS[i % len(EMOTIONS)]))
+        before, after = time_call(legacy_summary, session), time_call(chat_service.summary_payload, session)
+        payload = chat_service.summary_payload(session)
+        ok &= payload["emotions"] == legacy_summary(session)["emotions"]
+        print(f"{size:>7}{before * 1e6:>12.1f}{after * 1e6:>11.1f}")
+        largest = (before, after)
+
+    stub = SlowSummaryStub(args.summary_ms)
+    llm.set_backend(stub)
+    client = app.test_client()
+    slowest = 0.0
+    for i in range(args.turns):
+        client.post("/api/chat", json={"session_id": "bench-summary", "message": f"Long week, day {i}", "emotion": "sad"})
+        start = time.perf_counter()
+        body = client.post("/api/session/summary", json={"session_id": "bench-summary"}).get_json()
+        slowest = max(slowest, time.perf_counter() - start)
+    time.sleep(args.summary_ms / 1000 * 2)
+    body = client.post("/api/session/summary", json={"session_id": "bench-summary"}).get_json()
+    print(f"\n{args.turns} turns, summary every {Config.SESSION_SUMMARY_EVERY}: {stub.summaries} model summaries, "
+          f"slowest summary call {slowest * 1000:.1f} ms (model takes {args.summary_ms:.0f} ms)")
+    print(f"clinical summary covers {body['clinical_summary_turns']} turns")
+
+    if not ok:
+        print("FAIL: emotion counts differ from a full walk")
+        return 1
+    if largest[1] >= largest[0]:
+        print("FAIL: summary is not cheaper than walking the turns")
+        return 1
+    if slowest >= args.summary_ms / 1000 / 2:
+        print("FAIL: the summary endpoint waited on the model")
+        return 1
+    if not body.get("clinical_summary") or body["clinical_summary_turns"] < Config.SESSION_SUMMARY_EVERY:
+        print("FAIL: no background summary was cached")
+        return 1
+    print(f"OK: summary at {args.sizes.split(',')[-1]} turns {largest[1] * 1e6:.1f} us vs {largest[0] * 1e6:.1f} us; "
+          f"endpoint never waited on the model")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
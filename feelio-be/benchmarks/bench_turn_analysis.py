@@ -0,0 +1,106 @@
+"""
+Per-turn feature extraction cost: unified TurnAnalysis vs separate calls.
+
+The baseline reproduces the previous per-turn path, where the safety check,
+contradiction check, playbook selection and word count each lowercased or
+re-scanned the message (and extract_word_count re-imported `re`). The new
+path is one analyze_turn() call that normalizes once and runs one automaton.
+
+Usage:
+    python benchmarks/bench_turn_analysis.py [--turns 20000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logging.disable(logging.WARNING)
+
+from safety_matcher import safety_matcher  # noqa: E402
+from turn_analysis import analyze_turn  # noqa: E402
+
+MESSAGES = [
+    ("I'm fine, honestly, just tired", "sad"),
+    ("I've been panicking before every meeting and can't sleep properly", "fear"),
+    ("Work has been piling up, I'm completely burnt out and overwhelmed", "angry"),
+    ("My sister called and we argued again about the same old thing", "neutral"),
+    ("I tried the breathing exercise you suggested and it helped a little bit, "
+     "although I still feel like everything is too much most evenings", "sad"),
+]
+
+PLAYBOOKS = {
+    "sad": "a", "fear": "b", "angry": "c", "disgust": "d",
+    "surprise": "e", "neutral": "f", "default": "g",
+}
+DISTRESS_EMOTIONS = {"sad", "fear", "angry", "disgust", "surprise"}
+
+
+# ----- previous implementation (separate passes) -----
+
+def legacy_contradiction(user_text: str, emotion: str) -> str:
+    text = user_text.lower()
+    says_fine = any(token in text for token in ["fine", "okay", "good"])
+    if says_fine and emotion in DISTRESS_EMOTIONS:
+        return f"User says fine but looks {emotion}. Invite gentle check-in."
+    return "none noted"
+
+
+def legacy_playbook(emotion: str, user_text: str) -> str:
+    text = user_text.lower()
+    if "panic" in text or "anxious" in text:
+        return "panic"
+    if "sleep" in text or "insomnia" in text:
+        return "sleep"
+    if "overwhelm" in text or "burnout" in text:
+        return "burnout"
+    return PLAYBOOKS.get(emotion, PLAYBOOKS["default"])
+
+
+def legacy_word_count(text: str) -> int:
+    import re
+    return len(re.findall(r"\w+", text))
+
+
+def legacy_turn(user_text: str, emotion: str) -> tuple:
+    risk = safety_matcher.search(user_text)
+    contradiction = legacy_contradiction(user_text, emotion)
+    playbook = legacy_playbook(emotion, user_text)
+    words = legacy_word_count(user_text)
+    pace = "slower" if words > 18 else "normal"
+    return risk, contradiction, playbook, words, pace
+
+
+def per_turn_us(fn, turns: int) -> float:
+    start = time.perf_counter()
+    for i in range(turns):
+        text, emotion = MESSAGES[i % len(MESSAGES)]
+        fn(text, emotion)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20000)
+    args = parser.parse_args()
+
+    per_turn_us(legacy_turn, 500)  # warm-up
+    per_turn_us(analyze_turn, 500)
+
+    legacy = per_turn_us(legacy_turn, args.turns)
+    unified = per_turn_us(analyze_turn, args.turns)
+
+    print(f"separate calls:  {legacy:7.1f} us/turn")
+    print(f"analyze_turn:    {unified:7.1f} us/turn  ({legacy / unified:.2f}x)")
+
+    if unified > legacy:
+        print("FAIL: unified analysis is slower than separate calls")
+        return 1
+    print("OK: one pass per turn")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
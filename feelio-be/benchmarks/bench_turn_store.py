@@ -0,0 +1,123 @@
+"""
+Memory and append cost of the shared TurnStore vs the previous turn logs.
+
+Stores 10k turns three ways: the API's old list of dicts, the CLI's old
+SessionLog (SessionEntry objects in a list), and TurnStore. Message text is
+allocated before measuring; emotion labels are decoded per turn, as they
+are from request JSON, so the numbers are per-turn overhead including the
+label copies the old logs kept alive. Also times appends into full logs,
+where the old SessionLog evicted with list.pop(0).
+
+Usage:
+    python benchmarks/bench_turn_store.py [--turns 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from turn_store import Turn, TurnStore  # noqa: E402
+
+EMOTIONS = ["neutral", "happy", "sad", "surprise", "fear", "angry"]
+
+
+class LegacyEntry:
+    """SessionEntry as it was: a plain object with a per-instance __dict__."""
+
+    def __init__(self, user_text, ai_text, emotion, timestamp=None):
+        self.user_text = user_text
+        self.ai_text = ai_text
+        self.emotion = emotion
+        self.timestamp = timestamp or time.time()
+
+
+def legacy_dicts(texts):
+    turns = []
+    for user, therapist, label in texts:
+        emotion = label.decode()
+        turns.append({"user": user, "therapist": therapist, "emotion": emotion, "crisis": False})
+    return turns
+
+
+def legacy_entries(texts):
+    entries = []
+    for user, therapist, label in texts:
+        entries.append(LegacyEntry(user, therapist, label.decode()))
+    return entries
+
+
+def turn_store(texts):
+    store = TurnStore()
+    for user, therapist, label in texts:
+        store.append(Turn(user, therapist, label.decode()))
+    return store
+
+
+def measure_bytes(build, texts) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(texts)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def append_full_us(append, turns: int) -> float:
+    start = time.perf_counter()
+    for i in range(turns):
+        append(i)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10000)
+    args = parser.parse_args()
+
+    texts = [
+        (f"user message {i} " * 4, f"therapist reply {i} " * 6, EMOTIONS[i % len(EMOTIONS)].encode())
+        for i in range(args.turns)
+    ]
+
+    print(f"memory for {args.turns} turns (excluding message text):")
+    results = {}
+    for name, build in (
+        ("list of dicts (API)", legacy_dicts),
+        ("SessionEntry list (CLI)", legacy_entries),
+        ("TurnStore", turn_store),
+    ):
+        results[name] = measure_bytes(build, texts)
+        print(f"  {name:<26}{results[name] / 1024:9.0f} KiB  {results[name] / args.turns:6.0f} B/turn")
+
+    print("\nappend into a full log:")
+    for capacity in (100, args.turns):
+        legacy_log = []
+
+        def legacy_append(i):
+            legacy_log.append(LegacyEntry("u", "a", "sad"))
+            if len(legacy_log) > capacity:
+                legacy_log.pop(0)
+
+        ring = TurnStore(capacity=capacity)
+        fill = capacity * 2
+        append_full_us(legacy_append, fill)  # fill to capacity first
+        legacy_us = append_full_us(legacy_append, 100000)
+        append_full_us(lambda i: ring.append(Turn("u", "a", "sad")), fill)
+        ring_us = append_full_us(lambda i: ring.append(Turn("u", "a", "sad")), 100000)
+        print(f"  {capacity:>6} turns: list + pop(0) {legacy_us:6.2f} us   TurnStore ring {ring_us:6.2f} us")
+
+    best_legacy = min(results["list of dicts (API)"], results["SessionEntry list (CLI)"])
+    if results["TurnStore"] >= best_legacy:
+        print("FAIL: TurnStore is not smaller than the previous turn logs")
+        return 1
+    print(f"\nOK: TurnStore uses {best_legacy / results['TurnStore']:.1f}x less memory per turn")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
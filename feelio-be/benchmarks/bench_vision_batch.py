@@ -0,0 +1,112 @@
+"""
+Batch timeline throughput: one process vs a process pool, and output sizes.
+
+Writes a video (default 60 s at 30 fps, 640x360, mp4v) with the face from
+--image drifting over a noisy background, then runs vision_batch.analyze
+on it with one worker and with --workers. Checks that both timelines have
+one row per frame and agree on the label for nearly every frame (chunks
+start with fresh tracking, so a few frames at chunk edges may differ),
+and that the pool is faster when the machine has more than one CPU.
+Reports the CSV and .npz sizes of the timeline.
+
+Needs opencv-python and mediapipe (requirements.txt).
+
+Usage:
+    python benchmarks/bench_vision_batch.py --image face.jpg [--seconds 60] [--workers 4] [--chunk-seconds 10]
+"""
+
+import argparse
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logging.disable(logging.CRITICAL)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from vision_batch import NO_FACE, analyze, write_timeline  # noqa: E402
+
+FPS = 30
+WIDTH, HEIGHT = 640, 360
+
+
+def write_video(path: str, image: str, seconds: float) -> int:
+    face = None
+    if image:
+        face = cv2.imread(image)
+        if face is None:
+            raise SystemExit(f"Could not read {image}")
+        face = cv2.resize(face, (HEIGHT // 2, HEIGHT // 2))
+
+    background = np.random.default_rng(0).integers(90, 160, size=(HEIGHT, WIDTH, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), FPS, (WIDTH, HEIGHT))
+    if not writer.isOpened():
+        raise SystemExit("This OpenCV build cannot write mp4v video")
+    count = int(seconds * FPS)
+    for i in range(count):
+        frame = background.copy()
+        if face is not None:
+            x = int((WIDTH - face.shape[1]) * (0.5 + 0.4 * math.sin(i / 40)))
+            y = int((HEIGHT - face.shape[0]) * (0.5 + 0.3 * math.cos(i / 55)))
+            frame[y:y + face.shape[0], x:x + face.shape[1]] = face
+        writer.write(frame)
+    writer.release()
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", default="")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "session.mp4")
+        count = write_video(video, args.image, args.seconds)
+
+        results = {}
+        for workers in (1, args.workers):
+            start = time.perf_counter()
+            timeline = analyze(video, workers=workers, chunk_seconds=args.chunk_seconds)
+            results[workers] = (timeline, time.perf_counter() - start)
+
+        single, single_s = results[1]
+        pooled, pooled_s = results[args.workers]
+        csv_path, npz_path = os.path.join(tmp, "timeline.csv"), os.path.join(tmp, "timeline.npz")
+        write_timeline(pooled, csv_path)
+        write_timeline(pooled, npz_path)
+        csv_kb, npz_kb = os.path.getsize(csv_path) / 1024, os.path.getsize(npz_path) / 1024
+
+    print(f"{'workers':>8}{'seconds':>9}{'fps':>8}{'faces':>8}")
+    for workers, (timeline, elapsed) in results.items():
+        faces = sum(label != NO_FACE for label in timeline.labels)
+        print(f"{workers:>8}{elapsed:>9.1f}{len(timeline.labels) / elapsed:>8.0f}{faces:>8}")
+    agree = sum(a == b for a, b in zip(single.labels, pooled.labels)) / count
+    cpus = os.cpu_count() or 1
+    print(f"\n{count} frames; labels agree on {agree * 100:.1f}%; timeline {csv_kb:.0f} KB as CSV, "
+          f"{npz_kb:.0f} KB as .npz; {cpus} CPU(s)")
+
+    for name, timeline in (("1 worker", single), (f"{args.workers} workers", pooled)):
+        if len(timeline.labels) != count or not np.all(np.diff(timeline.timestamps) > 0):
+            print(f"FAIL: {name} timeline has {len(timeline.labels)} rows for {count} frames, or is out of order")
+            return 1
+    if agree < 0.98:
+        print(f"FAIL: only {agree * 100:.1f}% of labels agree between 1 and {args.workers} workers")
+        return 1
+    if cpus > 1 and args.workers > 1 and pooled_s >= single_s:
+        print(f"FAIL: {args.workers} workers took {pooled_s:.1f}s vs {single_s:.1f}s for one")
+        return 1
+    print(f"OK: {single_s / pooled_s:.1f}x with {args.workers} workers on {cpus} CPU(s), "
+          f"{agree * 100:.1f}% label agreement")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+CPU cost and label freshness of the camera pipeline at different inference rates.
+
+Feeds VisionSystem from a source that delivers frames at a camera's pace
+(default 30 fps) and runs it for a few seconds with every frame classified
+(target 0, the old one-frame-one-inference behaviour) and with a target
+inference rate. Reports process CPU, frames classified and dropped, and the
+age of the newest classified frame sampled while running. Pass --image with
+a photo of a face for realistic Face Mesh cost; the default synthetic frame
+has no face, so only detection runs.
+
+Needs opencv-python and mediapipe (requirements.txt).
+
+Usage:
+    python benchmarks/bench_vision_pipeline.py [--camera-fps 30] [--target-fps 5] [--seconds 5] [--image face.jpg]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logging.disable(logging.CRITICAL)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from vision_module import VisionSystem  # noqa: E402
+
+
+class PacedSource:
+    """Serves copies of one frame at a camera's frame rate (cv2.VideoCapture interface)."""
+
+    def __init__(self, frame, fps: float):
+        self.frame = frame
+        self.period = 1.0 / fps
+        self._next = time.perf_counter()
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        delay = self._next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = max(self._next + self.period, time.perf_counter())
+        return True, self.frame.copy()
+
+    def release(self):
+        pass
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def run(frame, args, target_fps: float):
+    vision = VisionSystem(source=PacedSource(frame, args.camera_fps), target_fps=target_fps, headless=True)
+    ages = []
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    vision.start()
+    while time.perf_counter() - wall_start < args.seconds:
+        time.sleep(0.05)
+        age = vision.stats()["frame_age_ms"]
+        if age is not None:
+            ages.append(age)
+    vision.stop()
+    cpu = time.process_time() - cpu_start
+    return vision.stats(), cpu / args.seconds, ages
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--camera-fps", type=float, default=30.0)
+    parser.add_argument("--target-fps", type=float, default=5.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--image", default="")
+    args = parser.parse_args()
+
+    if args.image:
+        frame = cv2.imread(args.image)
+        if frame is None:
+            raise SystemExit(f"Could not read {args.image}")
+    else:
+        frame = np.random.default_rng(0).integers(90, 160, size=(480, 640, 3), dtype=np.uint8)
+
+    print(f"{'target fps':>10}{'CPU %':>8}{'read':>7}{'classified':>12}{'dropped':>9}"
+          f"{'infer ms':>10}{'age p50 ms':>12}{'age p95 ms':>12}")
+    results = {}
+    for target in (0.0, args.target_fps):
+        stats, cpu, ages = run(frame, args, target)
+        results[target] = (cpu, ages)
+        print(f"{target or 'every':>10}{cpu * 100:>8.0f}{stats['frames_read']:>7}{stats['frames_processed']:>12}"
+              f"{stats['frames_dropped']:>9}{stats['inference_ms']:>10.1f}"
+              f"{percentile(ages, 50):>12.0f}{percentile(ages, 95):>12.0f}")
+
+    every_cpu, _ = results[0.0]
+    cpu, ages = results[args.target_fps]
+    # A label is stale if it is older than one inference period plus a camera frame and slack
+    freshness = (1 / args.target_fps + 1 / args.camera_fps) * 1000 + 50
+    if cpu >= every_cpu / 2:
+        print(f"FAIL: CPU {cpu * 100:.0f}% at {args.target_fps:g} fps vs {every_cpu * 100:.0f}% classifying every frame")
+        return 1
+    if percentile(ages, 95) > freshness:
+        print(f"FAIL: p95 frame age {percentile(ages, 95):.0f} ms is over {freshness:.0f} ms")
+        return 1
+    print(f"OK: CPU {cpu * 100:.0f}% vs {every_cpu * 100:.0f}% classifying every frame; "
+          f"newest classified frame p95 {percentile(ages, 95):.0f} ms old")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
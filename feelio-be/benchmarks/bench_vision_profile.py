@@ -0,0 +1,118 @@
+"""
+Face Mesh throughput and CPU: the accurate (current) vs the fast vision profile.
+
+Builds a clip in memory (default 1280x720) with the face from --image
+drifting across a noisy background, then runs every frame through
+VisionSystem.process_frame back to back with each profile, interleaving
+the profiles for a few rounds and keeping each one's best round. Reports frames
+per second, CPU per frame, how often a face was found, how often tracking
+was lost, and how often the two profiles agree on the label; the rows in
+between add the fast profile's changes one at a time. Without
+--image the clip has no face, so only full-frame detection is compared.
+
+Needs opencv-python and mediapipe (requirements.txt).
+
+Usage:
+    python benchmarks/bench_vision_profile.py --image face.jpg [--frames 300] [--rounds 3] [--width 1280] [--height 720]
+"""
+
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logging.disable(logging.CRITICAL)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from vision_module import VisionSystem, vision_profile  # noqa: E402
+
+FAST = vision_profile("fast")
+STEPS = [
+    vision_profile("accurate"),
+    FAST._replace(name="no refine", input_width=0, roi_tracking=False),
+    FAST._replace(name="+downscale", roi_tracking=False),
+    FAST,
+]
+
+
+def make_clip(args):
+    rng = np.random.default_rng(0)
+    background = rng.integers(90, 160, size=(args.height, args.width, 3), dtype=np.uint8)
+    face = None
+    if args.image:
+        face = cv2.imread(args.image)
+        if face is None:
+            raise SystemExit(f"Could not read {args.image}")
+        side = args.height // 2
+        face = cv2.resize(face, (side, side))
+
+    frames = []
+    for i in range(args.frames):
+        frame = background.copy()
+        if face is not None:
+            # Slow drift, as a person shifting in front of a webcam
+            x = int((args.width - face.shape[1]) * (0.5 + 0.4 * math.sin(i / 40)))
+            y = int((args.height - face.shape[0]) * (0.5 + 0.3 * math.cos(i / 55)))
+            frame[y:y + face.shape[0], x:x + face.shape[1]] = face
+        frames.append(frame)
+    return frames
+
+
+def run(frames, profile):
+    vision = VisionSystem(headless=True, profile=profile)
+    vision.process_frame(frames[0], 0.0)  # model warm-up
+    labels = []
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for i, frame in enumerate(frames):
+        labels.append(vision.process_frame(frame, float(i)))
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    return labels, len(frames) / wall, cpu / len(frames), vision.faces_lost
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", default="")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    frames = make_clip(args)
+    print(f"{'profile':<12}{'fps':>8}{'CPU ms/frame':>14}{'faces':>8}{'lost':>6}")
+    best = {}
+    for _ in range(args.rounds):
+        for profile in STEPS:
+            result = run(frames, profile)
+            if profile.name not in best or result[2] < best[profile.name][2]:
+                best[profile.name] = result
+
+    results = {}
+    for profile in STEPS:
+        labels, fps, cpu, lost = best[profile.name]
+        results[profile.name] = (labels, fps, cpu)
+        found = sum(label is not None for label in labels)
+        print(f"{profile.name:<12}{fps:>8.1f}{cpu * 1000:>14.2f}{found:>8}{lost:>6}")
+
+    (accurate, base_fps, base_cpu), (fast, fps, cpu) = results["accurate"], results["fast"]
+    agree = sum(a == b for a, b in zip(accurate, fast)) / len(frames)
+    print(f"\nfast vs accurate: {fps / base_fps:.1f}x fps, {(1 - cpu / base_cpu) * 100:.0f}% less CPU per frame, "
+          f"labels agree on {agree * 100:.0f}% of frames")
+
+    if fps <= base_fps:
+        print("FAIL: the fast profile is not faster")
+        return 1
+    if args.image and sum(label is not None for label in fast) < 0.9 * sum(label is not None for label in accurate):
+        print("FAIL: the fast profile lost the face much more often")
+        return 1
+    print(f"OK: {fps:.0f} fps vs {base_fps:.0f} fps, {cpu * 1000:.1f} vs {base_cpu * 1000:.1f} CPU ms per frame")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
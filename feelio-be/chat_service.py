@@ -0,0 +1,686 @@
+"""
+Framework-independent chat logic for Feelio.
+Shared by the Flask API (app.py) and the async ASGI API (asgi.py) so both
+serving modes use the same sessions, prompts, fallbacks and payloads.
+"""
+
+import json
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional, Tuple
+
+import llm
+from config import Config
+from emotion_trajectory import new_trajectory
+from history import HistoryCompactor, estimate_tokens, history_tokens
+from metrics import registry as metrics
+from retrieval import TurnIndex
+from routing import Route, router
+from admission import AdmissionRejected
+from session_backend import create_backend
+from session_store import SessionStore
+from therapy_utils import (
+    PromptState,
+    update_emotion_history,
+    summarize_trajectory,
+    build_fusion_prompt,
+    build_delta_prompt,
+    build_crisis_response,
+    build_summary_prompt,
+)
+from turn_analysis import TurnAnalysis, analyze_turn
+from turn_store import Turn, TurnStore
+
+logger = logging.getLogger(__name__)
+
+# Initialize the LLM backend (Gemini or the offline stub)
+try:
+    Config.validate()
+    llm.configure(Config.GEMINI_API_KEY)
+except Exception as e:
+    logger.error(f"❌ Failed to configure LLM backend: {e}")
+
+EMPTY_RESPONSE_TEXT = "I'm listening. Could you tell me more about what you're feeling?"
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+CHAT_ERROR_TEXT = "I'm sensing some strong emotions. Could you tell me more about what's on your mind?"
+
+# Fallback responses based on emotion
+FALLBACK_RESPONSES = {
+    "happy": "I can hear the warmth in your words. What's brought you this joy?",
+    "sad": "I sense sadness in what you're sharing. I'm here to listen more deeply.",
+    "anxious": "There's some worry coming through. Let's slow down and explore what's underneath.",
+    "calm": "You sound grounded right now. What's helped you get to this place?",
+    "neutral": "I'm sensing you might have a lot on your mind. Where would you like to start?"
+}
+
+
+# ========== SESSIONS ==========
+
+def new_session(history: Optional[llm.History] = None) -> dict:
+    """Build a fresh session dict with a chat handle on the shared model."""
+    return {
+        "chat": llm.new_chat(history),
+        "trajectory": new_trajectory(),
+        "turns": TurnStore(capacity=Config.SESSION_MAX_TURNS),
+        "text_bytes": 0,
+        "turn_index": TurnIndex() if Config.HISTORY_RETRIEVAL else None,
+        # Derived, not persisted: a rehydrated session starts with a full prompt
+        "prompt_state": PromptState(),
+        # Idempotency-Key -> (message checksum, reply payload), oldest first
+        "replies": OrderedDict(),
+        # Background model summary: (text, turns it covers), or None
+        "summary": None,
+        "summary_due": Config.SESSION_SUMMARY_EVERY,  # turn count that triggers the next one
+        "summary_pending": False,
+    }
+
+
+def encode_session(session: dict) -> bytes:
+    """
+    Serialize a session into a compact, compressed blob.
+
+    Chat history is stored as (role, text) pairs and turns as positional
+    lists, so the blob carries no per-field key names.
+
+    Args:
+        session: A session dict.
+
+    Returns:
+        bytes: zlib-compressed JSON.
+    """
+    payload = {
+        "h": session["chat"].history,
+        "j": session["trajectory"].to_state(),
+        "t": session["turns"].to_rows(),
+        "n": session["turns"].total,
+        "c": session["turns"].emotion_counts,
+        "b": session.get("text_bytes", 0),
+        "r": [[key, checksum, reply] for key, (checksum, reply) in session["replies"].items()],
+        "s": session["summary"],
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 1)
+
+
+def decode_session(blob: bytes) -> dict:
+    """
+    Rebuild a session dict (including a live chat) from encode_session output.
+
+    Args:
+        blob: Bytes produced by encode_session.
+
+    Returns:
+        dict: A session ready to continue the conversation.
+    """
+    payload = json.loads(zlib.decompress(blob))
+    session = new_session(history=[(role, text) for role, text in payload["h"]])
+    if "j" in payload:
+        session["trajectory"].load_state(payload["j"])
+    else:
+        # Blobs written before the trajectory existed hold (ts, label) pairs
+        for ts, emotion in payload.get("e", ()):
+            session["trajectory"].update(emotion, ts)
+    session["turns"] = TurnStore.from_rows(
+        payload["t"], capacity=Config.SESSION_MAX_TURNS, total=payload.get("n"), emotion_counts=payload.get("c")
+    )
+    session["text_bytes"] = payload["b"]
+    for key, checksum, reply in payload.get("r", ()):
+        session["replies"][key] = (checksum, reply)
+    if payload.get("s"):
+        text, covered = payload["s"]
+        session["summary"] = (text, covered)
+        session["summary_due"] = covered + Config.SESSION_SUMMARY_EVERY
+
+    # The retrieval index is derived data: rebuild it once on rehydration
+    if session["turn_index"] is not None:
+        for turn_no, turn in enumerate(session["turns"], start=session["turns"].first):
+            session["turn_index"].add(turn_no, f"{turn.user} {turn.therapist}")
+    return session
+
+
+# Session storage: bounded LRU with idle expiry, optionally backed by a
+# shared store so any worker can pick up any session
+sessions = SessionStore(
+    factory=new_session,
+    max_sessions=Config.SESSION_MAX_COUNT,
+    idle_ttl=Config.SESSION_IDLE_TTL,
+    max_bytes=Config.SESSION_MAX_BYTES,
+    reap_interval=Config.SESSION_REAP_INTERVAL,
+    backend=create_backend(Config.SESSION_BACKEND, Config.SESSION_DB_PATH, Config.REDIS_URL),
+    encode=encode_session,
+    decode=decode_session,
+    persist_ttl=Config.SESSION_PERSIST_TTL,
+)
+sessions.start_reaper()
+metrics.gauge("feelio_active_sessions", lambda: len(sessions))
+
+# Optional rolling history compaction (keeps per-turn prompt size bounded)
+compactor = HistoryCompactor(
+    token_budget=Config.HISTORY_TOKEN_BUDGET,
+    keep_turns=Config.HISTORY_KEEP_TURNS,
+    summarizer=llm.generate if Config.HISTORY_LLM_SUMMARY else None,
+) if Config.HISTORY_COMPACTION else None
+# Compaction for /api/chat runs here, after the reply (threads start on first use)
+compaction_pool = ThreadPoolExecutor(
+    max_workers=Config.HISTORY_COMPACTION_THREADS, thread_name_prefix="history-compaction"
+)
+
+
+def get_or_create_session(session_id: str) -> dict:
+    """Get or create a session."""
+    return sessions.get_or_create(session_id)
+
+
+def end_session(session_id: Optional[str]) -> bool:
+    """
+    Drop a session if it exists.
+
+    Args:
+        session_id: The session to end.
+
+    Returns:
+        bool: True if a session was removed.
+    """
+    if session_id and sessions.discard(session_id):
+        logger.info(f"✅ Session ended: {session_id}")
+        return True
+    return False
+
+
+# ========== TURN HANDLING ==========
+
+def parse_chat_request(data: Optional[dict]) -> Tuple[Optional[Tuple[str, str, str]], Optional[str]]:
+    """
+    Validate a chat request body.
+
+    Args:
+        data: The decoded JSON body (may be None).
+
+    Returns:
+        Tuple of ((session_id, user_text, emotion), None) on success,
+        or (None, error message) if the body is invalid.
+    """
+    if not data:
+        return None, "No data provided"
+
+    session_id = data.get("session_id")
+    user_text = data.get("message", "").strip()
+    emotion = data.get("emotion", "neutral")
+
+    if not session_id or not user_text:
+        return None, "session_id and message are required"
+
+    return (session_id, user_text, emotion), None
+
+
+def parse_idempotency_key(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Validate an optional Idempotency-Key header.
+
+    Args:
+        value: The raw header value (None if absent).
+
+    Returns:
+        Tuple of (key or None, None) on success, or (None, error message).
+    """
+    if value is None:
+        return None, None
+    key = value.strip()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+    return key, None
+
+
+def replay_reply(session: dict, key: Optional[str], user_text: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Look up the stored reply for a retried request.
+
+    Args:
+        session: The session dict.
+        key: The request's idempotency key (None if not sent).
+        user_text: The user's message.
+
+    Returns:
+        Tuple of (reply payload, None) for a repeated request, (None, None)
+        for a new one, or (None, error message) if the key was already used
+        for a different message.
+    """
+    if key is None:
+        return None, None
+    stored = session["replies"].get(key)
+    if stored is None:
+        return None, None
+    checksum, reply = stored
+    if checksum != zlib.crc32(user_text.encode("utf-8")):
+        return None, "Idempotency-Key was already used for a different message"
+    metrics.inc("feelio_idempotent_replays_total")
+    return dict(reply, replayed=True), None
+
+
+def remember_reply(session: dict, key: Optional[str], user_text: str, reply: Dict[str, Any]) -> None:
+    """Store a reply under its idempotency key; log_turn persists it with the turn."""
+    if key is None or Config.IDEMPOTENCY_CACHE_SIZE <= 0:
+        return
+    replies = session["replies"]
+    replies[key] = (zlib.crc32(user_text.encode("utf-8")), reply)
+    while len(replies) > Config.IDEMPOTENCY_CACHE_SIZE:
+        replies.popitem(last=False)
+
+
+def get_fallback_response(emotion: str) -> str:
+    """Get the emotion-specific fallback used when the LLM call fails."""
+    metrics.inc("feelio_fallbacks_total", reason="llm_error")
+    return FALLBACK_RESPONSES.get(emotion, "I'm here to listen. Please go on.")
+
+
+def log_turn(session: dict, user_text: str, ai_text: str, emotion: str, crisis: bool) -> None:
+    """Append a completed exchange to the session's turn log and persist it."""
+    turns = session["turns"]
+    evicted = turns.append(Turn(user_text, ai_text, emotion, crisis))
+    text_bytes = session.get("text_bytes", 0) + len(user_text) + len(ai_text)
+    if evicted is not None:
+        text_bytes -= len(evicted.user) + len(evicted.therapist)
+    session["text_bytes"] = text_bytes
+
+    index = session.get("turn_index")
+    if index is not None:
+        if evicted is not None:
+            index.remove(turns.first - 1, f"{evicted.user} {evicted.therapist}")
+        index.add(turns.total - 1, f"{user_text} {ai_text}")
+        # Older turns reach the model through retrieval, not chat history
+        keep = 2 * Config.RETRIEVAL_RECENT_TURNS
+        chat = session["chat"]
+        if len(chat.history) > keep:
+            chat.history = chat.history[-keep:] if keep else []
+
+    with metrics.span("persist"):
+        sessions.save(session)
+    schedule_summary(session)
+
+
+def retrieve_related_turns(session: dict, user_text: str) -> List[str]:
+    """
+    Find earlier exchanges relevant to the current message.
+
+    Args:
+        session: The session dict.
+        user_text: The user's message.
+
+    Returns:
+        List of formatted exchanges (empty when retrieval is disabled).
+    """
+    index = session.get("turn_index")
+    if index is None:
+        return []
+
+    turns = session["turns"]
+    recent_start = turns.total - Config.RETRIEVAL_RECENT_TURNS
+    with metrics.span("retrieval"):
+        hits = index.search(user_text, k=Config.RETRIEVAL_TOP_K, exclude_from=max(recent_start, 0))
+    return [
+        f"User: {turn.user} / You: {turn.therapist}"
+        for turn in (turns.get(turn_no) for turn_no, _ in hits)
+        if turn is not None
+    ]
+
+
+def analyze_message(user_text: str, emotion: str) -> TurnAnalysis:
+    """
+    Extract risk, intent, contradiction and pacing features in one pass.
+
+    Args:
+        user_text: The user's message.
+        emotion: The detected emotion label.
+
+    Returns:
+        TurnAnalysis: Shared by handle_crisis and build_turn_prompt.
+    """
+    with metrics.span("analysis"):
+        return analyze_turn(user_text, emotion)
+
+
+def handle_crisis(
+    session: dict,
+    session_id: str,
+    user_text: str,
+    emotion: str,
+    analysis: TurnAnalysis,
+    idempotency_key: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Run the safety net for one message.
+
+    Args:
+        session: The session dict.
+        session_id: The session identifier (for logging).
+        user_text: The user's message.
+        emotion: The detected emotion label.
+        analysis: The message's TurnAnalysis.
+        idempotency_key: Key to store the crisis reply under for retries.
+
+    Returns:
+        The crisis response payload if high-risk content was detected
+        (the turn is already logged), else None.
+    """
+    if not (Config.ENABLE_SAFETY_NET and analysis.high_risk):
+        return None
+
+    metrics.inc("feelio_crises_total")
+    crisis_response = build_crisis_response()
+    logger.warning(
+        f"🚨 High-risk content detected in session: {session_id} "
+        f"(matched: {', '.join(analysis.risk_phrases)})"
+    )
+
+    payload = {
+        "success": True,
+        "response": crisis_response,
+        "emotion": emotion,
+        "crisis_detected": True
+    }
+    remember_reply(session, idempotency_key, user_text, payload)
+    log_turn(session, user_text, crisis_response, emotion, crisis=True)
+
+    return payload
+
+
+def build_turn_prompt(
+    session: dict, user_text: str, emotion: str, analysis: TurnAnalysis
+) -> Tuple[str, str, int]:
+    """
+    Update emotion history and build the fusion prompt for one turn.
+
+    Args:
+        session: The session dict from get_or_create_session.
+        user_text: The user's message.
+        emotion: The detected emotion label.
+        analysis: The message's TurnAnalysis.
+
+    Returns:
+        Tuple of (fusion prompt, selected playbook, turn number).
+    """
+    related_turns = retrieve_related_turns(session, user_text)
+
+    with metrics.span("context"):
+        # Update emotion history
+        update_emotion_history(emotion, session["trajectory"])
+
+        # Build context
+        playbook = analysis.playbook
+        context = {
+            "emotion": emotion,
+            "trajectory": summarize_trajectory(session["trajectory"]),
+            "contradiction": analysis.contradiction,
+            "playbook": playbook,
+            "pace_hint": analysis.pace_hint,
+        }
+
+        # Build fusion prompt with more unique context
+        fusion_prompt = build_fusion_prompt(user_text=user_text, related_turns=related_turns, **context)
+
+        # Add session turn context to make responses more unique
+        turn_num = session["turns"].total + 1
+        fusion_prompt += f"\n[CONVERSATION TURN: {turn_num}]"
+
+        if Config.PROMPT_MODE == "delta":
+            fusion_prompt = build_turn_delta(session, user_text, context, related_turns, fusion_prompt)
+        else:
+            record_prompt_tokens(fusion_prompt, fusion_prompt)
+
+    return fusion_prompt, playbook, turn_num
+
+
+def prompt_keyframe_turns() -> int:
+    """Delta turns between full context resends."""
+    if Config.HISTORY_RETRIEVAL:
+        # Chat history keeps only the recent turns; older fields fall out of view
+        return max(1, min(Config.PROMPT_KEYFRAME_TURNS, Config.RETRIEVAL_RECENT_TURNS))
+    return Config.PROMPT_KEYFRAME_TURNS
+
+
+def build_turn_delta(
+    session: dict, user_text: str, context: Dict[str, str], related_turns: List[str], full_prompt: str
+) -> str:
+    """
+    Build the delta prompt for a turn and record the tokens it saves.
+
+    Args:
+        session: The session dict.
+        user_text: The user's message.
+        context: This turn's context fields.
+        related_turns: Retrieved earlier exchanges.
+        full_prompt: The full prompt the delta replaces (for accounting).
+
+    Returns:
+        str: The prompt to send.
+    """
+    state = session["prompt_state"]
+    changed = state.changed_fields(context, session["chat"].history, prompt_keyframe_turns())
+    prompt = build_delta_prompt(user_text, changed, related_turns)
+    state.mark_sent(prompt, changed)
+    record_prompt_tokens(prompt, full_prompt)
+    return prompt
+
+
+def record_prompt_tokens(prompt: str, full_prompt: str) -> None:
+    """Count prompt tokens sent and saved against the full prompt."""
+    sent = estimate_tokens(prompt)
+    saved = estimate_tokens(full_prompt) - sent
+    metrics.inc("feelio_prompt_tokens_total", sent)
+    metrics.inc("feelio_prompt_tokens_saved_total", saved)
+    logger.debug(f"✂️ Prompt: {sent} tokens ({saved} saved)")
+
+
+# ========== ROUTING ==========
+
+def route_turn(session: dict, analysis: TurnAnalysis) -> Route:
+    """Pick the model tier for this turn from its features."""
+    return router.route(analysis, session["trajectory"], len(session["chat"].history) // 2)
+
+
+class RoutedCall:
+    """
+    Times one LLM call on a route and records per-tier stats on exit.
+
+    Set `reply` to the generated text inside the block; an exception
+    leaving the block is recorded as an error and re-raised.
+    """
+
+    __slots__ = ("route", "prompt_tokens", "reply", "_start")
+
+    def __init__(self, session: dict, route: Route, prompt: str):
+        self.route = route
+        self.prompt_tokens = history_tokens(session["chat"].history) + estimate_tokens(prompt)
+        self.reply = ""
+
+    def __enter__(self) -> "RoutedCall":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        router.record(
+            self.route,
+            time.perf_counter() - self._start,
+            self.prompt_tokens,
+            estimate_tokens(self.reply),
+            ok=exc_type is None,
+        )
+
+
+def compact_history(session: dict) -> bool:
+    """
+    Fold older turns into a running summary once the chat is over budget.
+
+    Call after the turn is logged; persists the session if it changed.
+
+    Returns:
+        bool: True if the history was compacted.
+    """
+    if compactor is None:
+        return False
+
+    with metrics.span("compaction"):
+        emotions = session["trajectory"].recent_labels()
+        compacted = compactor.maybe_compact(session["chat"].history, emotions)
+    if compacted is None:
+        return False
+
+    session["chat"].history = compacted
+    # Fields sent before the fold are now only in the summary: resend them
+    session["prompt_state"].reset()
+    sessions.save(session)
+    return True
+
+
+def schedule_compaction(session: dict, releases: ExitStack) -> None:
+    """
+    Compact in the background, then release the turn's holds.
+
+    For /api/chat: the reply goes out without waiting for a summary call,
+    while the session lock stays held until compaction is done, so the
+    session's next turn still sees its history in order.
+
+    Args:
+        session: The session dict (its turn is already logged).
+        releases: The turn's session lock and LLM slot.
+    """
+    if compactor is None:
+        releases.close()
+        return
+    compaction_pool.submit(_compact_and_release, session, releases)
+
+
+def _compact_and_release(session: dict, releases: ExitStack) -> None:
+    """Background job for schedule_compaction."""
+    try:
+        compact_history(session)
+    except Exception as e:
+        logger.error(f"❌ History compaction failed: {e}")
+    finally:
+        releases.close()
+
+
+def validate_response_text(session_id: str, ai_text: str) -> Tuple[str, bool]:
+    """
+    Replace empty or too-short model output with a neutral prompt.
+
+    Returns:
+        Tuple of (text to send, whether it was replaced).
+    """
+    ai_text = ai_text.strip()
+    if not ai_text or len(ai_text) < 5:
+        logger.warning(f"⚠️ Empty or too short response for session: {session_id}")
+        metrics.inc("feelio_fallbacks_total", reason="empty_response")
+        return EMPTY_RESPONSE_TEXT, True
+    return ai_text, False
+
+
+def chat_payload(ai_text: str, emotion: str, playbook: Optional[str], **extra: Any) -> Dict[str, Any]:
+    """Build the JSON body for a non-crisis chat reply."""
+    payload = {
+        "success": True,
+        "response": ai_text,
+        "emotion": emotion,
+        "crisis_detected": False,
+        "playbook": playbook
+    }
+    payload.update(extra)
+    return payload
+
+
+def chat_error_payload() -> Dict[str, Any]:
+    """Build the JSON body returned when the chat handler itself fails."""
+    metrics.inc("feelio_fallbacks_total", reason="handler_error")
+    return chat_payload(CHAT_ERROR_TEXT, "neutral", None, fallback=True)
+
+
+def busy_payload(error: AdmissionRejected) -> Dict[str, Any]:
+    """Build the JSON body for a turn rejected by admission control (HTTP 429)."""
+    return {
+        "success": False,
+        "error": "Feelio is busy right now. Please try again in a moment.",
+        "retry_after": error.retry_after,
+    }
+
+
+# ========== SUMMARY ==========
+
+# Background model summaries (opt-in); the summary endpoint only reads the cache
+summary_pool = ThreadPoolExecutor(
+    max_workers=Config.SESSION_SUMMARY_THREADS, thread_name_prefix="session-summary"
+) if Config.SESSION_LLM_SUMMARY else None
+
+
+def schedule_summary(session: dict) -> bool:
+    """
+    Queue a model-written summary once SESSION_SUMMARY_EVERY turns have passed.
+
+    Call after a turn is logged. The prompt is built here, from the previous
+    summary and the turns since, so the job never reads the live session.
+
+    Returns:
+        bool: True if a summary job was queued.
+    """
+    turns = session["turns"]
+    if summary_pool is None or session["summary_pending"] or turns.total < session["summary_due"]:
+        return False
+
+    previous = session["summary"]
+    covered = previous[1] if previous else 0
+    snippets = [{"summary_so_far": previous[0]}] if previous else []
+    since = min(turns.total - covered, 2 * Config.SESSION_SUMMARY_EVERY)
+    snippets += [turn.to_dict() for turn in turns.recent(since)]
+    prompt = build_summary_prompt(session["trajectory"].recent_labels()[-20:], snippets)
+
+    session["summary_pending"] = True
+    session["summary_due"] = turns.total + Config.SESSION_SUMMARY_EVERY
+    summary_pool.submit(_write_summary, session, prompt, turns.total)
+    return True
+
+
+def _write_summary(session: dict, prompt: str, covered: int) -> None:
+    """Background job: generate a summary and cache it on the session."""
+    try:
+        with metrics.span("session_summary"):
+            text = llm.generate(prompt).strip()
+        if text:
+            # Persisted with the session's next save
+            session["summary"] = (text, covered)
+        metrics.inc("feelio_session_summaries_total", result="ok")
+    except Exception as e:
+        # Keep the previous summary; the next attempt is SESSION_SUMMARY_EVERY turns away
+        metrics.inc("feelio_session_summaries_total", result="error")
+        logger.warning(f"⚠️ Background session summary failed: {e}")
+    finally:
+        session["summary_pending"] = False
+
+
+def summary_payload(session: dict) -> Dict[str, Any]:
+    """Build the JSON body for /api/session/summary (O(1): counts kept per turn)."""
+    turns = session["turns"]
+
+    if not turns.total:
+        return {
+            "success": True,
+            "summary": "No conversation yet",
+            "turn_count": 0
+        }
+
+    emotion_counts = dict(turns.emotion_counts)
+    summary = f"Session had {turns.total} exchanges. Primary emotions: {', '.join(emotion_counts.keys())}"
+
+    payload = {
+        "success": True,
+        "summary": summary,
+        "turn_count": turns.total,
+        "emotions": emotion_counts
+    }
+    if Config.SESSION_LLM_SUMMARY:
+        # Cached text (may trail the latest turns); None until the first one is ready
+        text, covered = session["summary"] or (None, 0)
+        payload["clinical_summary"] = text
+        payload["clinical_summary_turns"] = covered
+    return payload
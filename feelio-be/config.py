@@ -21,6 +21,47 @@ class Config:
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "").strip()
     MODEL_NAME: str = os.getenv("MODEL_NAME", "gemini-2.5-flash")
 
+    # LLM backend: "gemini" or "stub" (deterministic, offline, for load tests)
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "gemini").strip().lower()
+    STUB_LATENCY_MS: float = float(os.getenv("STUB_LATENCY_MS", "200"))
+    STUB_TOKENS_PER_SEC: float = float(os.getenv("STUB_TOKENS_PER_SEC", "50"))
+    STUB_FAILURE_RATE: float = float(os.getenv("STUB_FAILURE_RATE", "0.0"))
+    STUB_SEED: int = int(os.getenv("STUB_SEED", "0"))
+    STUB_FAST_LATENCY_MS: float = float(os.getenv("STUB_FAST_LATENCY_MS", "60"))  # FAST_MODEL_NAME
+    STUB_SLOW_RATE: float = float(os.getenv("STUB_SLOW_RATE", "0.0"))  # share of calls that stall
+    STUB_SLOW_MS: float = float(os.getenv("STUB_SLOW_MS", "10000"))
+
+    # LLM resilience: deadlines, hedged retries and per-model circuit breakers
+    LLM_RESILIENCE: bool = os.getenv("LLM_RESILIENCE", "True").lower() == "true"
+    LLM_DEADLINE_SECONDS: float = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))  # under gunicorn's 30 s
+    LLM_HEDGE_AFTER_SECONDS: float = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))  # 0 = no hedging
+    LLM_CALL_THREADS: int = int(os.getenv("LLM_CALL_THREADS", "64"))
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_SECONDS: float = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+    # Model routing: simple turns go to FAST_MODEL_NAME, the rest to MODEL_NAME
+    MODEL_ROUTING: bool = os.getenv("MODEL_ROUTING", "False").lower() == "true"
+    FAST_MODEL_NAME: str = os.getenv("FAST_MODEL_NAME", "gemini-2.5-flash-lite")
+    ROUTE_FAST_MAX_WORDS: int = int(os.getenv("ROUTE_FAST_MAX_WORDS", "8"))
+    ROUTE_FAST_MAX_VOLATILITY: float = float(os.getenv("ROUTE_FAST_MAX_VOLATILITY", "0.5"))
+    ROUTE_FAST_MAX_HISTORY_TURNS: int = int(os.getenv("ROUTE_FAST_MAX_HISTORY_TURNS", "20"))
+
+    # Admission control: concurrent LLM turns (global, per session) and wait queue
+    ADMISSION_CONTROL: bool = os.getenv("ADMISSION_CONTROL", "True").lower() == "true"
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+    ADMISSION_MAX_PER_SESSION: int = int(os.getenv("ADMISSION_MAX_PER_SESSION", "2"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+    ADMISSION_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+    # asgi.py awaits the model instead of holding a thread per turn, so it admits far more
+    ADMISSION_ASYNC_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_ASYNC_MAX_CONCURRENT", "512"))
+    ADMISSION_ASYNC_MAX_QUEUE: int = int(os.getenv("ADMISSION_ASYNC_MAX_QUEUE", "1024"))
+
+    # Per-session ordering: one turn per session at a time, the rest queued
+    SESSION_SERIALIZE: bool = os.getenv("SESSION_SERIALIZE", "True").lower() == "true"
+    SESSION_MAX_PENDING: int = int(os.getenv("SESSION_MAX_PENDING", "4"))
+    SESSION_WAIT_SECONDS: float = float(os.getenv("SESSION_WAIT_SECONDS", "30"))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "16"))  # replies kept per session
+
     # Application
     APP_ENV: str = os.getenv("APP_ENV", "development")
     DEBUG_MODE: bool = os.getenv("DEBUG_MODE", "False").lower() == "true"
@@ -35,12 +76,75 @@ class Config:
     # Vision
     CAMERA_INDEX: int = int(os.getenv("CAMERA_INDEX", "0"))
     USE_VISION: bool = os.getenv("USE_VISION", "False").lower() == "true"
+    # "" = camera 1 then 0, a camera number, a video file or an image directory
+    VISION_SOURCE: str = os.getenv("VISION_SOURCE", "")
+    # Frames classified per second (0 = every camera frame); newer frames replace unread ones
+    VISION_TARGET_FPS: float = float(os.getenv("VISION_TARGET_FPS", "5"))
+    VISION_READ_BACKOFF_MAX: float = float(os.getenv("VISION_READ_BACKOFF_MAX", "1.0"))  # seconds
+    # Headless: no drawing, window or key handling (servers without a display)
+    VISION_HEADLESS: bool = os.getenv("VISION_HEADLESS", "False").lower() == "true"
+    VISION_PREVIEW_FPS: float = float(os.getenv("VISION_PREVIEW_FPS", "5"))  # debug window refresh
+    # "accurate" (full frames, refined mesh) or "fast" (no refinement, downscaled, face-box crop)
+    VISION_PROFILE: str = os.getenv("VISION_PROFILE", "accurate").strip().lower()
+    VISION_INPUT_WIDTH: int = int(os.getenv("VISION_INPUT_WIDTH", "480"))  # fast profile; 0 = full size
+    VISION_ROI_MARGIN: float = float(os.getenv("VISION_ROI_MARGIN", "0.3"))  # of the face box size
+    # Mouth-shape thresholds (frame-normalized units), see emotion_geometry.py
+    VISION_HAPPY_SMILE: float = float(os.getenv("VISION_HAPPY_SMILE", "0.02"))
+    VISION_SURPRISE_OPEN: float = float(os.getenv("VISION_SURPRISE_OPEN", "0.05"))
+    VISION_SAD_SMILE: float = float(os.getenv("VISION_SAD_SMILE", "-0.015"))
+
+    # Emotion trajectory: running counts over these windows (seconds)
+    TRAJECTORY_WINDOWS: tuple = tuple(
+        float(s) for s in os.getenv("TRAJECTORY_WINDOWS", "30,300").split(",") if s.strip()
+    )
+    TRAJECTORY_RECENT: int = int(os.getenv("TRAJECTORY_RECENT", "20"))
+    TRAJECTORY_HALF_LIFE: float = float(os.getenv("TRAJECTORY_HALF_LIFE", "0"))  # 0 = no decay
+
+    # Prompts: "full" repeats every context field each turn, "delta" sends
+    # the invariant instructions once and then only fields that changed
+    PROMPT_MODE: str = os.getenv("PROMPT_MODE", "full").strip().lower()
+    PROMPT_KEYFRAME_TURNS: int = int(os.getenv("PROMPT_KEYFRAME_TURNS", "10"))
 
     # Model
     RESPONSE_MAX_LENGTH: int = int(os.getenv("RESPONSE_MAX_LENGTH", "3"))
 
+    # History compaction (fold old turns into a running summary)
+    HISTORY_COMPACTION: bool = os.getenv("HISTORY_COMPACTION", "False").lower() == "true"
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+    HISTORY_KEEP_TURNS: int = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+    HISTORY_LLM_SUMMARY: bool = os.getenv("HISTORY_LLM_SUMMARY", "True").lower() == "true"
+    HISTORY_COMPACTION_THREADS: int = int(os.getenv("HISTORY_COMPACTION_THREADS", "4"))  # /api/chat, after the reply
+
+    # Model-written session summary for /api/session/summary, refreshed in the
+    # background every SESSION_SUMMARY_EVERY turns (the endpoint never waits)
+    SESSION_LLM_SUMMARY: bool = os.getenv("SESSION_LLM_SUMMARY", "False").lower() == "true"
+    SESSION_SUMMARY_EVERY: int = int(os.getenv("SESSION_SUMMARY_EVERY", "5"))
+    SESSION_SUMMARY_THREADS: int = int(os.getenv("SESSION_SUMMARY_THREADS", "2"))
+
+    # Retrieval: send only relevant earlier turns instead of the full history
+    HISTORY_RETRIEVAL: bool = os.getenv("HISTORY_RETRIEVAL", "False").lower() == "true"
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+    RETRIEVAL_RECENT_TURNS: int = int(os.getenv("RETRIEVAL_RECENT_TURNS", "2"))
+
+    # Sessions (API)
+    SESSION_MAX_COUNT: int = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+    SESSION_IDLE_TTL: int = int(os.getenv("SESSION_IDLE_TTL", "1800"))
+    SESSION_MAX_BYTES: int = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024)))
+    SESSION_REAP_INTERVAL: int = int(os.getenv("SESSION_REAP_INTERVAL", "60"))
+    SESSION_MAX_TURNS: int = int(os.getenv("SESSION_MAX_TURNS", "500"))  # 0 = keep every turn
+    # Shared session state: "" (per process), "local", "sqlite" or "redis"
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "").strip().lower()
+    SESSION_DB_PATH: str = os.getenv("SESSION_DB_PATH", "./session_state/sessions.db")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    SESSION_PERSIST_TTL: int = int(os.getenv("SESSION_PERSIST_TTL", "86400"))
+
+    # Observability: per-stage latency histograms and counters at /metrics
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
     # Safety
     ENABLE_SAFETY_NET: bool = os.getenv("ENABLE_SAFETY_NET", "True").lower() == "true"
+    SAFETY_PHRASES_PATH: str = os.getenv("SAFETY_PHRASES_PATH", "")  # "" = bundled safety_phrases.txt
+    TURN_RULES_PATH: str = os.getenv("TURN_RULES_PATH", "")  # "" = bundled turn_rules.ini
     LOG_SESSIONS: bool = os.getenv("LOG_SESSIONS", "False").lower() == "true"
     SESSION_LOGS_PATH: str = os.getenv("SESSION_LOGS_PATH", "./session_logs/")
 
@@ -59,12 +163,21 @@ class Config:
         Raises:
             ValueError: If critical settings are missing or invalid.
         """
-        if not cls.GEMINI_API_KEY:
+        if cls.LLM_BACKEND not in ("gemini", "stub"):
+            raise ValueError("LLM_BACKEND must be one of: gemini, stub")
+
+        if cls.LLM_BACKEND == "gemini" and not cls.GEMINI_API_KEY:
             raise ValueError(
                 "GEMINI_API_KEY is not set. "
                 "Please set it in .env or environment variables."
             )
 
+        if cls.PROMPT_MODE not in ("full", "delta"):
+            raise ValueError("PROMPT_MODE must be one of: full, delta")
+
+        if cls.PROMPT_KEYFRAME_TURNS < 1:
+            raise ValueError("PROMPT_KEYFRAME_TURNS must be >= 1")
+
         if cls.MICROPHONE_INDEX < 0:
             raise ValueError("MICROPHONE_INDEX must be >= 0")
 
@@ -74,6 +187,90 @@ class Config:
         if cls.SPEECH_TIMEOUT <= 0:
             raise ValueError("SPEECH_TIMEOUT must be > 0")
 
+        if not cls.TRAJECTORY_WINDOWS or min(cls.TRAJECTORY_WINDOWS) <= 0:
+            raise ValueError("TRAJECTORY_WINDOWS must list one or more windows > 0")
+
+        if cls.VISION_TARGET_FPS < 0 or cls.VISION_READ_BACKOFF_MAX <= 0 or cls.VISION_PREVIEW_FPS <= 0:
+            raise ValueError(
+                "VISION_TARGET_FPS must be >= 0, VISION_READ_BACKOFF_MAX and VISION_PREVIEW_FPS > 0"
+            )
+
+        source = cls.VISION_SOURCE.strip()
+        if source and not source.isdigit() and not os.path.exists(source):
+            raise ValueError(f"VISION_SOURCE must be a camera number, a video file or an image directory: {source!r}")
+
+        if cls.VISION_PROFILE not in ("accurate", "fast"):
+            raise ValueError("VISION_PROFILE must be one of: accurate, fast")
+
+        if cls.VISION_INPUT_WIDTH < 0 or cls.VISION_ROI_MARGIN < 0:
+            raise ValueError("VISION_INPUT_WIDTH and VISION_ROI_MARGIN must be >= 0")
+
+        if cls.VISION_SAD_SMILE >= cls.VISION_HAPPY_SMILE or cls.VISION_SURPRISE_OPEN <= 0:
+            raise ValueError("VISION_SAD_SMILE must be below VISION_HAPPY_SMILE and VISION_SURPRISE_OPEN > 0")
+
+        if cls.TRAJECTORY_RECENT < 1 or cls.TRAJECTORY_HALF_LIFE < 0:
+            raise ValueError("TRAJECTORY_RECENT must be >= 1 and TRAJECTORY_HALF_LIFE >= 0")
+
+        if cls.SESSION_MAX_COUNT <= 0:
+            raise ValueError("SESSION_MAX_COUNT must be > 0")
+
+        if cls.SESSION_IDLE_TTL < 0 or cls.SESSION_MAX_BYTES < 0:
+            raise ValueError("SESSION_IDLE_TTL and SESSION_MAX_BYTES must be >= 0")
+
+        if cls.SESSION_MAX_TURNS < 0:
+            raise ValueError("SESSION_MAX_TURNS must be >= 0")
+
+        if cls.SESSION_REAP_INTERVAL <= 0:
+            raise ValueError("SESSION_REAP_INTERVAL must be > 0")
+
+        if cls.HISTORY_TOKEN_BUDGET <= 0 or cls.HISTORY_KEEP_TURNS < 0 or cls.HISTORY_COMPACTION_THREADS < 1:
+            raise ValueError(
+                "HISTORY_TOKEN_BUDGET and HISTORY_COMPACTION_THREADS must be > 0, HISTORY_KEEP_TURNS >= 0"
+            )
+
+        if cls.SESSION_SUMMARY_EVERY < 1 or cls.SESSION_SUMMARY_THREADS < 1:
+            raise ValueError("SESSION_SUMMARY_EVERY and SESSION_SUMMARY_THREADS must be >= 1")
+
+        if cls.RETRIEVAL_TOP_K < 0 or cls.RETRIEVAL_RECENT_TURNS < 0:
+            raise ValueError("RETRIEVAL_TOP_K and RETRIEVAL_RECENT_TURNS must be >= 0")
+
+        if cls.STUB_LATENCY_MS < 0 or cls.STUB_TOKENS_PER_SEC < 0:
+            raise ValueError("STUB_LATENCY_MS and STUB_TOKENS_PER_SEC must be >= 0")
+
+        if not 0.0 <= cls.STUB_FAILURE_RATE <= 1.0 or not 0.0 <= cls.STUB_SLOW_RATE <= 1.0:
+            raise ValueError("STUB_FAILURE_RATE and STUB_SLOW_RATE must be between 0 and 1")
+
+        if cls.LLM_DEADLINE_SECONDS <= 0 or cls.LLM_HEDGE_AFTER_SECONDS < 0:
+            raise ValueError("LLM_DEADLINE_SECONDS must be > 0 and LLM_HEDGE_AFTER_SECONDS >= 0")
+
+        if cls.LLM_CALL_THREADS < 1 or cls.BREAKER_FAILURE_THRESHOLD < 1 or cls.BREAKER_RESET_SECONDS < 0:
+            raise ValueError(
+                "LLM_CALL_THREADS and BREAKER_FAILURE_THRESHOLD must be >= 1 and BREAKER_RESET_SECONDS >= 0"
+            )
+
+        if cls.ADMISSION_MAX_CONCURRENT < 1 or cls.ADMISSION_MAX_PER_SESSION < 1:
+            raise ValueError("ADMISSION_MAX_CONCURRENT and ADMISSION_MAX_PER_SESSION must be >= 1")
+
+        if cls.ADMISSION_MAX_QUEUE < 0 or cls.ADMISSION_MAX_WAIT_SECONDS < 0:
+            raise ValueError("ADMISSION_MAX_QUEUE and ADMISSION_MAX_WAIT_SECONDS must be >= 0")
+
+        if cls.ADMISSION_ASYNC_MAX_CONCURRENT < 1 or cls.ADMISSION_ASYNC_MAX_QUEUE < 0:
+            raise ValueError("ADMISSION_ASYNC_MAX_CONCURRENT must be >= 1 and ADMISSION_ASYNC_MAX_QUEUE >= 0")
+
+        if cls.SESSION_MAX_PENDING < 1 or cls.SESSION_WAIT_SECONDS < 0 or cls.IDEMPOTENCY_CACHE_SIZE < 0:
+            raise ValueError(
+                "SESSION_MAX_PENDING must be >= 1, SESSION_WAIT_SECONDS and IDEMPOTENCY_CACHE_SIZE >= 0"
+            )
+
+        if cls.ROUTE_FAST_MAX_WORDS < 0 or cls.ROUTE_FAST_MAX_HISTORY_TURNS < 0:
+            raise ValueError("ROUTE_FAST_MAX_WORDS and ROUTE_FAST_MAX_HISTORY_TURNS must be >= 0")
+
+        if not 0.0 <= cls.ROUTE_FAST_MAX_VOLATILITY <= 1.0:
+            raise ValueError("ROUTE_FAST_MAX_VOLATILITY must be between 0 and 1")
+
+        if cls.SESSION_BACKEND not in ("", "none", "local", "sqlite", "redis"):
+            raise ValueError("SESSION_BACKEND must be one of: local, sqlite, redis")
+
         logger.info(f"✅ Configuration validated (ENV: {cls.APP_ENV})")
         return True
 
@@ -89,6 +286,13 @@ class Config:
             "app_env": cls.APP_ENV,
             "debug_mode": cls.DEBUG_MODE,
             "model_name": cls.MODEL_NAME,
+            "llm_backend": cls.LLM_BACKEND,
+            "prompt_mode": cls.PROMPT_MODE,
+            "model_routing": cls.MODEL_ROUTING,
+            "llm_resilience": cls.LLM_RESILIENCE,
+            "admission_control": cls.ADMISSION_CONTROL,
+            "session_serialize": cls.SESSION_SERIALIZE,
+            "session_llm_summary": cls.SESSION_LLM_SUMMARY,
             "use_vision": cls.USE_VISION,
             "enable_safety_net": cls.ENABLE_SAFETY_NET,
             "log_sessions": cls.LOG_SESSIONS,
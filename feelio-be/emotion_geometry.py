@@ -0,0 +1,77 @@
+"""
+Landmark geometry to emotion label, for any number of frames at once.
+The one implementation of the mouth-shape rules: VisionSystem calls it with
+a single face per frame and vision_batch with a whole chunk of frames.
+
+Only the y coordinates of four Face Mesh points are read (13 upper lip,
+14 lower lip, 61 and 291 the mouth corners), in frame-normalized units:
+    mouth_open  = lower_lip - upper_lip
+    smile_ratio = lip center y - mouth corner y (positive: corners raised)
+The first matching rule wins: smile_ratio above the happy threshold, then
+mouth_open above the surprise threshold, then smile_ratio below the sad
+threshold, else neutral.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from config import Config
+
+MOUTH_POINTS = (13, 14, 61, 291)  # upper lip, lower lip, left corner, right corner
+LABELS = np.array(["neutral", "happy", "sad", "surprise"])
+
+
+class EmotionThresholds(NamedTuple):
+    """Mouth-shape cut-offs, in frame-normalized units."""
+
+    happy_smile: float  # smile_ratio above this is happy
+    surprise_open: float  # mouth_open above this is surprise
+    sad_smile: float  # smile_ratio below this is sad
+
+
+class Classification(NamedTuple):
+    """Labels and scores for N frames."""
+
+    labels: np.ndarray  # (N,) str
+    smile_ratio: np.ndarray  # (N,) float
+    mouth_open: np.ndarray  # (N,) float
+
+
+def default_thresholds() -> EmotionThresholds:
+    """Thresholds from Config (VISION_HAPPY_SMILE, VISION_SURPRISE_OPEN, VISION_SAD_SMILE)."""
+    return EmotionThresholds(Config.VISION_HAPPY_SMILE, Config.VISION_SURPRISE_OPEN, Config.VISION_SAD_SMILE)
+
+
+def classify_landmarks(landmarks: np.ndarray, thresholds: Optional[EmotionThresholds] = None) -> Classification:
+    """
+    Classify N faces from their landmarks.
+
+    Args:
+        landmarks: (N, 468, 3) full Face Mesh landmarks (478 with iris
+            refinement), or (N, 4, 3) holding only MOUTH_POINTS in that order.
+        thresholds: Cut-offs (default: default_thresholds()).
+
+    Returns:
+        Classification: One label and score pair per frame. Rows containing
+        NaN (no face) come back as neutral with NaN scores.
+
+    Raises:
+        ValueError: landmarks is not (N, 4, 3) or (N, >=468, 3).
+    """
+    landmarks = np.asarray(landmarks)
+    if landmarks.ndim != 3 or landmarks.shape[2] < 2 or (landmarks.shape[1] != 4 and landmarks.shape[1] < 468):
+        raise ValueError(f"Expected landmarks shaped (N, 468, 3) or (N, 4, 3), got {landmarks.shape}")
+    t = thresholds or default_thresholds()
+
+    points = landmarks[:, :, 1] if landmarks.shape[1] == 4 else landmarks[:, MOUTH_POINTS, 1]
+    upper_lip, lower_lip, left_corner, right_corner = points.T
+    mouth_open = lower_lip - upper_lip
+    smile_ratio = (upper_lip + lower_lip) / 2 - (left_corner + right_corner) / 2
+
+    # Later assignments have lower priority, so apply the rules in reverse order
+    codes = np.zeros(len(points), dtype=np.uint8)
+    codes[smile_ratio < t.sad_smile] = 2
+    codes[mouth_open > t.surprise_open] = 3
+    codes[smile_ratio > t.happy_smile] = 1
+    return Classification(LABELS[codes], smile_ratio, mouth_open)
@@ -0,0 +1,326 @@
+"""
+Incremental emotion trajectory for Feelio.
+Keeps running per-label counts instead of re-scanning a history buffer, so
+an update is O(1) and a per-turn summary costs the same whether emotions
+arrive once per message or once per camera frame.
+
+Samples are folded into one-second buckets; each configured time window
+(30 s and 5 min by default) keeps its own running counts and drops whole
+buckets as they age out. A short ring of the latest labels covers sparse
+feeds (one label per chat turn), and optional exponential decay gives a
+recency-weighted view.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import Config
+
+BUCKET_SECONDS = 1.0
+MIN_SAMPLES = 4  # fewer than this reads as "steady so far"
+
+
+class WindowStats(NamedTuple):
+    """Label counts over one time window."""
+
+    seconds: float
+    count: int
+    counts: Dict[str, int]
+    dominant: Optional[str]
+
+
+class _Window:
+    """Running counts over the closed buckets inside one time span."""
+
+    __slots__ = ("seconds", "buckets", "counts", "count")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.buckets: deque = deque()
+        self.counts: Dict[str, int] = {}
+        self.count = 0
+
+    def add(self, bucket_counts: Dict[str, int]) -> None:
+        counts = self.counts
+        for label, n in bucket_counts.items():
+            counts[label] = counts.get(label, 0) + n
+            self.count += n
+
+    def expire(self, now: float) -> None:
+        cutoff = now - self.seconds
+        buckets, counts = self.buckets, self.counts
+        while buckets and buckets[0][0] + BUCKET_SECONDS <= cutoff:
+            for label, n in buckets.popleft()[1].items():
+                left = counts[label] - n
+                if left:
+                    counts[label] = left
+                else:
+                    del counts[label]
+                self.count -= n
+
+
+def _dominant(counts: Dict[str, int]) -> Optional[str]:
+    return max(counts, key=counts.__getitem__) if counts else None
+
+
+def _span(seconds: float) -> str:
+    return f"{seconds / 60:g} min" if seconds >= 60 else f"{seconds:g}s"
+
+
+class EmotionTrajectory:
+    """Thread-safe emotion trajectory with O(1) updates."""
+
+    # Decay weights grow as 2**(t/half_life); rebase before they overflow
+    _REBASE_WEIGHT = 1e100
+
+    def __init__(
+        self,
+        windows: Sequence[float] = (30.0, 300.0),
+        recent: int = 20,
+        half_life: Optional[float] = None,
+    ):
+        """
+        Initialize an empty trajectory.
+
+        Args:
+            windows: Time windows in seconds to keep running counts for.
+            recent: How many of the latest labels to keep in order.
+            half_life: Seconds for a sample's decayed weight to halve
+                (None disables decay).
+        """
+        if not windows or min(windows) <= 0:
+            raise ValueError("windows must be non-empty and > 0")
+        self._lock = threading.Lock()
+        self._windows = [_Window(float(s)) for s in sorted(set(windows))]
+        # Bucket still receiving samples: [start, {label: count}, first label]
+        self._open: Optional[list] = None
+        self._recent: deque = deque(maxlen=recent)
+        self._recent_counts: Dict[str, int] = {}
+        self._recent_changes = 0  # adjacent label changes inside the ring
+        self.half_life = half_life
+        self._scores: Dict[str, float] = {}
+        self._scores_ref = 0.0
+
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self.last: Optional[str] = None
+        self.last_ts = 0.0
+
+    def __len__(self) -> int:
+        """Entries held in memory (buckets plus recent labels), not samples."""
+        return len(self._windows[-1].buckets) + len(self._recent)
+
+    def update(self, emotion: str, ts: Optional[float] = None) -> None:
+        """
+        Record one emotion sample.
+
+        Args:
+            emotion: The emotion label.
+            ts: Sample time (defaults to now); samples should arrive in order.
+        """
+        if ts is None:
+            ts = time.time()
+        with self._lock:
+            self.counts[emotion] = self.counts.get(emotion, 0) + 1
+            self.samples += 1
+            self.last, self.last_ts = emotion, ts
+
+            recent, recent_counts = self._recent, self._recent_counts
+            if len(recent) == recent.maxlen:
+                dropped = recent[0]
+                if recent_counts[dropped] > 1:
+                    recent_counts[dropped] -= 1
+                else:
+                    del recent_counts[dropped]
+                if len(recent) > 1 and recent[1] != dropped:
+                    self._recent_changes -= 1
+            if recent and recent[-1] != emotion:
+                self._recent_changes += 1
+            recent.append(emotion)
+            recent_counts[emotion] = recent_counts.get(emotion, 0) + 1
+
+            # Samples only touch the open bucket; windows take it once per second
+            bucket = self._open
+            if bucket is None or ts >= bucket[0] + BUCKET_SECONDS:
+                self._close()
+                bucket = self._open = [ts - ts % BUCKET_SECONDS, {}, emotion]
+                for window in self._windows:
+                    window.buckets.append(bucket)
+                    window.expire(ts)
+            bucket[1][emotion] = bucket[1].get(emotion, 0) + 1
+
+            if self.half_life:
+                weight = 2.0 ** ((ts - self._scores_ref) / self.half_life)
+                if weight > self._REBASE_WEIGHT:
+                    self._scores = {label: score / weight for label, score in self._scores.items()}
+                    self._scores_ref, weight = ts, 1.0
+                self._scores[emotion] = self._scores.get(emotion, 0.0) + weight
+
+    def _close(self) -> None:
+        """Fold the open bucket into every window's running counts."""
+        if self._open is not None:
+            for window in self._windows:
+                window.add(self._open[1])
+            self._open = None
+
+    def _settle(self, now: float) -> None:
+        """Close the open bucket if it has ended and drop expired buckets."""
+        if self._open is not None and now >= self._open[0] + BUCKET_SECONDS:
+            self._close()
+        for window in self._windows:
+            window.expire(now)
+
+    def _window_counts(self, window: _Window) -> Tuple[int, Dict[str, int]]:
+        if self._open is None:
+            return window.count, window.counts
+        counts = dict(window.counts)
+        for label, n in self._open[1].items():
+            counts[label] = counts.get(label, 0) + n
+        return window.count + sum(self._open[1].values()), counts
+
+    # ========== QUERIES ==========
+
+    def window(self, seconds: float, now: Optional[float] = None) -> WindowStats:
+        """
+        Label counts over one of the configured windows.
+
+        Args:
+            seconds: A window passed to the constructor.
+            now: Reference time (defaults to now).
+
+        Returns:
+            WindowStats: Counts ending at `now`.
+        """
+        for window in self._windows:
+            if window.seconds == seconds:
+                break
+        else:
+            raise ValueError(f"no {seconds}s window configured")
+        with self._lock:
+            self._settle(time.time() if now is None else now)
+            count, counts = self._window_counts(window)
+            return WindowStats(window.seconds, count, dict(counts), _dominant(counts))
+
+    def decayed(self, now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Recency-weighted label scores (empty when decay is off).
+
+        Args:
+            now: Reference time (defaults to now).
+        """
+        if not self.half_life:
+            return {}
+        with self._lock:
+            now = time.time() if now is None else now
+            factor = 2.0 ** ((self._scores_ref - now) / self.half_life)
+            return {label: score * factor for label, score in self._scores.items()}
+
+    def volatility(self) -> float:
+        """
+        How often the label changed across the recent ring.
+
+        Returns:
+            float: Changes per transition in [0, 1]; 0 for a steady or new trajectory.
+        """
+        with self._lock:
+            n = len(self._recent)
+            return self._recent_changes / (n - 1) if n > 1 else 0.0
+
+    def recent_labels(self) -> List[str]:
+        """The latest labels, oldest first."""
+        with self._lock:
+            return list(self._recent)
+
+    def describe(self, now: Optional[float] = None) -> str:
+        """
+        Describe how emotion has shifted recently.
+
+        Dense feeds (camera frames) are read over the shortest time window;
+        sparse ones (one label per message) over the recent-label ring.
+
+        Args:
+            now: Reference time (defaults to now).
+
+        Returns:
+            str: A human-readable description of the emotional trajectory.
+        """
+        with self._lock:
+            self._settle(time.time() if now is None else now)
+            short, longest = self._windows[0], self._windows[-1]
+
+            count, counts = self._window_counts(short)
+            if count >= MIN_SAMPLES:
+                start = short.buckets[0][2]
+            elif len(self._recent) >= MIN_SAMPLES:
+                start, counts = self._recent[0], self._recent_counts
+            else:
+                return "steady so far"
+
+            end = self.last
+            text = f"from {start} toward {end}" if start != end else f"mostly {_dominant(counts)}"
+            if longest is not short:
+                count, counts = self._window_counts(longest)
+                overall = _dominant(counts)
+                if count >= MIN_SAMPLES and overall != end:
+                    text += f"; mostly {overall} over the last {_span(longest.seconds)}"
+            return text
+
+    # ========== SERIALIZATION ==========
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        Compact JSON-ready state.
+
+        Returns:
+            dict: Counts, recent labels, live buckets and decay scores.
+        """
+        with self._lock:
+            return {
+                "n": self.samples,
+                "c": self.counts,
+                "r": list(self._recent),
+                "b": list(self._windows[-1].buckets),
+                "l": [self.last, self.last_ts],
+                "d": [self._scores_ref, self._scores] if self.half_life else None,
+            }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Restore from to_state output into this (empty) trajectory.
+
+        Args:
+            state: A dict produced by to_state.
+        """
+        with self._lock:
+            self.samples = state["n"]
+            self.counts = dict(state["c"])
+            self.last, self.last_ts = state["l"]
+            self._recent.extend(state["r"])
+            previous = None
+            for label in self._recent:
+                self._recent_counts[label] = self._recent_counts.get(label, 0) + 1
+                if previous is not None and label != previous:
+                    self._recent_changes += 1
+                previous = label
+            # Restored buckets are all closed; the next sample opens a new one
+            for start, counts, first in state["b"]:
+                bucket = [start, dict(counts), first]
+                for window in self._windows:
+                    window.buckets.append(bucket)
+                    window.add(bucket[1])
+            for window in self._windows:
+                window.expire(self.last_ts)
+            if self.half_life and state.get("d"):
+                self._scores_ref, scores = state["d"]
+                self._scores = dict(scores)
+
+
+def new_trajectory() -> EmotionTrajectory:
+    """Build a trajectory with the configured windows and decay."""
+    return EmotionTrajectory(
+        windows=Config.TRAJECTORY_WINDOWS,
+        recent=Config.TRAJECTORY_RECENT,
+        half_life=Config.TRAJECTORY_HALF_LIFE or None,
+    )
@@ -0,0 +1,205 @@
+"""
+Frame sources for the vision pipeline: a live camera, a video file, or a
+directory of images. All three speak cv2.VideoCapture's read/isOpened/
+release, so VisionSystem takes any of them, and add what offline analysis
+needs: a frame count, seeking, cheap skipping and media timestamps.
+"""
+
+import logging
+import os
+from typing import Any, Iterator, List, Optional, Tuple
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+DEFAULT_FPS = 30.0  # when a file does not say, and for image directories
+
+
+class FrameSource:
+    """Base class; subclasses implement read/isOpened/release and seeking."""
+
+    live = False  # a camera never ends; a recording does
+    fps = DEFAULT_FPS
+
+    def __len__(self) -> int:
+        """Frames in the recording (0 if unknown, e.g. a camera)."""
+        return 0
+
+    def isOpened(self) -> bool:
+        raise NotImplementedError
+
+    def read(self) -> Tuple[bool, Any]:
+        raise NotImplementedError
+
+    def skip(self) -> bool:
+        """Advance one frame without decoding it where the source allows."""
+        ok, _ = self.read()
+        return ok
+
+    def seek(self, index: int) -> None:
+        raise NotImplementedError
+
+    def release(self) -> None:
+        pass
+
+    def frames(self, start: int = 0, stop: Optional[int] = None, step: int = 1) -> Iterator[Tuple[int, float, Any]]:
+        """
+        Iterate over a range of frames.
+
+        Args:
+            start: First frame index.
+            stop: Index to stop before (None = until the end).
+            step: Yield every step-th frame; the others are skipped, not decoded.
+
+        Yields:
+            (frame index, media time in seconds, BGR frame). The frame is None
+            for an image that could not be decoded; the range goes on after it.
+        """
+        self.seek(start)
+        index = start
+        while stop is None or index < stop:
+            if (index - start) % step:
+                if not self.skip():
+                    return
+            else:
+                ok, frame = self.read()
+                if not ok:
+                    return
+                yield index, index / self.fps, frame
+            index += 1
+
+
+class CameraSource(FrameSource):
+    """A live camera (cv2.VideoCapture device)."""
+
+    live = True
+
+    def __init__(self, index: Optional[int] = None):
+        """
+        Args:
+            index: Camera device; None tries camera 1, then camera 0.
+        """
+        self.cap = cv2.VideoCapture(1 if index is None else index)
+        if index is None and not self.cap.isOpened():
+            self.cap = cv2.VideoCapture(0)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self) -> Tuple[bool, Any]:
+        return self.cap.read()
+
+    def seek(self, index: int) -> None:
+        """Cameras cannot seek; reading always returns the current frame."""
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """A recorded video file."""
+
+    def __init__(self, path: str):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Video file not found: {path}")
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        self._count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def __len__(self) -> int:
+        return max(0, self._count)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self) -> Tuple[bool, Any]:
+        return self.cap.read()
+
+    def skip(self) -> bool:
+        # grab() demuxes without converting the frame to BGR
+        return self.cap.grab()
+
+    def seek(self, index: int) -> None:
+        if index != int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """Images in a directory, in file-name order, as frames at a fixed rate."""
+
+    def __init__(self, path: str, fps: float = DEFAULT_FPS):
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Image directory not found: {path}")
+        self.path = path
+        self.fps = fps
+        self.files: List[str] = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def isOpened(self) -> bool:
+        return self._next < len(self.files)
+
+    def _load(self, index: int) -> Optional[Any]:
+        frame = cv2.imread(self.files[index])
+        if frame is None:
+            logger.warning(f"⚠️ Skipping unreadable image: {self.files[index]}")
+        return frame
+
+    def read(self) -> Tuple[bool, Any]:
+        """Return the next image that decodes; unreadable files are logged and skipped."""
+        while self._next < len(self.files):
+            frame = self._load(self._next)
+            self._next += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def skip(self) -> bool:
+        self._next += 1
+        return self._next <= len(self.files)
+
+    def seek(self, index: int) -> None:
+        self._next = index
+
+    def frames(self, start: int = 0, stop: Optional[int] = None, step: int = 1) -> Iterator[Tuple[int, float, Any]]:
+        # One entry per file, so a corrupt image keeps its slot (frame None) instead of ending the range
+        stop = len(self.files) if stop is None else min(stop, len(self.files))
+        for index in range(start, stop, step):
+            self._next = index + 1
+            yield index, index / self.fps, self._load(index)
+
+
+def open_source(spec: str = "") -> FrameSource:
+    """
+    Open a frame source from a short description.
+
+    Args:
+        spec: "" (camera 1, falling back to 0), a camera number, a video
+            file path or an image directory path.
+
+    Returns:
+        FrameSource: The opened source.
+
+    Raises:
+        FileNotFoundError: spec names a path that does not exist.
+    """
+    spec = spec.strip()
+    if not spec:
+        return CameraSource()
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec)
+    return VideoFileSource(spec)
@@ -0,0 +1,153 @@
+"""
+Rolling chat-history compaction for Feelio.
+Every Gemini call resends the whole conversation, so prompt size (and
+latency) grows with session length. Past a token budget, older exchanges
+are folded into a running summary and only the last few raw turns are kept,
+which keeps the per-turn prompt roughly constant.
+"""
+
+import logging
+import re
+from typing import Callable, List, Optional, Tuple
+
+from therapy_utils import build_summary_prompt
+
+logger = logging.getLogger(__name__)
+
+History = List[Tuple[str, str]]
+
+SUMMARY_MARKER = "[EARLIER IN THIS SESSION]"
+SUMMARY_ACK = "Understood. I'll keep that earlier context in mind."
+
+# Full prompts continue with EMOTIONAL STATE; delta prompts end at USER SAID
+_USER_SAID = re.compile(r"USER SAID: '(.*?)'\.(?: EMOTIONAL STATE|\Z)", re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English).
+
+    Args:
+        text: Any prompt text.
+
+    Returns:
+        int: Approximate token count.
+    """
+    return (len(text) + 3) // 4
+
+
+def history_tokens(history: History) -> int:
+    """Estimate tokens across a (role, text) history."""
+    return sum(estimate_tokens(text) for _, text in history)
+
+
+def extract_user_said(prompt: str) -> str:
+    """
+    Recover the user's own words from a fusion prompt.
+
+    Args:
+        prompt: A history entry (fusion prompt or plain text).
+
+    Returns:
+        str: The quoted user text, or the entry itself if not a fusion prompt.
+    """
+    match = _USER_SAID.search(prompt)
+    return match.group(1) if match else prompt
+
+
+def local_summary(previous: Optional[str], folded: History, max_chars: int = 1200) -> str:
+    """
+    Extractive fallback summary when no model summarizer is available.
+
+    Args:
+        previous: The running summary being extended, if any.
+        folded: (role, text) pairs being folded away.
+        max_chars: Length cap; the oldest material is dropped first.
+
+    Returns:
+        str: The new running summary.
+    """
+    lines = [previous] if previous else []
+    for role, text in folded:
+        if role == "user":
+            lines.append(f"User: {extract_user_said(text)[:160]}")
+        else:
+            lines.append(f"Therapist: {text[:160]}")
+    summary = " | ".join(lines)
+    return summary[-max_chars:]
+
+
+class HistoryCompactor:
+    """Folds old turns into a running summary once history exceeds a budget."""
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        keep_turns: int = 6,
+        summarizer: Optional[Callable[[str], str]] = None,
+    ):
+        """
+        Initialize the compactor.
+
+        Args:
+            token_budget: Estimated history tokens that trigger compaction.
+            keep_turns: Most recent exchanges kept verbatim.
+            summarizer: Callable sending a prompt to a model and returning
+                text (e.g. llm.generate). None uses local_summary only.
+        """
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summarizer = summarizer
+        self.compactions = 0
+
+    def maybe_compact(self, history: History, emotions: List[str]) -> Optional[History]:
+        """
+        Compact history if it is over budget.
+
+        At least keep_turns exchanges must be foldable, so a model summary is
+        requested at most once every keep_turns turns even when the kept
+        turns alone exceed the budget.
+
+        Args:
+            history: The chat's (role, text) pairs.
+            emotions: Emotion labels observed so far (oldest first).
+
+        Returns:
+            The compacted history, or None if nothing needed to change.
+        """
+        if history_tokens(history) <= self.token_budget:
+            return None
+
+        previous = None
+        older = history[:-2 * self.keep_turns] if self.keep_turns else list(history)
+        recent = history[len(older):]
+
+        if older and older[0][0] == "user" and older[0][1].startswith(SUMMARY_MARKER):
+            previous = older[0][1][len(SUMMARY_MARKER):].strip()
+            older = older[2:]
+
+        if len(older) < 2 * max(self.keep_turns, 1):
+            return None
+
+        summary = self._summarize(previous, older, emotions)
+        self.compactions += 1
+        logger.debug(f"History compacted: folded {len(older) // 2} turns")
+
+        return [("user", f"{SUMMARY_MARKER} {summary}"), ("model", SUMMARY_ACK)] + recent
+
+    def _summarize(self, previous: Optional[str], folded: History, emotions: List[str]) -> str:
+        if self.summarizer is not None:
+            snippets = [{"summary_so_far": previous}] if previous else []
+            for i in range(0, len(folded) - 1, 2):
+                snippets.append({
+                    "user": extract_user_said(folded[i][1]),
+                    "ai": folded[i + 1][1],
+                })
+            try:
+                summary = self.summarizer(build_summary_prompt(emotions[-20:], snippets)).strip()
+                if summary:
+                    return summary
+            except Exception as e:
+                logger.warning(f"⚠️ Summary generation failed, using local summary: {e}")
+
+        return local_summary(previous, folded)
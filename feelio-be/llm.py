@@ -0,0 +1,512 @@
+"""
+Shared LLM layer for Feelio.
+Holds the therapist persona in one place and routes every generation in
+app.py/asgi.py and main.py through a pluggable backend: Gemini in
+production, or a deterministic local stub (tunable latency, stalls, token
+rate and failure rate) for offline load testing and profiling. The
+configured backend is wrapped with deadlines, hedging and circuit breakers
+(resilience.py). Each session only gets a cheap ChatHandle that owns its
+(role, text) history.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import zlib
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import google.generativeai as genai
+
+from config import Config
+from resilience import ResilientBackend, wrap_backend
+
+logger = logging.getLogger(__name__)
+
+THERAPIST_INSTRUCTIONS = """
+You are Dr. Libra, a highly experienced Clinical Psychologist (PhD).
+You do not "fix" patients; you guide them to their own insight using CBT, ACT, and Humanistic techniques.
+
+--- YOUR CLINICAL FRAMEWORK ---
+
+1.  **THE "HOLDING SPACE" RULE:**
+    * Before offering ANY solution, you must fully "hold" the user's pain.
+    * *Bad:* "You're sad? Try going for a walk."
+    * *Good:* "I can hear how heavy that sadness feels right now. It makes sense you feel drained."
+
+2.  **SOCRATIC INQUIRY (The Art of Questioning):**
+    * Do not just give answers. Ask questions that challenge the user's logic.
+    * *Example:* "You mentioned you are a 'failure.' What specific evidence do you have for that thought, and what evidence argues against it?"
+
+3.  **SPOT COGNITIVE DISTORTIONS:**
+    * Listen for these patterns and gently point them out:
+        * *Catastrophizing:* "It sounds like your mind is jumping to the worst-case scenario. Is that guaranteed to happen?"
+        * *All-or-Nothing Thinking:* "You seem to be seeing this as black or white. Is there a middle ground?"
+        * *Mind Reading:* "You feel your friend hates you, but have they actually said that?"
+
+4.  **MULTIMODAL DECODING:**
+    * **Conflict:** If Face = SAD but Words = "I'm fine" -> SAY: "My sensors see pain in your eyes, even though your words say you're fine. I'm listening to your eyes right now."
+    * **Silence:** If the user gives short answers, gently probe: "I notice you're quiet today. Is it hard to find the words?"
+
+--- RESPONSE STRUCTURE ---
+(Keep it conversational, not a list)
+1.  **Reflection:** Mirror back what they said + the underlying emotion.
+2.  **The "Deepen" Question:** Ask something to explore *why* they feel this way.
+3.  **The Tool (Optional):** Only offer a tool if they seem stuck or ask for help.
+
+--- TONE ---
+* **Pacing:** Slow, thoughtful, unhurried.
+* **Voice:** Warm, anchoring, steady.
+* **Safety:** If SUICIDE/SELF-HARM is detected -> DROP therapy. Switch to CRISIS INTERVENTION immediately.
+
+Keep responses concise (2-3 sentences max) and empathetic.
+"""
+
+# Per-turn rules. Full prompts repeat them every turn; in delta prompt mode
+# they are sent once, here, and turns carry only the context that changed.
+TURN_INSTRUCTIONS = """
+--- EACH TURN ---
+CONTEXT: Short, solution-focused spoken therapy.
+Turns start with context fields (EMOTIONAL STATE, EMOTION TRAJECTORY,
+CONTRADICTION FLAG, SUGGESTED PLAYBOOK, PACE HINT), then USER SAID.
+Only fields that changed are sent; any field not repeated keeps its last value.
+INSTRUCTION: 1) Validate based on words + emotion, 2) offer ONE specific tool
+right now, 3) keep under 3 sentences, 4) if contradiction, invite gentle
+clarification, 5) match the pace hint (slightly slower if requested).
+"""
+
+
+def system_instruction() -> str:
+    """The system instruction for the configured prompt mode."""
+    if Config.PROMPT_MODE == "delta":
+        return THERAPIST_INSTRUCTIONS + TURN_INSTRUCTIONS
+    return THERAPIST_INSTRUCTIONS
+
+
+History = List[Tuple[str, str]]
+
+_lock = threading.Lock()
+_backend: Optional["LLMBackend"] = None
+
+# Construction cost counters (see model_stats)
+_stats = {
+    "models_built": 0,
+    "model_build_ms": 0.0,
+    "chats_started": 0,
+    "chat_start_ms": 0.0,
+}
+
+
+def _to_contents(history: History, user_text: Optional[str] = None) -> List[dict]:
+    contents = [{"role": role, "parts": [text]} for role, text in history]
+    if user_text is not None:
+        contents.append({"role": "user", "parts": [user_text]})
+    return contents
+
+
+# ========== BACKENDS ==========
+
+class LLMBackend:
+    """
+    Interface every generation goes through.
+
+    `history` is the conversation so far as (role, text) pairs (empty for
+    one-shot prompts) and `prompt` is the new user turn.
+    """
+
+    name = "base"
+
+    def prepare(self, model_name: Optional[str] = None) -> None:
+        """Warm up anything needed to serve model_name (optional)."""
+
+    def generate(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        """Return the full reply."""
+        raise NotImplementedError
+
+    def generate_stream(self, history: History, prompt: str, model_name: Optional[str] = None) -> Iterator[str]:
+        """Yield reply chunks as they are produced."""
+        raise NotImplementedError
+
+    async def generate_async(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        """Async variant of generate."""
+        raise NotImplementedError
+
+    async def generate_stream_async(
+        self, history: History, prompt: str, model_name: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Async variant of generate_stream."""
+        raise NotImplementedError
+        yield  # pragma: no cover - marks this as an async generator
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via google.generativeai, one cached model per name."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Initialize the backend and configure the client once per process.
+
+        Args:
+            api_key: API key (defaults to Config.GEMINI_API_KEY).
+            timeout: Per-request client timeout in seconds, so calls the
+                caller stopped waiting for do not hold a connection forever.
+        """
+        genai.configure(api_key=api_key or Config.GEMINI_API_KEY)
+        self._models: Dict[str, "genai.GenerativeModel"] = {}
+        self._request_options = {"timeout": timeout} if timeout else {}
+        logger.info("✅ Gemini API configured")
+
+    def get_model(self, model_name: Optional[str] = None) -> "genai.GenerativeModel":
+        """
+        Return the shared GenerativeModel for a model name, building it once.
+
+        Args:
+            model_name: Gemini model name (defaults to Config.MODEL_NAME).
+
+        Returns:
+            genai.GenerativeModel: Cached model carrying the therapist persona.
+        """
+        model_name = model_name or Config.MODEL_NAME
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+
+        with _lock:
+            model = self._models.get(model_name)
+            if model is None:
+                start = time.perf_counter()
+                model = genai.GenerativeModel(
+                    model_name,
+                    system_instruction=system_instruction(),
+                )
+                _stats["models_built"] += 1
+                _stats["model_build_ms"] += (time.perf_counter() - start) * 1000
+                self._models[model_name] = model
+                logger.info(f"✅ Model ready: {model_name}")
+        return model
+
+    def prepare(self, model_name: Optional[str] = None) -> None:
+        self.get_model(model_name)
+
+    def generate(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        return self.get_model(model_name).generate_content(
+            _to_contents(history, prompt), request_options=self._request_options
+        ).text
+
+    def generate_stream(self, history: History, prompt: str, model_name: Optional[str] = None) -> Iterator[str]:
+        response = self.get_model(model_name).generate_content(
+            _to_contents(history, prompt), stream=True, request_options=self._request_options
+        )
+        for chunk in response:
+            text = chunk.text
+            if text:
+                yield text
+
+    async def generate_async(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        response = await self.get_model(model_name).generate_content_async(
+            _to_contents(history, prompt), request_options=self._request_options
+        )
+        return response.text
+
+    async def generate_stream_async(
+        self, history: History, prompt: str, model_name: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        response = await self.get_model(model_name).generate_content_async(
+            _to_contents(history, prompt), stream=True, request_options=self._request_options
+        )
+        async for chunk in response:
+            text = chunk.text
+            if text:
+                yield text
+
+
+class StubBackendError(RuntimeError):
+    """Injected failure raised by StubBackend."""
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic offline backend for load tests and profiling.
+
+    Replies are picked from canned therapist lines by a hash of the prompt,
+    so the same input always gets the same reply. Failures are drawn from a
+    seeded RNG, so a run with the same request order fails the same calls.
+    """
+
+    name = "stub"
+
+    REPLIES = (
+        "I can hear how heavy that feels right now. What part of it weighs on you most?",
+        "It makes sense you'd feel that way. What do you notice in your body as you say it?",
+        "Thank you for sharing that with me. What would feel like one small step today?",
+        "That sounds really hard. When did you first notice this feeling building up?",
+        "I'm listening. What evidence do you have for that thought, and what argues against it?",
+    )
+
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        tokens_per_sec: float = 50.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        model_latency_ms: Optional[Dict[str, float]] = None,
+        slow_rate: float = 0.0,
+        slow_ms: float = 10000.0,
+    ):
+        """
+        Initialize the stub.
+
+        Args:
+            latency_ms: Delay before the first token.
+            tokens_per_sec: Output rate after the first token (0 = instant).
+            failure_rate: Probability in [0, 1] that a call raises StubBackendError.
+            seed: RNG seed for failure injection.
+            model_latency_ms: Per-model overrides of latency_ms, so routed
+                tiers can be given different speeds.
+            slow_rate: Probability in [0, 1] that a call stalls for slow_ms
+                before its first token (a degraded upstream).
+            slow_ms: Delay before the first token of a stalled call.
+        """
+        self.latency_ms = latency_ms
+        self.model_latency_ms = dict(model_latency_ms or {})
+        self.tokens_per_sec = tokens_per_sec
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _reply(self, history: History, prompt: str) -> str:
+        return self.REPLIES[zlib.crc32(prompt.encode("utf-8")) % len(self.REPLIES)]
+
+    def _should_fail(self) -> bool:
+        if self.failure_rate <= 0:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < self.failure_rate
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def _chunks(self, reply: str) -> List[str]:
+        words = reply.split(" ")
+        return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+    def _latency(self, model_name: Optional[str]) -> float:
+        if self.slow_rate > 0:
+            with self._rng_lock:
+                if self._rng.random() < self.slow_rate:
+                    return self.slow_ms / 1000
+        return self.model_latency_ms.get(model_name, self.latency_ms) / 1000
+
+    def _total_delay(self, reply: str, model_name: Optional[str]) -> float:
+        return self._latency(model_name) + len(self._chunks(reply)) * self._token_delay()
+
+    def generate(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        reply = self._reply(history, prompt)
+        time.sleep(self._total_delay(reply, model_name))
+        if self._should_fail():
+            raise StubBackendError("Injected stub failure")
+        return reply
+
+    def generate_stream(self, history: History, prompt: str, model_name: Optional[str] = None) -> Iterator[str]:
+        time.sleep(self._latency(model_name))
+        if self._should_fail():
+            raise StubBackendError("Injected stub failure")
+        delay = self._token_delay()
+        for chunk in self._chunks(self._reply(history, prompt)):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    async def generate_async(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        reply = self._reply(history, prompt)
+        await asyncio.sleep(self._total_delay(reply, model_name))
+        if self._should_fail():
+            raise StubBackendError("Injected stub failure")
+        return reply
+
+    async def generate_stream_async(
+        self, history: History, prompt: str, model_name: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        await asyncio.sleep(self._latency(model_name))
+        if self._should_fail():
+            raise StubBackendError("Injected stub failure")
+        delay = self._token_delay()
+        for chunk in self._chunks(self._reply(history, prompt)):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+def create_backend(kind: Optional[str] = None) -> LLMBackend:
+    """
+    Build the backend selected in Config, wrapped by the resilience layer.
+
+    Args:
+        kind: "gemini" or "stub" (defaults to Config.LLM_BACKEND).
+
+    Returns:
+        LLMBackend: The new backend (a ResilientBackend unless LLM_RESILIENCE is off).
+    """
+    kind = (kind or Config.LLM_BACKEND).lower()
+    if kind == "gemini":
+        return wrap_backend(GeminiBackend(timeout=Config.LLM_DEADLINE_SECONDS))
+    if kind == "stub":
+        logger.info("🧪 Using stub LLM backend")
+        return wrap_backend(StubBackend(
+            latency_ms=Config.STUB_LATENCY_MS,
+            tokens_per_sec=Config.STUB_TOKENS_PER_SEC,
+            failure_rate=Config.STUB_FAILURE_RATE,
+            seed=Config.STUB_SEED,
+            model_latency_ms={Config.FAST_MODEL_NAME: Config.STUB_FAST_LATENCY_MS},
+            slow_rate=Config.STUB_SLOW_RATE,
+            slow_ms=Config.STUB_SLOW_MS,
+        ))
+    raise ValueError(f"Unknown LLM_BACKEND: {kind}")
+
+
+def get_backend() -> LLMBackend:
+    """Return the process-wide backend, creating it from Config on first use."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: LLMBackend) -> None:
+    """Replace the process-wide backend (benchmarks, tests, tools)."""
+    global _backend
+    _backend = backend
+
+
+def configure(api_key: Optional[str] = None) -> None:
+    """
+    Initialize the configured backend once per process.
+
+    Args:
+        api_key: Gemini API key (defaults to Config.GEMINI_API_KEY).
+    """
+    global _backend
+    if _backend is not None:
+        return
+    with _lock:
+        if _backend is None and Config.LLM_BACKEND == "gemini":
+            _backend = wrap_backend(GeminiBackend(api_key, timeout=Config.LLM_DEADLINE_SECONDS))
+    get_backend()
+
+
+# ========== CHAT HANDLES ==========
+
+class ChatHandle:
+    """
+    Per-session conversation over the shared backend.
+
+    History is only extended after a reply arrives in full, so a failed or
+    abandoned call leaves the conversation unchanged.
+    """
+
+    __slots__ = ("history", "model_name")
+
+    def __init__(self, history: Optional[History] = None, model_name: Optional[str] = None):
+        """
+        Initialize a chat handle.
+
+        Args:
+            history: Prior (role, text) pairs, role being "user" or "model".
+            model_name: Model name (defaults to Config.MODEL_NAME).
+        """
+        self.history: History = list(history or [])
+        self.model_name = model_name
+
+    def _commit(self, user_text: str, reply: str) -> None:
+        self.history.append(("user", user_text))
+        self.history.append(("model", reply))
+
+    def send_message(self, user_text: str, model_name: Optional[str] = None) -> str:
+        """
+        Send a message and return the full reply text.
+
+        `model_name` overrides the handle's model for this call only; the
+        history is shared, so routed turns stay one conversation.
+        """
+        reply = get_backend().generate(self.history, user_text, model_name or self.model_name)
+        self._commit(user_text, reply)
+        return reply
+
+    def send_message_stream(self, user_text: str, model_name: Optional[str] = None) -> Iterator[str]:
+        """Send a message and yield reply text chunks as they arrive."""
+        chunks = []
+        for text in get_backend().generate_stream(self.history, user_text, model_name or self.model_name):
+            chunks.append(text)
+            yield text
+        self._commit(user_text, "".join(chunks))
+
+    async def send_message_async(self, user_text: str, model_name: Optional[str] = None) -> str:
+        """Send a message without blocking the event loop."""
+        reply = await get_backend().generate_async(self.history, user_text, model_name or self.model_name)
+        self._commit(user_text, reply)
+        return reply
+
+    async def send_message_stream_async(
+        self, user_text: str, model_name: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Async variant of send_message_stream."""
+        chunks = []
+        async for text in get_backend().generate_stream_async(
+            self.history, user_text, model_name or self.model_name
+        ):
+            chunks.append(text)
+            yield text
+        self._commit(user_text, "".join(chunks))
+
+
+def new_chat(history: Optional[History] = None, model_name: Optional[str] = None) -> ChatHandle:
+    """
+    Start a per-session chat handle on the shared backend.
+
+    Args:
+        history: Prior (role, text) pairs to resume from.
+        model_name: Model name (defaults to Config.MODEL_NAME).
+
+    Returns:
+        ChatHandle: The new handle.
+    """
+    start = time.perf_counter()
+    get_backend().prepare(model_name)
+    handle = ChatHandle(history, model_name)
+    _stats["chats_started"] += 1
+    _stats["chat_start_ms"] += (time.perf_counter() - start) * 1000
+    return handle
+
+
+def generate(prompt: str, model_name: Optional[str] = None) -> str:
+    """One-shot generation (no history) on the shared backend."""
+    return get_backend().generate([], prompt, model_name)
+
+
+def model_stats() -> Dict[str, float]:
+    """
+    Report the active backend and model/chat construction cost.
+
+    Returns:
+        dict: Counts plus total and average milliseconds for building models
+        (once per model name) and starting per-session chats.
+    """
+    backend = get_backend()
+    chats = _stats["chats_started"]
+    stats = {
+        "backend": backend.name,
+        "models_built": _stats["models_built"],
+        "model_build_ms": round(_stats["model_build_ms"], 3),
+        "chats_started": chats,
+        "chat_start_ms_avg": round(_stats["chat_start_ms"] / chats, 4) if chats else 0.0,
+    }
+    if isinstance(backend, ResilientBackend):
+        stats["resilience"] = backend.stats()
+    return stats
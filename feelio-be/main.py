@@ -6,27 +6,27 @@ Main entry point for the application with proper error handling and logging.
 import logging
 import sys
 import signal
-from collections import deque
-
-import google.generativeai as genai
+import time
 
+import llm
 from config import Config
+from emotion_trajectory import new_trajectory
+from history import HistoryCompactor, estimate_tokens, history_tokens
+from metrics import registry as metrics
+from routing import router
 from audio_module import AudioManager
 from vision_module import VisionSystem 
 from therapy_utils import (
+    PromptState,
     SessionLog,
-    update_emotion_history,
     summarize_trajectory,
-    detect_contradiction,
-    detect_high_risk,
-    select_playbook,
     build_fusion_prompt,
+    build_delta_prompt,
     build_summary_prompt,
     build_crisis_response,
-    extract_word_count,
-    determine_pace_hint,
     get_pre_pause_duration,
 )
+from turn_analysis import TurnAnalysis, analyze_turn
 
 
 # ========== LOGGING SETUP ==========
@@ -57,43 +57,8 @@ logger = logging.getLogger(__name__)
 class FeelioTherapist:
     """Main therapist orchestrator with all differentiating features."""
 
-    # --- UPDATED: ADVANCED CLINICAL PSYCHOLOGIST PERSONA ---
-    THERAPIST_INSTRUCTIONS = """
-    You are Dr. Libra, a highly experienced Clinical Psychologist (PhD).
-    You do not "fix" patients; you guide them to their own insight using CBT, ACT, and Humanistic techniques.
-
-    --- YOUR CLINICAL FRAMEWORK ---
-
-    1.  **THE "HOLDING SPACE" RULE:**
-        * Before offering ANY solution, you must fully "hold" the user's pain.
-        * *Bad:* "You're sad? Try going for a walk."
-        * *Good:* "I can hear how heavy that sadness feels right now. It makes sense you feel drained."
-
-    2.  **SOCRATIC INQUIRY (The Art of Questioning):**
-        * Do not just give answers. Ask questions that challenge the user's logic.
-        * *Example:* "You mentioned you are a 'failure.' What specific evidence do you have for that thought, and what evidence argues against it?"
-
-    3.  **SPOT COGNITIVE DISTORTIONS:**
-        * Listen for these patterns and gently point them out:
-            * *Catastrophizing:* "It sounds like your mind is jumping to the worst-case scenario. Is that guaranteed to happen?"
-            * *All-or-Nothing Thinking:* "You seem to be seeing this as black or white. Is there a middle ground?"
-            * *Mind Reading:* "You feel your friend hates you, but have they actually said that?"
-
-    4.  **MULTIMODAL DECODING:**
-        * **Conflict:** If Face = SAD but Words = "I'm fine" -> SAY: "My sensors see pain in your eyes, even though your words say you're fine. I'm listening to your eyes right now."
-        * **Silence:** If the user gives short answers, gently probe: "I notice you're quiet today. Is it hard to find the words?"
-
-    --- RESPONSE STRUCTURE ---
-    (Keep it conversational, not a list)
-    1.  **Reflection:** Mirror back what they said + the underlying emotion.
-    2.  **The "Deepen" Question:** Ask something to explore *why* they feel this way.
-    3.  **The Tool (Optional):** Only offer a tool if they seem stuck or ask for help.
-
-    --- TONE ---
-    * **Pacing:** Slow, thoughtful, unhurried.
-    * **Voice:** Warm, anchoring, steady.
-    * **Safety:** If SUICIDE/SELF-HARM is detected -> DROP therapy. Switch to CRISIS INTERVENTION immediately.
-    """
+    # Persona lives in llm.py so the API and CLI share one copy
+    THERAPIST_INSTRUCTIONS = llm.THERAPIST_INSTRUCTIONS
 
     def __init__(self, config: Config):
         """
@@ -101,19 +66,24 @@ class FeelioTherapist:
         """
         self.config = config
         self.session_log = SessionLog()
-        self.emotion_history: deque = deque(maxlen=180)
+        self.trajectory = new_trajectory()
+        self._samples_seen = 0  # trajectory.samples at the previous turn
+        self.prompt_state = PromptState()
+        self.prompt_tokens_saved = 0
         self.is_running = True
 
         # --- VISION SETUP (MODULAR) ---
-        self.vision = VisionSystem()
+        # Every classified frame feeds the trajectory, not just one label per turn
+        self.vision = VisionSystem(on_emotion=self.trajectory.update)
         
-        # Initialize Gemini
-        genai.configure(api_key=config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(
-            config.MODEL_NAME,
-            system_instruction=self.THERAPIST_INSTRUCTIONS,
-        )
-        self.chat_session = self.model.start_chat(history=[])
+        # Initialize the LLM backend (shared persona from llm.py)
+        llm.configure(config.GEMINI_API_KEY)
+        self.chat_session = llm.new_chat(model_name=config.MODEL_NAME)
+        self.compactor = HistoryCompactor(
+            token_budget=config.HISTORY_TOKEN_BUDGET,
+            keep_turns=config.HISTORY_KEEP_TURNS,
+            summarizer=llm.generate if config.HISTORY_LLM_SUMMARY else None,
+        ) if config.HISTORY_COMPACTION else None
 
         # Initialize audio
         self.audio = AudioManager(
@@ -162,10 +132,16 @@ class FeelioTherapist:
                     self.audio.speak_response("It was good to speak with you. Take care.")
                     break
 
-                # 5. Check high-risk content
-                if self.config.ENABLE_SAFETY_NET and detect_high_risk(user_input):
+                # 5. Analyze once (risk, intents, pacing), then check high-risk content
+                with metrics.span("analysis"):
+                    analysis = analyze_turn(user_input, current_emotion)
+                if self.config.ENABLE_SAFETY_NET and analysis.high_risk:
+                    metrics.inc("feelio_crises_total")
                     crisis_response = build_crisis_response()
-                    logger.warning("🚨 High-risk content detected - activating crisis protocol")
+                    logger.warning(
+                        f"🚨 High-risk content detected - activating crisis protocol "
+                        f"(matched: {', '.join(analysis.risk_phrases)})"
+                    )
                     self.audio.speak_response(
                         crisis_response,
                         slow=True,
@@ -175,17 +151,15 @@ class FeelioTherapist:
                     continue
 
                 # 6. Generate and deliver response
-                ai_response = self._generate_response(user_input, current_emotion)
+                ai_response = self._generate_response(user_input, current_emotion, analysis)
                 self.session_log.add_turn(user_input, ai_response, current_emotion)
 
                 # 7. Deliver with adaptive pacing
-                word_count = extract_word_count(user_input)
-                pace_hint = determine_pace_hint(word_count)
-                pre_pause = get_pre_pause_duration(pace_hint)
+                pre_pause = get_pre_pause_duration(analysis.pace_hint)
 
                 self.audio.speak_response(
                     ai_response,
-                    slow=(pace_hint == "slower"),
+                    slow=(analysis.pace_hint == "slower"),
                     pre_pause=pre_pause,
                 )
 
@@ -203,40 +177,69 @@ class FeelioTherapist:
         lowered = user_input.lower()
         return any(word in lowered for word in ["bye", "goodbye", "stop", "exit", "quit"])
 
-    def _generate_response(self, user_text: str, current_emotion: str) -> str:
+    def _generate_response(self, user_text: str, current_emotion: str, analysis: TurnAnalysis) -> str:
         """
         Generate AI response using fusion logic.
         """
         try:
-            # Update emotion history 
-            update_emotion_history(current_emotion, self.emotion_history)
-
-            # Build context
-            trajectory = summarize_trajectory(self.emotion_history)
-            contradiction = detect_contradiction(user_text, current_emotion)
-            playbook = select_playbook(current_emotion, user_text)
-
-            word_count = extract_word_count(user_text)
-            pace_hint = determine_pace_hint(word_count)
-
-            # Build and send fusion prompt
-            fusion_prompt = build_fusion_prompt(
-                user_text=user_text,
-                emotion=current_emotion,
-                trajectory=trajectory,
-                contradiction=contradiction,
-                playbook=playbook,
-                pace_hint=pace_hint,
-            )
-
-            response = self.chat_session.send_message(fusion_prompt)
-            ai_text = response.text
+            with metrics.span("context"):
+                # The vision thread feeds the trajectory; without a camera or a
+                # face since the last turn, the turn's own label stands in
+                if self.trajectory.samples == self._samples_seen:
+                    self.trajectory.update(current_emotion)
+                self._samples_seen = self.trajectory.samples
+
+                context = {
+                    "emotion": current_emotion,
+                    "trajectory": summarize_trajectory(self.trajectory),
+                    "contradiction": analysis.contradiction,
+                    "playbook": analysis.playbook,
+                    "pace_hint": analysis.pace_hint,
+                }
+
+                # Build fusion prompt
+                fusion_prompt = build_fusion_prompt(user_text=user_text, **context)
+
+                # Delta mode: instructions are in the system prompt, send only changes
+                if self.config.PROMPT_MODE == "delta":
+                    changed = self.prompt_state.changed_fields(
+                        context, self.chat_session.history, self.config.PROMPT_KEYFRAME_TURNS
+                    )
+                    delta_prompt = build_delta_prompt(user_text, changed)
+                    self.prompt_state.mark_sent(delta_prompt, changed)
+                    saved = estimate_tokens(fusion_prompt) - estimate_tokens(delta_prompt)
+                    self.prompt_tokens_saved += saved
+                    metrics.inc("feelio_prompt_tokens_saved_total", saved)
+                    fusion_prompt = delta_prompt
+                metrics.inc("feelio_prompt_tokens_total", estimate_tokens(fusion_prompt))
+
+            # Pick the model tier; both tiers share this chat history
+            route = router.route(analysis, self.trajectory, len(self.chat_session.history) // 2)
+            prompt_tokens = history_tokens(self.chat_session.history) + estimate_tokens(fusion_prompt)
+            start = time.perf_counter()
+            try:
+                with metrics.span("llm"):
+                    ai_text = self.chat_session.send_message(fusion_prompt, route.model_name)
+            except Exception:
+                router.record(route, time.perf_counter() - start, prompt_tokens, 0, ok=False)
+                metrics.inc("feelio_llm_errors_total")
+                raise
+            router.record(route, time.perf_counter() - start, prompt_tokens, estimate_tokens(ai_text))
+
+            if self.compactor:
+                with metrics.span("compaction"):
+                    emotions = self.trajectory.recent_labels()
+                    compacted = self.compactor.maybe_compact(self.chat_session.history, emotions)
+                if compacted is not None:
+                    self.chat_session.history = compacted
+                    self.prompt_state.reset()
 
             logger.info(f"🤖 Response generated ({len(ai_text)} chars)")
             return ai_text
 
         except Exception as e:
             logger.error(f"❌ Response generation error: {e}", exc_info=True)
+            metrics.inc("feelio_fallbacks_total", reason="llm_error")
             return "I'm having a little trouble connecting to my thoughts right now. Try again?"
 
     def _cleanup(self) -> None:
@@ -245,6 +248,7 @@ class FeelioTherapist:
         
         # STOP VISION
         self.vision.stop()
+        logger.info(f"👁️ Vision: {self.vision.stats()}")
 
         # Generate and display session summary
         if len(self.session_log) > 0:
@@ -253,7 +257,7 @@ class FeelioTherapist:
                 recent_turns = self.session_log.get_recent_turns()
 
                 summary_prompt = build_summary_prompt(emotion_timeline, recent_turns)
-                summary = self.model.generate_content(summary_prompt).text
+                summary = llm.generate(summary_prompt, model_name=self.config.MODEL_NAME)
 
                 print("\n" + "=" * 60)
                 print("📋 SESSION SUMMARY")
@@ -262,6 +266,11 @@ class FeelioTherapist:
                 print("=" * 60 + "\n")
 
                 logger.info(f"Session ended. Total turns: {len(self.session_log)}")
+                logger.info(f"⏱️ Stage timings: {metrics.stage_summary()}")
+                if self.config.PROMPT_MODE == "delta":
+                    logger.info(f"✂️ Delta prompts saved ~{self.prompt_tokens_saved} tokens")
+                if router.enabled:
+                    logger.info(f"🔀 Model tiers: {router.stats()}")
 
                 if self.config.LOG_SESSIONS:
                     self._save_session()
@@ -278,7 +287,7 @@ class FeelioTherapist:
             import os
 
             os.makedirs(self.config.SESSION_LOGS_PATH, exist_ok=True)
-            timestamp = int(__import__("time").time())
+            timestamp = int(time.time())
             filename = os.path.join(
                 self.config.SESSION_LOGS_PATH,
                 f"session_{timestamp}.json"
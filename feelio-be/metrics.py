@@ -0,0 +1,259 @@
+"""
+In-process latency and counter metrics for Feelio.
+Hot-path stages of a chat turn are timed with cheap spans and aggregated
+into fixed-bucket histograms, exposed in Prometheus text format at
+/metrics. Each process keeps its own registry (one per gunicorn worker).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+
+# Seconds; chat stages span sub-millisecond rule checks to multi-second LLM calls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram for one label set."""
+
+    __slots__ = ("buckets", "counts", "total", "count", "_lock")
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += value
+            self.count += 1
+
+
+class Span:
+    """Context manager timing one stage into the stage histogram."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    """Shared no-op span used when metrics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Registry:
+    """Named histograms, counters and callback gauges with Prometheus output."""
+
+    def __init__(self, enabled: bool = True):
+        """
+        Initialize the registry.
+
+        Args:
+            enabled: When False, spans and counters are no-ops.
+        """
+        self.enabled = enabled
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._stages: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """Register HELP/TYPE metadata for a metric family."""
+        self._help[name] = (kind, help_text)
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        """Return (creating once) the histogram for a name and label set."""
+        key = tuple(sorted(labels.items()))
+        family = self._histograms.get(name)
+        hist = family.get(key) if family is not None else None
+        if hist is None:
+            with self._lock:
+                family = self._histograms.setdefault(name, {})
+                hist = family.setdefault(key, Histogram())
+        return hist
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one observation in seconds."""
+        if self.enabled:
+            self.histogram(name, **labels).observe(value)
+
+    def timer(self, name: str, **labels: str):
+        """Time a block into the named histogram."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self.histogram(name, **labels))
+
+    def span(self, stage: str):
+        """Time one chat stage: `with registry.span("llm"): ...`."""
+        if not self.enabled:
+            return NULL_SPAN
+        # Hot path: skip the label-key build after the first call per stage
+        hist = self._stages.get(stage)
+        if hist is None:
+            hist = self._stages[stage] = self.histogram("feelio_stage_seconds", stage=stage)
+        return Span(hist)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Increment a counter."""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + amount
+
+    def counter_total(self, name: str) -> float:
+        """Sum of a counter over all of its label sets (for logs and benchmarks)."""
+        with self._lock:
+            return sum(self._counters.get(name, {}).values())
+
+    def gauge(self, name: str, fn: Callable[[], float]) -> None:
+        """Register a gauge whose value is read from fn at scrape time."""
+        self._gauges[name] = fn
+
+    def stage_summary(self, name: str = "feelio_stage_seconds") -> Dict[str, Dict[str, float]]:
+        """
+        Return count and mean milliseconds per stage (for logs and the CLI).
+
+        Returns:
+            dict: {stage: {"count": n, "mean_ms": avg}}.
+        """
+        summary = {}
+        for key, hist in self._histograms.get(name, {}).items():
+            stage = dict(key).get("stage", "")
+            if hist.count:
+                summary[stage] = {
+                    "count": hist.count,
+                    "mean_ms": round(hist.total / hist.count * 1000, 3),
+                }
+        return summary
+
+    # ----- exposition -----
+
+    def _header(self, lines: List[str], name: str, default_kind: str) -> None:
+        kind, help_text = self._help.get(name, (default_kind, name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+
+        for name, family in sorted(self._histograms.items()):
+            self._header(lines, name, "histogram")
+            for key, hist in sorted(family.items()):
+                with hist._lock:
+                    counts = list(hist.counts)
+                    total, count = hist.total, hist.count
+                cumulative = 0
+                for bound, n in zip(hist.buckets, counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(key, le=_fmt(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {count}")
+                lines.append(f"{name}_sum{_labels(key)} {_fmt(total)}")
+                lines.append(f"{name}_count{_labels(key)} {count}")
+
+        with self._lock:
+            counters = {name: dict(family) for name, family in self._counters.items()}
+        for name, family in sorted(counters.items()):
+            self._header(lines, name, "counter")
+            for key, value in sorted(family.items()):
+                lines.append(f"{name}{_labels(key)} {_fmt(value)}")
+
+        for name, fn in sorted(self._gauges.items()):
+            self._header(lines, name, "gauge")
+            try:
+                lines.append(f"{name} {_fmt(fn())}")
+            except Exception:
+                lines.append(f"{name} NaN")
+
+        return "\n".join(lines) + "\n"
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(key: Labels, le: Optional[str] = None) -> str:
+    pairs = list(key)
+    if le is not None:
+        pairs.append(("le", le))
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry(enabled=Config.METRICS_ENABLED)
+
+registry.describe("feelio_stage_seconds", "histogram", "Time spent in each stage of a chat turn.")
+registry.describe("feelio_request_seconds", "histogram", "Handler latency by endpoint (streams: until headers are sent).")
+registry.describe("feelio_fallbacks_total", "counter", "Replies replaced by a fallback, by reason.")
+registry.describe("feelio_crises_total", "counter", "Messages routed to the crisis protocol.")
+registry.describe("feelio_llm_errors_total", "counter", "LLM backend calls that raised.")
+registry.describe("feelio_active_sessions", "gauge", "Sessions held in this process.")
+registry.describe("feelio_prompt_tokens_total", "counter", "Estimated turn-prompt tokens sent (excluding history).")
+registry.describe("feelio_prompt_tokens_saved_total", "counter", "Estimated turn-prompt tokens saved by delta prompts.")
+registry.describe("feelio_llm_deadlines_total", "counter", "LLM calls abandoned at their deadline, by model.")
+registry.describe("feelio_llm_hedges_total", "counter", "Hedged second attempts started, by model.")
+registry.describe("feelio_llm_hedge_wins_total", "counter", "Hedged attempts that answered first, by model.")
+registry.describe("feelio_llm_short_circuits_total", "counter", "LLM calls rejected by an open circuit breaker, by model.")
+registry.describe("feelio_breaker_trips_total", "counter", "Circuit breaker openings, by model.")
+registry.describe("feelio_breakers_open", "gauge", "Model circuit breakers currently open or half-open.")
+registry.describe("feelio_admission_wait_seconds", "histogram", "Time admitted turns waited for an LLM slot.")
+registry.describe("feelio_admission_rejections_total", "counter", "Turns rejected with 429 by admission control, by reason.")
+registry.describe("feelio_admission_queue_depth", "gauge", "Turns waiting for an LLM slot.")
+registry.describe("feelio_admission_in_flight", "gauge", "Turns holding an LLM slot.")
+registry.describe("feelio_session_wait_seconds", "histogram", "Time turns queued behind an earlier turn of the same session.")
+registry.describe("feelio_sessions_busy", "gauge", "Sessions with a turn running in this process.")
+registry.describe("feelio_idempotent_replays_total", "counter", "Retried requests answered from the idempotency cache.")
+registry.describe("feelio_session_summaries_total", "counter", "Background session summaries generated, by result.")
+registry.describe("feelio_tier_seconds", "histogram", "LLM call latency by model tier.")
+registry.describe("feelio_tier_turns_total", "counter", "Turns sent to each model tier, by routing reason.")
+registry.describe("feelio_tier_tokens_total", "counter", "Estimated tokens per model tier (prompt includes history).")
+
+# Export unlabeled counters from the first scrape, not the first event
+registry.inc("feelio_crises_total", 0)
+registry.inc("feelio_llm_errors_total", 0)
+registry.inc("feelio_prompt_tokens_total", 0)
+registry.inc("feelio_prompt_tokens_saved_total", 0)
+registry.inc("feelio_idempotent_replays_total", 0)
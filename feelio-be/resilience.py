@@ -0,0 +1,362 @@
+"""
+Resilience layer around LLM backend calls.
+Every call gets a deadline, non-streaming calls can be hedged with a second
+attempt once the first is slower than a threshold, and a per-model circuit
+breaker fails calls immediately while upstream keeps erroring. Handlers
+already answer failed calls with fallback text, so a degraded upstream
+costs a bounded wait instead of a worker held until gunicorn kills it.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+History = List[Tuple[str, str]]
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class DeadlineExceeded(TimeoutError):
+    """An LLM call did not finish before its deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The model's circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one model.
+
+    Closed: calls pass. After `failure_threshold` failures in a row it
+    opens and rejects calls for `reset_seconds`, then lets one probe call
+    through (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Model name (metric label).
+            failure_threshold: Consecutive failures that open the breaker.
+            reset_seconds: How long it stays open before a probe.
+            clock: Monotonic time source.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+
+    def allow(self) -> bool:
+        """Return True if a call may go upstream now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = self._clock()
+            if self.state == OPEN and now - self._opened_at < self.reset_seconds:
+                return False
+            # One probe at a time; a probe that never reported is retried
+            if self.state == HALF_OPEN and now - self._probe_at < self.reset_seconds:
+                return False
+            self.state = HALF_OPEN
+            self._probe_at = now
+            return True
+
+    def record_success(self) -> None:
+        """Report a call that completed."""
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"✅ Circuit closed for {self.name}")
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Report a call that raised or ran out of time."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = self._clock()
+                self.trips += 1
+                metrics.inc("feelio_breaker_trips_total", model=self.name)
+                logger.warning(f"⚡ Circuit opened for {self.name} after {self.failures} failures")
+
+
+class ResilientBackend:
+    """
+    Wraps an LLM backend with deadlines, hedging and circuit breakers.
+
+    Synchronous calls run on a shared thread pool so the caller can stop
+    waiting at the deadline; a call that is given up on finishes in the
+    background and its result is dropped. Streams are never hedged (chunks
+    already sent cannot be merged with a second attempt) but the whole
+    stream shares one deadline.
+    """
+
+    def __init__(
+        self,
+        inner: Any,
+        deadline: float = 20.0,
+        hedge_after: float = 0.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        max_workers: int = 64,
+    ):
+        """
+        Initialize the wrapper.
+
+        Args:
+            inner: The backend doing the work (Gemini or stub).
+            deadline: Seconds a call may take, end to end.
+            hedge_after: Start a second attempt after this many seconds (0 = never).
+            failure_threshold: Consecutive failures that open a model's breaker.
+            reset_seconds: How long a breaker stays open before probing.
+            max_workers: Threads for synchronous calls (including hedges).
+        """
+        self.inner = inner
+        self.name = inner.name
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        metrics.gauge(
+            "feelio_breakers_open",
+            lambda: sum(1 for b in list(self._breakers.values()) if b.state != CLOSED),
+        )
+
+    def breaker(self, model_name: Optional[str] = None) -> CircuitBreaker:
+        """Return (creating once) the breaker for a model."""
+        model_name = model_name or Config.MODEL_NAME
+        breaker = self._breakers.get(model_name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    model_name, CircuitBreaker(model_name, self.failure_threshold, self.reset_seconds)
+                )
+        return breaker
+
+    def _admit(self, model_name: Optional[str]) -> CircuitBreaker:
+        breaker = self.breaker(model_name)
+        if not breaker.allow():
+            metrics.inc("feelio_llm_short_circuits_total", model=breaker.name)
+            raise CircuitOpenError(f"Circuit open for {breaker.name}")
+        return breaker
+
+    def _expired(self, breaker: CircuitBreaker) -> DeadlineExceeded:
+        metrics.inc("feelio_llm_deadlines_total", model=breaker.name)
+        return DeadlineExceeded(f"{breaker.name} call exceeded {self.deadline:g}s deadline")
+
+    def prepare(self, model_name: Optional[str] = None) -> None:
+        self.inner.prepare(model_name)
+
+    # ========== SYNC ==========
+
+    def _race(self, call: Callable[[], str], breaker: CircuitBreaker) -> str:
+        """Run call (plus a hedge if it is slow) and return the first success."""
+        start = time.monotonic()
+        deadline = start + self.deadline
+        hedge_at = start + self.hedge_after if self.hedge_after > 0 else None
+        hedge: Optional[Future] = None
+        pending = {self._pool.submit(call)}
+        error: Optional[BaseException] = None
+
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if hedge_at is not None and hedge is None:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            metrics.inc("feelio_llm_hedge_wins_total", model=breaker.name)
+                        return future.result()
+                    error = future.exception()
+                if hedge_at is not None and hedge is None and pending and time.monotonic() >= hedge_at:
+                    hedge = self._pool.submit(call)
+                    pending.add(hedge)
+                    metrics.inc("feelio_llm_hedges_total", model=breaker.name)
+
+            if not pending and error is not None:
+                raise error
+            raise self._expired(breaker)
+        finally:
+            # Queued attempts never start; one already running cannot be interrupted
+            for future in pending:
+                future.cancel()
+
+    def generate(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        breaker = self._admit(model_name)
+        # Snapshot: an abandoned attempt may still be reading it after we return
+        history = list(history)
+        try:
+            reply = self._race(lambda: self.inner.generate(history, prompt, model_name), breaker)
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return reply
+
+    def generate_stream(self, history: History, prompt: str, model_name: Optional[str] = None) -> Iterator[str]:
+        breaker = self._admit(model_name)
+        deadline = time.monotonic() + self.deadline
+        history = list(history)
+        chunks: "queue.Queue[Any]" = queue.Queue()
+        stop = threading.Event()
+        end = object()
+
+        def pump() -> None:
+            if stop.is_set():
+                return  # the caller gave up while this waited for a pool thread
+            try:
+                for text in self.inner.generate_stream(history, prompt, model_name):
+                    if stop.is_set():
+                        return
+                    chunks.put(text)
+                chunks.put(end)
+            except Exception as e:
+                chunks.put(e)
+
+        self._pool.submit(pump)
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise self._expired(breaker) from None
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        except Exception:
+            breaker.record_failure()
+            raise
+        finally:
+            stop.set()
+        breaker.record_success()
+
+    # ========== ASYNC ==========
+
+    async def _race_async(self, call: Callable[[], Awaitable[str]], breaker: CircuitBreaker) -> str:
+        """Async variant of _race; losing attempts are cancelled."""
+        start = time.monotonic()
+        deadline = start + self.deadline
+        hedge_at = start + self.hedge_after if self.hedge_after > 0 else None
+        hedge: Optional[asyncio.Future] = None
+        pending = {asyncio.ensure_future(call())}
+        error: Optional[BaseException] = None
+
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if hedge_at is not None and hedge is None:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.inc("feelio_llm_hedge_wins_total", model=breaker.name)
+                        return task.result()
+                    error = task.exception()
+                if hedge_at is not None and hedge is None and pending and time.monotonic() >= hedge_at:
+                    hedge = asyncio.ensure_future(call())
+                    pending.add(hedge)
+                    metrics.inc("feelio_llm_hedges_total", model=breaker.name)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if not pending and error is not None:
+            raise error
+        raise self._expired(breaker)
+
+    async def generate_async(self, history: History, prompt: str, model_name: Optional[str] = None) -> str:
+        breaker = self._admit(model_name)
+        try:
+            reply = await self._race_async(lambda: self.inner.generate_async(history, prompt, model_name), breaker)
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return reply
+
+    async def generate_stream_async(
+        self, history: History, prompt: str, model_name: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        breaker = self._admit(model_name)
+        deadline = time.monotonic() + self.deadline
+        stream = self.inner.generate_stream_async(history, prompt, model_name)
+        try:
+            while True:
+                try:
+                    text = await asyncio.wait_for(stream.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise self._expired(breaker) from None
+                yield text
+        except Exception:
+            breaker.record_failure()
+            raise
+        finally:
+            await stream.aclose()
+        breaker.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        """Deadline/hedge settings and each model's breaker state."""
+        return {
+            "deadline_s": self.deadline,
+            "hedge_after_s": self.hedge_after,
+            "breakers": {
+                name: {"state": b.state, "failures": b.failures, "trips": b.trips}
+                for name, b in list(self._breakers.items())
+            },
+        }
+
+
+def wrap_backend(inner: Any) -> Any:
+    """Wrap a backend with the resilience settings from Config (or return it as is)."""
+    if not Config.LLM_RESILIENCE:
+        return inner
+    return ResilientBackend(
+        inner,
+        deadline=Config.LLM_DEADLINE_SECONDS,
+        hedge_after=Config.LLM_HEDGE_AFTER_SECONDS,
+        failure_threshold=Config.BREAKER_FAILURE_THRESHOLD,
+        reset_seconds=Config.BREAKER_RESET_SECONDS,
+        max_workers=Config.LLM_CALL_THREADS,
+    )
@@ -0,0 +1,131 @@
+"""
+Incremental BM25 index over a session's turns.
+Lets long or returning sessions send the model only the few earlier
+exchanges relevant to the current message instead of the full transcript.
+Turns are indexed as they are logged; nothing is rebuilt per request.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_WORD = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a about am an and are as at be been but by can could did do does doing for from
+had has have he her him his how i i'm if in into is it its just me more my no
+not of on or our out she so some than that the their them then there they this
+to too up us very was we were what when where which who why will with would you
+your yours im ive dont really feel feeling like
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed."""
+    return [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+class TurnIndex:
+    """
+    BM25 inverted index with O(len(text)) incremental inserts.
+
+    Query cost depends on the postings of the query terms only. Terms that
+    occur in more than `max_df` of all turns carry almost no signal and are
+    skipped, which keeps lookups sub-millisecond for thousands of turns.
+    """
+
+    __slots__ = ("k1", "b", "max_df", "postings", "doc_len", "total_len")
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_df: float = 0.25):
+        """
+        Initialize the index.
+
+        Args:
+            k1: BM25 term-frequency saturation.
+            b: BM25 length normalization.
+            max_df: Skip query terms present in more than this fraction of turns.
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_len: Dict[int, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, doc_id: int, text: str) -> None:
+        """
+        Index one turn.
+
+        Args:
+            doc_id: Turn number (unique per session).
+            text: Text to index (user message plus reply).
+        """
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(terms.values())
+        self.doc_len[doc_id] = length
+        self.total_len += length
+
+    def remove(self, doc_id: int, text: str) -> None:
+        """
+        Drop a turn from the index (e.g. when it is evicted from the session).
+
+        Args:
+            doc_id: Turn number passed to add.
+            text: The same text that was indexed.
+        """
+        length = self.doc_len.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_len -= length
+        for term in set(tokenize(text)):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int = 3, exclude_from: int = -1) -> List[Tuple[int, float]]:
+        """
+        Return the top-k turns relevant to the query.
+
+        Args:
+            query: The current user message.
+            k: Number of turns to return.
+            exclude_from: Ignore turns with doc_id >= this (e.g. turns already
+                sent verbatim). Negative disables.
+
+        Returns:
+            List of (doc_id, score), best first.
+        """
+        n = len(self.doc_len)
+        # No indexed terms (e.g. only stopwords so far): nothing can match
+        if not n or k <= 0 or not self.total_len:
+            return []
+
+        avg_len = self.total_len / n
+        df_cap = max(1, int(n * self.max_df))
+        k1_plus = self.k1 + 1
+        base = self.k1 * (1 - self.b)
+        scale = self.k1 * self.b / avg_len
+        doc_len = self.doc_len
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs or (len(docs) > df_cap and n > 20):
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if 0 <= exclude_from <= doc_id:
+                    continue
+                norm = tf * k1_plus / (tf + base + scale * doc_len[doc_id])
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
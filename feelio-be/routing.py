@@ -0,0 +1,183 @@
+"""
+Per-turn model routing for Feelio.
+Short, steady turns go to a fast model tier and everything else to the full
+model. The choice uses features already computed for the turn (word count,
+contradiction flag, trajectory volatility, history length), so routing adds
+no extra pass over the message. Both tiers share one ChatHandle history.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, NamedTuple, Tuple
+
+from config import Config
+from emotion_trajectory import EmotionTrajectory
+from metrics import registry as metrics
+from turn_analysis import NO_CONTRADICTION, TurnAnalysis
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+FULL = "full"
+
+
+class RouteFeatures(NamedTuple):
+    """Turn features the routing policy looks at."""
+
+    word_count: int
+    contradiction: bool
+    volatility: float
+    history_turns: int
+
+
+class Route(NamedTuple):
+    """Where one turn goes and why."""
+
+    tier: str
+    model_name: str
+    reason: str
+
+
+class RoutingPolicy:
+    """Thresholds a turn must stay within to use the fast tier."""
+
+    def __init__(self, fast_max_words: int = 8, fast_max_volatility: float = 0.5, fast_max_history_turns: int = 20):
+        """
+        Initialize the policy.
+
+        Args:
+            fast_max_words: Longest message the fast tier handles.
+            fast_max_volatility: Most recent emotion churn (0-1) for the fast tier.
+            fast_max_history_turns: Longest chat history the fast tier handles.
+        """
+        self.fast_max_words = fast_max_words
+        self.fast_max_volatility = fast_max_volatility
+        self.fast_max_history_turns = fast_max_history_turns
+
+    def choose(self, features: RouteFeatures) -> Tuple[str, str]:
+        """
+        Pick a tier for one turn.
+
+        Args:
+            features: The turn's RouteFeatures.
+
+        Returns:
+            Tuple of (tier, reason).
+        """
+        if features.contradiction:
+            return FULL, "contradiction"
+        if features.word_count > self.fast_max_words:
+            return FULL, "long message"
+        if features.volatility > self.fast_max_volatility:
+            return FULL, "volatile emotion"
+        if features.history_turns > self.fast_max_history_turns:
+            return FULL, "long history"
+        return FAST, "simple turn"
+
+
+class ModelRouter:
+    """Routes turns to model tiers and keeps per-tier latency and token stats."""
+
+    def __init__(self, policy: RoutingPolicy, models: Dict[str, str], enabled: bool = True):
+        """
+        Initialize the router.
+
+        Args:
+            policy: The RoutingPolicy to apply.
+            models: Model name per tier ("fast" and "full").
+            enabled: When False every turn goes to the full tier.
+        """
+        self.policy = policy
+        self.models = models
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self.reset_stats()
+
+    def route(self, analysis: TurnAnalysis, trajectory: EmotionTrajectory, history_turns: int) -> Route:
+        """
+        Choose the model for one turn.
+
+        Args:
+            analysis: The message's TurnAnalysis.
+            trajectory: The session's emotion trajectory.
+            history_turns: Exchanges currently in the chat history.
+
+        Returns:
+            Route: Tier, model name and reason.
+        """
+        if not self.enabled:
+            return Route(FULL, self.models[FULL], "routing off")
+
+        features = RouteFeatures(
+            word_count=analysis.word_count,
+            contradiction=analysis.contradiction != NO_CONTRADICTION,
+            volatility=trajectory.volatility(),
+            history_turns=history_turns,
+        )
+        tier, reason = self.policy.choose(features)
+        logger.debug(f"🔀 Routed to {tier} ({reason})")
+        return Route(tier, self.models[tier], reason)
+
+    def record(self, route: Route, seconds: float, prompt_tokens: int, reply_tokens: int, ok: bool = True) -> None:
+        """
+        Record one completed LLM call.
+
+        Args:
+            route: The route the call took.
+            seconds: Call latency (full reply).
+            prompt_tokens: Estimated input tokens (history + prompt).
+            reply_tokens: Estimated reply tokens.
+            ok: False if the call raised.
+        """
+        with self._lock:
+            stats = self._stats[route.tier]
+            stats["turns"] += 1
+            stats["seconds"] += seconds
+            stats["prompt_tokens"] += prompt_tokens
+            stats["reply_tokens"] += reply_tokens
+            if not ok:
+                stats["errors"] += 1
+
+        metrics.observe("feelio_tier_seconds", seconds, tier=route.tier)
+        metrics.inc("feelio_tier_turns_total", tier=route.tier, reason=route.reason)
+        metrics.inc("feelio_tier_tokens_total", prompt_tokens, tier=route.tier, kind="prompt")
+        metrics.inc("feelio_tier_tokens_total", reply_tokens, tier=route.tier, kind="reply")
+
+    def reset_stats(self) -> None:
+        """Zero the per-tier stats (exported metrics keep counting)."""
+        with self._lock:
+            self._stats = {
+                tier: {"turns": 0, "errors": 0, "seconds": 0.0, "prompt_tokens": 0, "reply_tokens": 0}
+                for tier in self.models
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-tier turns, errors, mean latency and token totals."""
+        with self._lock:
+            return {
+                tier: {
+                    "model": self.models[tier],
+                    "turns": int(s["turns"]),
+                    "errors": int(s["errors"]),
+                    "avg_latency_ms": round(s["seconds"] / s["turns"] * 1000, 1) if s["turns"] else 0.0,
+                    "prompt_tokens": int(s["prompt_tokens"]),
+                    "reply_tokens": int(s["reply_tokens"]),
+                }
+                for tier, s in self._stats.items()
+            }
+
+
+def build_router() -> ModelRouter:
+    """Build the router from Config."""
+    policy = RoutingPolicy(
+        fast_max_words=Config.ROUTE_FAST_MAX_WORDS,
+        fast_max_volatility=Config.ROUTE_FAST_MAX_VOLATILITY,
+        fast_max_history_turns=Config.ROUTE_FAST_MAX_HISTORY_TURNS,
+    )
+    models = {FAST: Config.FAST_MODEL_NAME, FULL: Config.MODEL_NAME}
+    return ModelRouter(policy, models, enabled=Config.MODEL_ROUTING)
+
+
+# Shared by the API and the CLI
+router = build_router()
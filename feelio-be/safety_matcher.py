@@ -0,0 +1,313 @@
+"""
+Compiled single-pass matcher for the self-harm safety net.
+Phrases are loaded from a plain-text lexicon and compiled once into an
+Aho-Corasick automaton over normalized words, so a message is scanned in
+time linear in its length however many phrases (or languages) the lexicon
+holds. Normalization folds case, accents, punctuation, extra whitespace,
+spaced-out letters and common character substitutions ("k1ll", "$elf").
+"""
+
+import logging
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PHRASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "safety_phrases.txt")
+
+# Look-alike characters folded before matching
+SUBSTITUTIONS = {
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t",
+}
+
+# Digits and $/@ read as letters next to a letter ("k1ll", "di3", "$elf");
+# !, | and + only before one, so trailing "!!" stays punctuation
+_LOOKALIKE_RUN = re.compile(r"[0134578$@!|+]+")
+_WEAK_LOOKALIKES = frozenset("!|+")
+
+# Runs of 3+ single characters ("s u i c i d e") are rejoined into a word
+_SPELLED_OUT = re.compile(r"(?<!\S)(?:\S ){2,}\S(?!\S)")
+
+# ASCII fast path: every other non-alphanumeric -> space
+_ASCII_TABLE = str.maketrans({chr(i): (chr(i) if chr(i).isalnum() else " ") for i in range(128)})
+
+_REPEATS = re.compile(r"(.)\1\1+")
+_LATIN_LIMIT = 0x250  # combining marks after Latin bases are accents; keep others
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize text for phrase matching.
+
+    Lowercases, strips accents from Latin letters, folds look-alike
+    characters, turns punctuation into spaces, collapses 3+ repeated
+    characters to two, and rejoins spaced-out letters ("s u i c i d e").
+
+    Args:
+        text: Raw user text (any script).
+
+    Returns:
+        str: Space-separated tokens.
+    """
+    text = _LOOKALIKE_RUN.sub(_fold_lookalikes, text.lower())
+    if text.isascii():
+        text = text.translate(_ASCII_TABLE)
+    else:
+        text = _normalize_unicode(text)
+
+    text = " ".join(_REPEATS.sub(r"\1\1", text).split())
+    return _SPELLED_OUT.sub(_join_spelled_out, text)
+
+
+def _fold_lookalikes(match: "re.Match") -> str:
+    text, start, end = match.string, match.start(), match.end()
+    after = end < len(text) and text[end].isalpha()
+    if after:
+        return "".join(SUBSTITUTIONS[ch] for ch in match.group())
+    if start > 0 and text[start - 1].isalpha():
+        return "".join(ch if ch in _WEAK_LOOKALIKES else SUBSTITUTIONS[ch] for ch in match.group())
+    return match.group()
+
+
+def _normalize_unicode(text: str) -> str:
+    out = []
+    base = 0
+    for ch in unicodedata.normalize("NFKD", text):
+        if unicodedata.combining(ch) or unicodedata.category(ch).startswith("M"):
+            # Drop accents on Latin letters; keep vowel signs in other scripts
+            if base >= _LATIN_LIMIT:
+                out.append(ch)
+            continue
+        base = ord(ch)
+        if ch.isalnum():
+            out.append(ch)
+        else:
+            out.append(" ")
+    return "".join(out)
+
+
+def _join_spelled_out(match: "re.Match") -> str:
+    return match.group().replace(" ", "")
+
+
+def load_phrases(path: str) -> List[str]:
+    """
+    Read a phrase lexicon: one phrase per line, `#` starts a comment.
+
+    A trailing `*` makes the last word a prefix ("suicid*" also matches
+    "suicidal").
+
+    Args:
+        path: Lexicon file path (UTF-8).
+
+    Returns:
+        List of phrases in file order, duplicates removed.
+    """
+    phrases: List[str] = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            phrase = line.split("#", 1)[0].strip()
+            if phrase and phrase not in seen:
+                seen.add(phrase)
+                phrases.append(phrase)
+    return phrases
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over the words of normalized phrases.
+
+    Transitions are whole normalized words, so phrases only match on word
+    boundaries and a scan takes one step per word of the message. A phrase
+    ending in `*` matches when the current word starts with its last word;
+    those prefixes are looked up by length, so each step costs at most the
+    length of the word, whatever the lexicon size.
+    """
+
+    __slots__ = ("phrases", "tags", "_goto", "_fail", "_out", "_prefix")
+
+    GATE_MAX = 32  # prefix tables up to this size are pre-checked with startswith
+
+    def __init__(self, phrases: Iterable[str], tags: Optional[Iterable[Any]] = None):
+        """
+        Compile the automaton.
+
+        Args:
+            phrases: Lexicon entries (raw; normalized here).
+            tags: Optional label per phrase (e.g. its category), available
+                as self.tags[phrase_id]. Defaults to the phrase itself.
+        """
+        self.phrases: List[str] = []
+        self.tags: List[Any] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Tuple[int, ...]] = [()]
+        own_prefixes: Dict[int, Dict[str, Tuple[int, ...]]] = {}
+
+        phrases = list(phrases)
+        tags = list(tags) if tags is not None else phrases
+        for phrase, tag in zip(phrases, tags):
+            is_prefix = phrase.endswith("*")
+            words = normalize(phrase.rstrip("*")).split()
+            if not words:
+                continue
+            phrase_id = len(self.phrases)
+            self.phrases.append(phrase)
+            self.tags.append(tag)
+
+            if is_prefix:
+                state = self._walk(words[:-1])
+                table = own_prefixes.setdefault(state, {})
+                table[words[-1]] = table.get(words[-1], ()) + (phrase_id,)
+            else:
+                state = self._walk(words)
+                self._out[state] += (phrase_id,)
+
+        order = self._build_failure_links()
+        self._prefix = self._merge_prefixes(order, own_prefixes)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def _walk(self, words: List[str]) -> int:
+        state = 0
+        for word in words:
+            nxt = self._goto[state].get(word)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][word] = nxt
+                self._goto.append({})
+                self._out.append(())
+            state = nxt
+        return state
+
+    def _build_failure_links(self) -> List[int]:
+        """Compute failure links; returns states in breadth-first order."""
+        self._fail = fail = [0] * len(self._goto)
+        order = [0]
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            order.append(state)
+            for word, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and word not in self._goto[f]:
+                    f = fail[f]
+                target = self._goto[f].get(word, 0)
+                fail[nxt] = target if target != nxt else 0
+                # Inherit matches that end here via the failure chain
+                self._out[nxt] += self._out[fail[nxt]]
+        return order
+
+    def _merge_prefixes(self, order: List[int], own: Dict[int, Dict[str, Tuple[int, ...]]]) -> list:
+        """
+        Give every state the prefix entries of its whole failure chain.
+
+        Returns:
+            Per state: None, or (gate prefixes or None, distinct prefix
+            lengths, {prefix: ids}).
+        """
+        merged: List[Optional[Dict[str, Tuple[int, ...]]]] = [None] * len(self._goto)
+        for state in order:  # parents (and failure targets) come first
+            inherited = merged[self._fail[state]] if state else None
+            table = own.get(state)
+            if table and inherited:
+                combined = dict(inherited)
+                for prefix, ids in table.items():
+                    combined[prefix] = combined.get(prefix, ()) + ids
+                merged[state] = combined
+            else:
+                merged[state] = table or inherited
+        return [
+            (
+                # Gate only while it stays cheap; large tables rely on the length loop
+                tuple(table) if len(table) <= self.GATE_MAX else None,
+                tuple(sorted({len(p) for p in table})),
+                table,
+            ) if table else None
+            for table in merged
+        ]
+
+    def match_ids(self, normalized: str, first_only: bool = False) -> List[int]:
+        """
+        Scan already-normalized text once.
+
+        Args:
+            normalized: Output of normalize().
+            first_only: Stop at the first hit.
+
+        Returns:
+            Matched phrase ids in order of first occurrence.
+        """
+        goto, fail, out, prefix = self._goto, self._fail, self._out, self._prefix
+        state = 0
+        found: Dict[int, None] = {}
+        for word in normalized.split(" "):
+            entry = prefix[state]
+            # startswith(tuple) is a cheap C-level gate before the lookups
+            if entry is not None and (entry[0] is None or word.startswith(entry[0])):
+                _, lengths, table = entry
+                for k in lengths:
+                    if k > len(word):
+                        break
+                    ids = table.get(word[:k])
+                    if ids:
+                        for phrase_id in ids:
+                            found.setdefault(phrase_id)
+
+            nxt = goto[state].get(word)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(word)
+            state = nxt or 0
+            if out[state]:
+                for phrase_id in out[state]:
+                    found.setdefault(phrase_id)
+            if first_only and found:
+                break
+        return list(found)
+
+    def match(self, text: str) -> List[str]:
+        """
+        Return lexicon phrases found in text, in order of first occurrence.
+
+        Args:
+            text: Raw user text.
+
+        Returns:
+            List of matched phrases as written in the lexicon.
+        """
+        return [self.phrases[i] for i in self.match_ids(normalize(text))]
+
+    def search(self, text: str) -> bool:
+        """Return True as soon as any phrase matches."""
+        return bool(self.match_ids(normalize(text), first_only=True))
+
+
+def build_matcher(path: Optional[str] = None) -> PhraseMatcher:
+    """
+    Compile the safety lexicon from a phrase file.
+
+    Args:
+        path: Lexicon path (defaults to Config.SAFETY_PHRASES_PATH, then the
+            bundled safety_phrases.txt).
+
+    Returns:
+        PhraseMatcher: The compiled matcher.
+    """
+    path = path or Config.SAFETY_PHRASES_PATH or DEFAULT_PHRASES_PATH
+    matcher = PhraseMatcher(load_phrases(path))
+    logger.info(f"✅ Safety matcher compiled: {len(matcher)} phrases from {os.path.basename(path)}")
+    return matcher
+
+
+# Built once at import; shared by the API and the CLI
+safety_matcher = build_matcher()
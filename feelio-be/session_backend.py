@@ -0,0 +1,176 @@
+"""
+Persistent session backends for the Feelio API.
+Lets several gunicorn workers (or several nodes) share chat state. Every
+backend speaks the same small Redis-style key/value interface
+(get / set with expiry / delete), so a real Redis client, the SQLite file
+backend, or the in-process stand-in can be swapped via Config.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SessionBackend:
+    """Redis-compatible key/value interface used by SessionStore."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value for key, or None if missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        """Store value under key, expiring after ex seconds if given."""
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> None:
+        """Remove keys (missing keys are ignored)."""
+        raise NotImplementedError
+
+
+class MemoryBackend(SessionBackend):
+    """In-process stand-in with Redis semantics (single worker, dev, benchmarks)."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class SQLiteBackend(SessionBackend):
+    """File-backed store shared by all workers on one host."""
+
+    PURGE_EVERY = 100  # writes between expired-row sweeps
+
+    def __init__(self, path: str):
+        """
+        Initialize the SQLite backend.
+
+        Args:
+            path: Database file path (created if missing).
+        """
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(value), time.time() + ex if ex else None),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+        conn.commit()
+
+    def delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        conn = self._conn()
+        conn.executemany("DELETE FROM kv WHERE key = ?", [(k,) for k in keys])
+        conn.commit()
+
+
+class RedisBackend(SessionBackend):
+    """Thin adapter over a redis-py compatible client (shared across nodes)."""
+
+    def __init__(self, client=None, url: Optional[str] = None):
+        """
+        Initialize the Redis backend.
+
+        Args:
+            client: Any object with redis-py style get/set/delete.
+            url: Redis URL used to build a client when none is given.
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("SESSION_BACKEND=redis requires the 'redis' package") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        self.client.set(key, value, ex=ex)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_backend(kind: str, db_path: str = "", redis_url: str = "") -> Optional[SessionBackend]:
+    """
+    Build the configured session backend.
+
+    Args:
+        kind: "" (per-process only), "local", "sqlite" or "redis".
+        db_path: SQLite database path.
+        redis_url: Redis connection URL.
+
+    Returns:
+        The backend, or None when sessions are kept per process only.
+    """
+    kind = (kind or "").lower()
+    if not kind or kind == "none":
+        return None
+    if kind == "local":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(db_path)
+    if kind == "redis":
+        return RedisBackend(url=redis_url)
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
@@ -0,0 +1,333 @@
+"""
+Bounded in-memory session store for the Feelio API.
+Keeps sessions in LRU order, expires idle ones, and caps total memory so
+abandoned browser tabs cannot grow the process until it is OOM-killed.
+With a persistent backend attached, the in-memory map becomes a cache in
+front of shared state that any worker can rehydrate.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from session_backend import SessionBackend
+
+logger = logging.getLogger(__name__)
+
+# Rough per-object costs used by estimate_session_bytes (CPython, 64-bit)
+SESSION_BASE_BYTES = 16 * 1024      # ChatSession, model handle, dicts
+EMOTION_ENTRY_BYTES = 200           # trajectory bucket or recent label
+TURN_OVERHEAD_BYTES = 400           # turn dict + history Content objects
+PROMPT_OVERHEAD_BYTES = 700         # fusion prompt kept in chat history
+
+
+def estimate_session_bytes(session: Dict[str, Any]) -> int:
+    """
+    Estimate the resident size of a session in O(1).
+
+    Uses the running `text_bytes` counter maintained when turns are logged
+    instead of walking the history.
+
+    Args:
+        session: A session dict.
+
+    Returns:
+        int: Approximate bytes held by the session.
+    """
+    turns = len(session.get("turns", ()))
+    return (
+        SESSION_BASE_BYTES
+        + len(session.get("trajectory", ())) * EMOTION_ENTRY_BYTES
+        + turns * (TURN_OVERHEAD_BYTES + PROMPT_OVERHEAD_BYTES)
+        # Text lives twice: once in the turn log, once in the chat history
+        + 2 * session.get("text_bytes", 0)
+    )
+
+
+class SessionStore:
+    """Thread-safe LRU session store with idle-TTL expiry and a memory cap."""
+
+    KEY_PREFIX = "feelio:session:"
+
+    def __init__(
+        self,
+        factory: Callable[[], Dict[str, Any]],
+        max_sessions: int = 1000,
+        idle_ttl: float = 1800.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        reap_interval: float = 60.0,
+        backend: Optional[SessionBackend] = None,
+        encode: Optional[Callable[[Dict[str, Any]], bytes]] = None,
+        decode: Optional[Callable[[bytes], Dict[str, Any]]] = None,
+        persist_ttl: int = 86400,
+    ):
+        """
+        Initialize the session store.
+
+        Args:
+            factory: Callable returning a fresh session dict.
+            max_sessions: Maximum sessions kept; least recently used are evicted.
+            idle_ttl: Seconds of inactivity after which a session expires (0 disables).
+            max_bytes: Cap on estimated bytes across all sessions (0 disables).
+            reap_interval: Seconds between background reaper passes.
+            backend: Optional shared backend; local sessions then act as a cache.
+            encode: Serializer for a session dict (required with a backend).
+            decode: Deserializer rebuilding a session dict (required with a backend).
+            persist_ttl: Seconds a persisted session survives without writes.
+        """
+        if backend is not None and (encode is None or decode is None):
+            raise ValueError("A session backend requires encode and decode callables")
+
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.reap_interval = reap_interval
+        self.backend = backend
+        self.encode = encode
+        self.decode = decode
+        self.persist_ttl = persist_ttl
+
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+        self.evictions = 0
+        self.expirations = 0
+        self.rehydrations = 0
+
+    # ----- mapping interface -----
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id in self._sessions and self.backend is None:
+                return True
+        if self.backend is not None:
+            return self.backend.get(self._rev_key(session_id)) is not None
+        return False
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return a session and mark it most recently used, or None."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self.backend is None:
+                self._touch(session_id)
+                return session
+
+        if self.backend is None:
+            return None
+
+        # Backend I/O happens outside the lock so other sessions are not blocked
+        fresh = self._load(session_id, session)
+
+        with self._lock:
+            if fresh is None:
+                # Ended or expired on another worker
+                self._sessions.pop(session_id, None)
+                self._last_access.pop(session_id, None)
+                return None
+            if fresh is session and session_id in self._sessions:
+                self._touch(session_id)
+            else:
+                self._insert(session_id, fresh)
+            return fresh
+
+    def get_or_create(self, session_id: str) -> Dict[str, Any]:
+        """Return an existing session or create one, evicting as needed."""
+        session = self.get(session_id)
+        if session is not None:
+            return session
+
+        with self._lock:
+            # Another thread may have created it while we were loading
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._touch(session_id)
+                return session
+
+            session = self.factory()
+            self._insert(session_id, session)
+
+        self.save(session)
+        return session
+
+    def discard(self, session_id: str) -> bool:
+        """
+        Remove a session locally and from the backend.
+
+        Returns:
+            bool: True if the session existed.
+        """
+        with self._lock:
+            self._last_access.pop(session_id, None)
+            existed = self._sessions.pop(session_id, None) is not None
+
+        if self.backend is not None:
+            existed = existed or self.backend.get(self._rev_key(session_id)) is not None
+            self.backend.delete(self._key(session_id), self._rev_key(session_id))
+        return existed
+
+    # ----- persistence -----
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.KEY_PREFIX}{session_id}"
+
+    def _rev_key(self, session_id: str) -> str:
+        return f"{self.KEY_PREFIX}{session_id}:rev"
+
+    def _load(self, session_id: str, local: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Return the freshest copy of a session from the backend.
+
+        Only the small revision key is read when the local copy is current;
+        the full blob is fetched and decoded lazily when another worker has
+        written a newer revision.
+        """
+        rev = self.backend.get(self._rev_key(session_id))
+        if rev is None:
+            return None
+        if local is not None and local.get("rev") == rev:
+            return local
+
+        blob = self.backend.get(self._key(session_id))
+        if blob is None:
+            return None
+
+        session = self.decode(blob)
+        session["rev"] = rev
+        session["session_id"] = session_id
+        self.rehydrations += 1
+        logger.debug(f"Session rehydrated from backend: {session_id}")
+        return session
+
+    def save(self, session: Dict[str, Any]) -> None:
+        """
+        Persist a session to the backend (no-op without one).
+
+        The blob is written before its revision so readers never see a
+        revision whose data is missing.
+        """
+        if self.backend is None:
+            return
+
+        session_id = session["session_id"]
+        rev = os.urandom(8).hex().encode("ascii")
+        self.backend.set(self._key(session_id), self.encode(session), ex=self.persist_ttl)
+        self.backend.set(self._rev_key(session_id), rev, ex=self.persist_ttl)
+        session["rev"] = rev
+
+    # ----- eviction -----
+
+    def _insert(self, session_id: str, session: Dict[str, Any]) -> None:
+        session["session_id"] = session_id
+        self._sessions[session_id] = session
+        self._touch(session_id)
+        self._enforce_limits(keep=session_id)
+
+    def _touch(self, session_id: str) -> None:
+        self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = time.monotonic()
+
+    def _evict_oldest(self) -> None:
+        session_id, _ = self._sessions.popitem(last=False)
+        self._last_access.pop(session_id, None)
+        self.evictions += 1
+        logger.info(f"♻️ Session evicted (LRU): {session_id}")
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        """Evict least recently used sessions until count and memory caps hold."""
+        while len(self._sessions) > self.max_sessions:
+            self._evict_oldest()
+
+        if self.max_bytes:
+            total = self.estimated_bytes()
+            while total > self.max_bytes and len(self._sessions) > 1:
+                oldest_id = next(iter(self._sessions))
+                if oldest_id == keep:
+                    break
+                total -= estimate_session_bytes(self._sessions[oldest_id])
+                self._evict_oldest()
+
+    def reap(self) -> int:
+        """
+        Expire idle sessions and re-apply the memory cap.
+
+        Returns:
+            int: Number of sessions expired for idleness.
+        """
+        expired = 0
+        with self._lock:
+            if self.idle_ttl:
+                cutoff = time.monotonic() - self.idle_ttl
+                # LRU order means idle sessions are at the front
+                while self._sessions:
+                    oldest_id = next(iter(self._sessions))
+                    if self._last_access[oldest_id] > cutoff:
+                        break
+                    del self._sessions[oldest_id]
+                    del self._last_access[oldest_id]
+                    expired += 1
+
+            self.expirations += expired
+            self._enforce_limits()
+
+        if expired:
+            logger.info(f"♻️ Expired {expired} idle session(s)")
+        return expired
+
+    def start_reaper(self) -> None:
+        """Start the background reaper thread (idempotent)."""
+        if self._reaper and self._reaper.is_alive():
+            return
+
+        self._stop.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self) -> None:
+        """Stop the background reaper thread."""
+        self._stop.set()
+        if self._reaper:
+            self._reaper.join(timeout=2.0)
+
+    def _reap_loop(self) -> None:
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"❌ Session reaper error: {e}", exc_info=True)
+
+    # ----- stats -----
+
+    def estimated_bytes(self) -> int:
+        """Return estimated bytes across all sessions."""
+        with self._lock:
+            return sum(estimate_session_bytes(s) for s in self._sessions.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Return live counters for monitoring."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rehydrations": self.rehydrations,
+                "estimated_bytes": self.estimated_bytes(),
+                "max_bytes": self.max_bytes,
+                "backend": type(self.backend).__name__ if self.backend else "none",
+            }
@@ -4,13 +4,19 @@ Contains core therapeutic logic, NLP utilities, and session management.
 """
 
 import logging
-import time
-from collections import deque
+import re
 from typing import Tuple, Optional, List, Dict, Any
 from enum import Enum
 
+from emotion_trajectory import EmotionTrajectory
+from safety_matcher import safety_matcher
+from turn_analysis import analyze_turn, turn_analyzer
+from turn_store import Turn, TurnStore
+
 logger = logging.getLogger(__name__)
 
+_WORD = re.compile(r"\w+")
+
 
 class TherapyMode(Enum):
     """Therapy interaction modes."""
@@ -22,66 +28,38 @@ class TherapyMode(Enum):
 
 # ========== EMOTION MANAGEMENT ==========
 
-DISTRESS_EMOTIONS = {"sad", "fear", "angry", "disgust", "surprise"}
-SAFETY_KEYWORDS = [
-    "suicide",
-    "kill myself",
-    "end my life",
-    "hurt myself",
-    "self harm",
-    "self-harm",
-    "cut myself",
-    "want to die",
-    "no reason to live",
-    "give up",
-]
-
-PLAYBOOKS = {
-    "sad": "Run a 5-minute activation: stand, stretch, and text one friend a kind line.",
-    "fear": "Try 5-4-3-2-1 grounding with one slow exhale per step.",
-    "angry": "Cool-down reset: cold water on wrists + step outside for 2 minutes before replying to anyone.",
-    "disgust": "Name-then-reframe: label the trigger, then list one boundary you can set today.",
-    "surprise": "Stabilize with box breathing: 4 in, 4 hold, 4 out, 4 hold for two cycles.",
-    "neutral": "Micro check-in: what mattered most today? Pick one tiny action that honors it in 5 minutes.",
-    "default": "Pick one concrete action in 5 minutes (move, text, or jot a thought). Keep it small and doable.",
-}
+# Compiled from safety_phrases.txt; kept under its old name for callers
+SAFETY_KEYWORDS = safety_matcher.phrases
+
+# Loaded from turn_rules.ini
+PLAYBOOKS = turn_analyzer.rules.playbooks
 
 
 def update_emotion_history(
-    emotion: str, emotion_history: deque
+    emotion: str, trajectory: EmotionTrajectory
 ) -> None:
     """
-    Store a timestamped emotion in the rolling history buffer.
+    Record the current emotion in the session's trajectory.
 
     Args:
         emotion: The current emotion label.
-        emotion_history: A deque to store (timestamp, emotion) tuples.
+        trajectory: The session's EmotionTrajectory.
     """
-    emotion_history.append((time.time(), emotion))
+    trajectory.update(emotion)
     logger.debug(f"Emotion logged: {emotion}")
 
 
-def summarize_trajectory(emotion_history: deque) -> str:
+def summarize_trajectory(trajectory: EmotionTrajectory) -> str:
     """
     Describe how emotion has shifted recently.
 
     Args:
-        emotion_history: Deque of (timestamp, emotion) tuples.
+        trajectory: The session's EmotionTrajectory.
 
     Returns:
         str: A human-readable description of the emotional trajectory.
     """
-    if len(emotion_history) < 4:
-        return "steady so far"
-
-    recent = [e for _, e in list(emotion_history)[-20:]]
-    start, end = recent[0], recent[-1]
-
-    if start != end:
-        return f"from {start} toward {end}"
-
-    dominant = max(set(recent), key=recent.count)
-    return f"mostly {dominant}"
+    return trajectory.describe()
 
 
 def detect_contradiction(user_text: str, current_emotion: str) -> str:
@@ -95,19 +73,15 @@ def detect_contradiction(user_text: str, current_emotion: str) -> str:
     Returns:
         str: A flag message if contradiction detected, else "none noted".
     """
-    text = user_text.lower()
-    says_fine = any(token in text for token in ["fine", "okay", "good"])
-    looks_distressed = current_emotion in DISTRESS_EMOTIONS
-
-    if says_fine and looks_distressed:
-        return f"User says fine but looks {current_emotion}. Invite gentle check-in."
-
-    return "none noted"
+    return analyze_turn(user_text, current_emotion).contradiction
 
 
 def detect_high_risk(user_text: str) -> bool:
     """
-    Simple keyword-based safety net for self-harm detection.
+    Keyword safety net for self-harm detection.
+
+    Uses the compiled phrase matcher, so cost is linear in the input
+    length regardless of lexicon size.
 
     Args:
         user_text: The user's spoken input.
@@ -115,13 +89,25 @@ def detect_high_risk(user_text: str) -> bool:
     Returns:
         bool: True if high-risk keywords detected, False otherwise.
     """
-    lowered = user_text.lower()
-    detected = any(phrase in lowered for phrase in SAFETY_KEYWORDS)
+    matched = find_high_risk_phrases(user_text)
 
-    if detected:
-        logger.warning(f"⚠️ High-risk content detected in user input")
+    if matched:
+        logger.warning(f"⚠️ High-risk content detected in user input (matched: {', '.join(matched)})")
 
-    return detected
+    return bool(matched)
+
+
+def find_high_risk_phrases(user_text: str) -> List[str]:
+    """
+    Report which safety-lexicon phrases occur in the input.
+
+    Args:
+        user_text: The user's input text.
+
+    Returns:
+        List of matched phrases (empty if none).
+    """
+    return safety_matcher.match(user_text)
 
 
 def select_playbook(emotion: str, user_text: str) -> str:
@@ -135,50 +121,11 @@ def select_playbook(emotion: str, user_text: str) -> str:
     Returns:
         str: A coping strategy or mini-protocol.
     """
-    text = user_text.lower()
-
-    # Intent-based routing
-    if "panic" in text or "anxious" in text:
-        return "Panic kit: 3 paced breaths (inhale 4, exhale 6) plus name 3 things you see."
-    if "sleep" in text or "insomnia" in text:
-        return "Sleep wind-down: lights dim, slow exhale 6s for 1 minute, then write one worry and shelve it till morning."
-    if "overwhelm" in text or "burnout" in text:
-        return "Overwhelm triage: list top 3 tasks, pick one 10-minute starter and ignore the rest for 30 minutes."
-
-    # Emotion-based routing
-    if emotion in PLAYBOOKS:
-        return PLAYBOOKS[emotion]
-
-    return PLAYBOOKS["default"]
+    return analyze_turn(user_text, emotion).playbook
 
 
 # ========== SESSION LOGGING ==========
 
-class SessionEntry:
-    """Represents a single turn in a therapy session."""
-
-    def __init__(
-        self,
-        user_text: str,
-        ai_text: str,
-        emotion: str,
-        timestamp: Optional[float] = None,
-    ):
-        self.user_text = user_text
-        self.ai_text = ai_text
-        self.emotion = emotion
-        self.timestamp = timestamp or time.time()
-
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert entry to dictionary."""
-        return {
-            "timestamp": self.timestamp,
-            "user": self.user_text,
-            "ai": self.ai_text,
-            "emotion": self.emotion,
-        }
-
-
 class SessionLog:
     """Manages session logging and summary generation."""
 
@@ -189,7 +136,7 @@ class SessionLog:
         Args:
             max_entries: Maximum number of entries to keep in memory.
         """
-        self.entries: List[SessionEntry] = []
+        self.entries = TurnStore(capacity=max_entries)
         self.max_entries = max_entries
 
     def add_turn(self, user_text: str, ai_text: str, emotion: str) -> None:
@@ -201,12 +148,8 @@ class SessionLog:
             ai_text: AI's response.
             emotion: Detected emotion at time of turn.
         """
-        entry = SessionEntry(user_text, ai_text, emotion)
-        self.entries.append(entry)
-
-        if len(self.entries) > self.max_entries:
-            self.entries.pop(0)
-
+        # The ring overwrites the oldest entry once full: O(1), no list shift
+        self.entries.append(Turn(user_text, ai_text, emotion))
         logger.debug(f"Session turn logged (total: {len(self.entries)})")
 
     def get_emotion_timeline(self, recent_count: int = 20) -> List[str]:
@@ -219,8 +162,7 @@ class SessionLog:
         Returns:
             List of emotion labels.
         """
-        recent = self.entries[-recent_count:]
-        return [e.emotion for e in recent]
+        return self.entries.emotions(recent_count)
 
     def get_recent_turns(self, count: int = 6) -> List[Dict[str, Any]]:
         """
@@ -232,8 +174,7 @@ class SessionLog:
         Returns:
             List of turn dictionaries.
         """
-        recent = self.entries[-count:]
-        return [t.to_dict() for t in recent]
+        return [t.to_dict() for t in self.entries.recent(count)]
 
     def __len__(self) -> int:
         """Return number of logged turns."""
@@ -241,7 +182,7 @@ class SessionLog:
 
     def __bool__(self) -> bool:
         """Return True if session has entries."""
-        return len(self.entries) > 0
+        return bool(self.entries)
 
 
 # ========== PROMPT BUILDERS ==========
@@ -253,6 +194,7 @@ def build_fusion_prompt(
     contradiction: str,
     playbook: str,
     pace_hint: str,
+    related_turns: Optional[List[str]] = None,
 ) -> str:
     """
     Build the final fusion prompt for Gemini.
@@ -264,10 +206,16 @@ def build_fusion_prompt(
         contradiction: Contradiction flag.
         playbook: Selected therapeutic playbook.
         pace_hint: Pacing hint (normal/slower).
+        related_turns: Earlier exchanges retrieved as relevant to this
+            message (used instead of resending the full history).
 
     Returns:
         str: The complete fusion prompt.
     """
+    related = ""
+    if related_turns:
+        related = f"RELEVANT EARLIER EXCHANGES: {' || '.join(related_turns)}. "
+
     prompt = (
         "CONTEXT: Short, solution-focused spoken therapy. "
         f"USER SAID: '{user_text}'. "
@@ -276,6 +224,7 @@ def build_fusion_prompt(
         f"CONTRADICTION FLAG: {contradiction}. "
         f"SUGGESTED PLAYBOOK: {playbook}. "
         f"PACE HINT: {pace_hint}. "
+        f"{related}"
         "INSTRUCTION: "
         "1) Validate based on words + emotion, "
         "2) offer ONE specific tool right now, "
@@ -286,6 +235,101 @@ def build_fusion_prompt(
     return prompt
 
 
+# Context fields in prompt order: (key, label, format)
+CONTEXT_FIELDS = (
+    ("emotion", "EMOTIONAL STATE", "'{}'"),
+    ("trajectory", "EMOTION TRAJECTORY", "{}"),
+    ("contradiction", "CONTRADICTION FLAG", "{}"),
+    ("playbook", "SUGGESTED PLAYBOOK", "{}"),
+    ("pace_hint", "PACE HINT", "{}"),
+)
+
+
+class PromptState:
+    """
+    Context fields the model has already seen in this conversation.
+
+    A turn's fields only count as sent once its prompt is in the chat
+    history, so a failed LLM call never leaves the model missing a field.
+    """
+
+    __slots__ = ("sent", "since_keyframe", "_pending")
+
+    def __init__(self):
+        self.sent: Dict[str, str] = {}
+        self.since_keyframe = 0
+        self._pending: Optional[Tuple[str, Dict[str, str]]] = None
+
+    def reset(self) -> None:
+        """Forget what was sent (call when the chat history is rewritten)."""
+        self.sent = {}
+        self.since_keyframe = 0
+        self._pending = None
+
+    def changed_fields(
+        self, fields: Dict[str, str], history: List[Tuple[str, str]], keyframe_every: int
+    ) -> Dict[str, str]:
+        """
+        Pick the fields this turn must carry.
+
+        Args:
+            fields: This turn's context values.
+            history: The chat history the prompt will be sent after.
+            keyframe_every: Resend every field after this many delta turns.
+
+        Returns:
+            The fields to send; all of them on a keyframe.
+        """
+        if self._pending is not None:
+            prompt, changed = self._pending
+            self._pending = None
+            if len(history) >= 2 and history[-2][1] is prompt:
+                full = len(changed) == len(CONTEXT_FIELDS)
+                self.sent.update(changed)
+                self.since_keyframe = 0 if full else self.since_keyframe + 1
+            else:
+                # The last turn never reached the history: start over
+                self.sent = {}
+
+        if not self.sent or self.since_keyframe >= keyframe_every:
+            return dict(fields)
+        return {key: value for key, value in fields.items() if self.sent.get(key) != value}
+
+    def mark_sent(self, prompt: str, changed: Dict[str, str]) -> None:
+        """Remember the prompt carrying `changed` until it shows up in history."""
+        self._pending = (prompt, changed)
+
+
+def build_delta_prompt(
+    user_text: str,
+    changed: Dict[str, str],
+    related_turns: Optional[List[str]] = None,
+) -> str:
+    """
+    Build a compact prompt with only the context fields that changed.
+
+    The fixed instructions live in the system instruction
+    (llm.TURN_INSTRUCTIONS), so a turn with no changes is just USER SAID.
+
+    Args:
+        user_text: User's spoken input.
+        changed: Fields to send (from PromptState.changed_fields).
+        related_turns: Earlier exchanges retrieved as relevant to this message.
+
+    Returns:
+        str: The delta prompt.
+    """
+    parts = [
+        f"{label}: {fmt.format(changed[key])}. "
+        for key, label, fmt in CONTEXT_FIELDS
+        if key in changed
+    ]
+    if related_turns:
+        parts.append(f"RELEVANT EARLIER EXCHANGES: {' || '.join(related_turns)}. ")
+    parts.append(f"USER SAID: '{user_text}'.")
+    return "".join(parts)
+
+
 def build_summary_prompt(
     emotion_timeline: List[str],
     recent_turns: List[Dict[str, Any]],
@@ -337,8 +381,7 @@ def extract_word_count(text: str) -> int:
     Returns:
         int: Number of words.
     """
-    import re
-    return len(re.findall(r"\w+", text))
+    return len(_WORD.findall(text))
 
 
 def determine_pace_hint(word_count: int, threshold: int = 18) -> str:
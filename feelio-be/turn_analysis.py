@@ -0,0 +1,186 @@
+"""
+Single-pass feature extraction for one user message.
+Normalizes the text once and runs one automaton over it that holds the
+safety lexicon, the "I'm fine" words and every intent keyword, then derives
+word count, pace hint, contradiction flag and playbook from that result.
+Intent and playbook rules live in turn_rules.ini rather than in code.
+"""
+
+import configparser
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from config import Config
+from safety_matcher import PhraseMatcher, load_phrases, normalize, DEFAULT_PHRASES_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "turn_rules.ini")
+
+DISTRESS_EMOTIONS = frozenset({"sad", "fear", "angry", "disgust", "surprise"})
+
+# Tags attached to automaton phrases
+RISK = "risk"
+FINE = "fine"
+INTENT = "intent"
+
+NO_CONTRADICTION = "none noted"
+
+
+class TurnAnalysis(NamedTuple):
+    """Immutable features of one message, computed by TurnAnalyzer.analyze."""
+
+    high_risk: bool
+    risk_phrases: Tuple[str, ...]
+    fine_tokens: Tuple[str, ...]
+    intents: Tuple[str, ...]
+    word_count: int
+    pace_hint: str
+    contradiction: str
+    playbook: str
+
+
+class TurnRules:
+    """Intent, contradiction, pace and playbook rules loaded from an INI file."""
+
+    def __init__(self, path: str):
+        """
+        Load rules.
+
+        Args:
+            path: turn_rules.ini-style file.
+        """
+        parser = configparser.ConfigParser(interpolation=None)
+        with open(path, encoding="utf-8") as f:
+            parser.read_file(f)
+
+        # (intent name, keywords, playbook) in priority order
+        self.intents: List[Tuple[str, List[str], str]] = []
+        for section in parser.sections():
+            if section.startswith("intent:"):
+                self.intents.append((
+                    section[len("intent:"):],
+                    _split_keywords(parser[section]["keywords"]),
+                    parser[section]["playbook"],
+                ))
+
+        self.fine_words = _split_keywords(parser.get("contradiction", "keywords", fallback=""))
+        self.slower_above_words = parser.getint("pace", "slower_above_words", fallback=18)
+        self.playbooks: Dict[str, str] = dict(parser["playbooks"]) if parser.has_section("playbooks") else {}
+        self.playbooks.setdefault("default", "Pick one small, doable action in the next 5 minutes.")
+        self.intent_playbooks = {name: playbook for name, _, playbook in self.intents}
+
+
+def _split_keywords(value: str) -> List[str]:
+    return [k.strip() for k in value.split(",") if k.strip()]
+
+
+class TurnAnalyzer:
+    """Compiles the rules and safety lexicon into one matcher."""
+
+    def __init__(self, rules: TurnRules, risk_phrases: List[str]):
+        """
+        Build the combined automaton.
+
+        Args:
+            rules: Loaded TurnRules.
+            risk_phrases: Safety lexicon entries.
+        """
+        self.rules = rules
+        self._intent_rank = {name: rank for rank, (name, _, _) in enumerate(rules.intents)}
+
+        phrases: List[str] = []
+        tags: List[Tuple[str, str]] = []
+        for phrase in risk_phrases:
+            phrases.append(phrase)
+            tags.append((RISK, phrase))
+        for word in rules.fine_words:
+            phrases.append(word)
+            tags.append((FINE, word))
+        for name, keywords, _ in rules.intents:
+            for keyword in keywords:
+                phrases.append(keyword)
+                tags.append((INTENT, name))
+        self.matcher = PhraseMatcher(phrases, tags)
+
+    def analyze(self, user_text: str, emotion: str = "neutral") -> TurnAnalysis:
+        """
+        Extract every per-turn feature in one pass over the text.
+
+        Args:
+            user_text: The user's message.
+            emotion: The detected emotion label.
+
+        Returns:
+            TurnAnalysis: The immutable result.
+        """
+        normalized = normalize(user_text)
+        tags = self.matcher.tags
+        rules = self.rules
+
+        risk: List[str] = []
+        fine: List[str] = []
+        intents: List[str] = []
+        for phrase_id in self.matcher.match_ids(normalized):
+            kind, label = tags[phrase_id]
+            if kind is RISK:
+                risk.append(label)
+            elif kind is FINE:
+                fine.append(label)
+            elif label not in intents:
+                intents.append(label)
+        if len(intents) > 1:
+            intents.sort(key=self._intent_rank.__getitem__)
+
+        word_count = normalized.count(" ") + 1 if normalized else 0
+
+        if fine and emotion in DISTRESS_EMOTIONS:
+            contradiction = f"User says fine but looks {emotion}. Invite gentle check-in."
+        else:
+            contradiction = NO_CONTRADICTION
+
+        if intents:
+            playbook = rules.intent_playbooks[intents[0]]
+        else:
+            playbook = rules.playbooks.get(emotion) or rules.playbooks["default"]
+
+        return TurnAnalysis(
+            bool(risk),
+            tuple(risk),
+            tuple(fine),
+            tuple(intents),
+            word_count,
+            "slower" if word_count > rules.slower_above_words else "normal",
+            contradiction,
+            playbook,
+        )
+
+
+def build_analyzer(rules_path: Optional[str] = None, phrases_path: Optional[str] = None) -> TurnAnalyzer:
+    """
+    Load rules and the safety lexicon and compile the analyzer.
+
+    Args:
+        rules_path: Rules file (defaults to Config.TURN_RULES_PATH, then
+            the bundled turn_rules.ini).
+        phrases_path: Safety lexicon (defaults to Config.SAFETY_PHRASES_PATH,
+            then the bundled safety_phrases.txt).
+
+    Returns:
+        TurnAnalyzer: The compiled analyzer.
+    """
+    rules = TurnRules(rules_path or Config.TURN_RULES_PATH or DEFAULT_RULES_PATH)
+    phrases = load_phrases(phrases_path or Config.SAFETY_PHRASES_PATH or DEFAULT_PHRASES_PATH)
+    analyzer = TurnAnalyzer(rules, phrases)
+    logger.info(f"✅ Turn analyzer ready: {len(rules.intents)} intents, {len(analyzer.matcher)} phrases")
+    return analyzer
+
+
+# Built once at import; shared by the API and the CLI
+turn_analyzer = build_analyzer()
+
+
+def analyze_turn(user_text: str, emotion: str = "neutral") -> TurnAnalysis:
+    """Analyze one message with the shared analyzer."""
+    return turn_analyzer.analyze(user_text, emotion)
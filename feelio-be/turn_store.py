@@ -0,0 +1,189 @@
+"""
+Compact conversation-turn storage shared by the API and the desktop CLI.
+Turns are slotted objects with interned emotion labels, held in a
+fixed-capacity ring buffer: appends and evictions are O(1), and recent
+slices cost only the turns they return. Per-emotion counts are kept as
+turns are appended, so summaries never walk the turns.
+"""
+
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+Row = List[Any]
+
+
+class Turn:
+    """One exchange; `__slots__` keeps it to a few pointers and no __dict__."""
+
+    __slots__ = ("user", "therapist", "emotion", "crisis", "timestamp")
+
+    def __init__(
+        self,
+        user: str,
+        therapist: str,
+        emotion: str,
+        crisis: bool = False,
+        timestamp: Optional[float] = None,
+    ):
+        self.user = user
+        self.therapist = therapist
+        # A handful of labels repeat across every turn of every session
+        self.emotion = sys.intern(emotion)
+        self.crisis = crisis
+        self.timestamp = timestamp or time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the turn to the dictionary shape used in summaries and logs."""
+        return {
+            "timestamp": self.timestamp,
+            "user": self.user,
+            "ai": self.therapist,
+            "emotion": self.emotion,
+        }
+
+    def to_row(self) -> Row:
+        """Positional form for compact serialization."""
+        return [self.user, self.therapist, self.emotion, int(self.crisis), int(self.timestamp)]
+
+    @classmethod
+    def from_row(cls, row: Row) -> "Turn":
+        """Rebuild a turn from to_row output (rows without a timestamp are accepted)."""
+        user, therapist, emotion, crisis, *rest = row
+        return cls(user, therapist, emotion, bool(crisis), rest[0] if rest else None)
+
+
+class TurnStore:
+    """
+    Ring buffer of turns addressed by absolute turn number.
+
+    Turn numbers keep counting after old turns are evicted, so indexes that
+    refer to turns (retrieval) stay valid; evicted turns read as None.
+    """
+
+    __slots__ = ("capacity", "total", "emotion_counts", "_base", "_ring")
+
+    def __init__(self, capacity: int = 0):
+        """
+        Initialize an empty store.
+
+        Args:
+            capacity: Most turns kept in memory; 0 keeps every turn.
+        """
+        self.capacity = capacity
+        self.total = 0  # turns ever appended (next turn number)
+        self.emotion_counts: Dict[str, int] = {}  # over every turn appended, evicted ones included
+        self._base = 0  # turn number stored in slot 0 on the first lap
+        self._ring: List[Turn] = []
+
+    def __len__(self) -> int:
+        """Turns currently held."""
+        return len(self._ring)
+
+    def __bool__(self) -> bool:
+        return bool(self._ring)
+
+    def __iter__(self) -> Iterator[Turn]:
+        return iter(self.recent(len(self._ring)))
+
+    @property
+    def first(self) -> int:
+        """Turn number of the oldest turn still held."""
+        return self.total - len(self._ring)
+
+    def append(self, turn: Turn) -> Optional[Turn]:
+        """
+        Add a turn, evicting the oldest one when full.
+
+        Args:
+            turn: The new turn.
+
+        Returns:
+            The evicted turn, or None.
+        """
+        evicted = None
+        self.emotion_counts[turn.emotion] = self.emotion_counts.get(turn.emotion, 0) + 1
+        if not self.capacity or len(self._ring) < self.capacity:
+            self._ring.append(turn)
+        else:
+            slot = (self.total - self._base) % self.capacity
+            evicted = self._ring[slot]
+            self._ring[slot] = turn
+        self.total += 1
+        return evicted
+
+    def get(self, turn_no: int) -> Optional[Turn]:
+        """
+        Look up a turn by absolute number.
+
+        Args:
+            turn_no: 0-based turn number.
+
+        Returns:
+            The turn, or None if it was evicted or never existed.
+        """
+        if not self.first <= turn_no < self.total:
+            return None
+        offset = turn_no - self._base
+        return self._ring[offset % self.capacity if self.capacity else offset]
+
+    def recent(self, count: int) -> List[Turn]:
+        """
+        The newest turns, oldest first.
+
+        Args:
+            count: How many turns to return (at most len(self)).
+
+        Returns:
+            List of Turn references (O(count), no copies of the turns).
+        """
+        ring = self._ring
+        count = min(count, len(ring))
+        if count <= 0:
+            return []
+        if not self.capacity or len(ring) < self.capacity:
+            return ring[-count:]
+        end = (self.total - self._base) % self.capacity  # slot after the newest turn
+        start = end - count
+        if start >= 0:
+            return ring[start:end]
+        return ring[start:] + ring[:end]
+
+    def emotions(self, count: int) -> List[str]:
+        """Emotion labels of the newest `count` turns, oldest first."""
+        return [turn.emotion for turn in self.recent(count)]
+
+    def to_rows(self) -> List[Row]:
+        """All held turns in positional form, oldest first."""
+        return [turn.to_row() for turn in self]
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: List[Row],
+        capacity: int = 0,
+        total: Optional[int] = None,
+        emotion_counts: Optional[Dict[str, int]] = None,
+    ) -> "TurnStore":
+        """
+        Rebuild a store from to_rows output.
+
+        Args:
+            rows: Rows, oldest first.
+            capacity: Ring capacity of the new store.
+            total: Turns ever appended (defaults to len(rows)).
+            emotion_counts: Saved counts (defaults to counting the rows).
+
+        Returns:
+            TurnStore: The restored store; turn numbers match the original.
+        """
+        store = cls(capacity)
+        if capacity:
+            rows = rows[-capacity:]
+        total = len(rows) if total is None else max(total, len(rows))
+        store._base = store.total = total - len(rows)
+        for row in rows:
+            store.append(Turn.from_row(row))
+        if emotion_counts is not None:
+            store.emotion_counts = {sys.intern(e): n for e, n in emotion_counts.items()}
+        return store
@@ -0,0 +1,183 @@
+"""
+Offline emotion timeline for recorded sessions.
+Splits a video file or image directory into chunks of frames and runs Face
+Mesh on them in a process pool (one model per chunk, so chunks share no
+tracking state). Workers return mouth landmarks only; the parent labels
+every frame in one emotion_geometry call and writes one row per analyzed
+frame: timestamp, smile_ratio, mouth_open and label. Frames without a face,
+or images that cannot be decoded, get NaN scores and the label "none".
+Output is CSV, or compressed NumPy columns when the file name ends in .npz.
+
+Usage:
+    python vision_batch.py recording.mp4 --out timeline.npz [--workers 4] [--chunk-seconds 30] [--fps 5]
+"""
+
+import argparse
+import csv
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from emotion_geometry import LABELS as EMOTION_LABELS
+from emotion_geometry import MOUTH_POINTS, EmotionThresholds, classify_landmarks
+from frame_sources import open_source
+from vision_module import VisionSystem, vision_profile
+
+logger = logging.getLogger(__name__)
+
+NO_FACE = "none"
+LABELS = (NO_FACE, *EMOTION_LABELS.tolist())  # npz label codes
+NO_POINTS = np.full((len(MOUTH_POINTS), 3), np.nan)
+
+Chunk = Tuple[str, int, int, int, str]  # (source spec, start, stop, step, profile name)
+
+
+class Timeline(NamedTuple):
+    """Per-frame results, one entry per analyzed frame, in frame order."""
+
+    timestamps: np.ndarray  # seconds from the start of the recording
+    smile_ratio: np.ndarray  # NaN where no face was found
+    mouth_open: np.ndarray
+    labels: List[str]
+
+
+def plan_chunks(spec: str, chunk_seconds: float, fps: float, profile: str) -> List[Chunk]:
+    """
+    Split a recording into frame ranges of about chunk_seconds each.
+
+    Args:
+        spec: Video file or image directory.
+        chunk_seconds: Media seconds per chunk.
+        fps: Frames analyzed per second of media (0 = every frame).
+        profile: Vision profile name for the workers.
+
+    Returns:
+        List of chunks, in frame order.
+    """
+    source = open_source(spec)
+    try:
+        total, source_fps = len(source), source.fps
+    finally:
+        source.release()
+    if source.live or not total:
+        raise ValueError(f"Batch analysis needs a recording with a known length: {spec!r}")
+
+    step = max(1, round(source_fps / fps)) if fps > 0 else 1
+    # Chunks start on a sampled frame so the sampling grid is the same as one pass
+    size = max(step, math.ceil(chunk_seconds * source_fps / step) * step)
+    return [(spec, start, min(start + size, total), step, profile) for start in range(0, total, size)]
+
+
+def analyze_chunk(chunk: Chunk) -> Tuple[np.ndarray, np.ndarray]:
+    """Worker: run Face Mesh over one chunk; returns timestamps and (n, 4, 3) mouth points (NaN: no face)."""
+    spec, start, stop, step, profile = chunk
+    source = open_source(spec)
+    vision = VisionSystem(source=source, headless=True, profile=vision_profile(profile))
+    timestamps, points = [], []
+    try:
+        for _, ts, frame in source.frames(start, stop, step):
+            face = None if frame is None else vision.mouth_landmarks(frame)
+            timestamps.append(ts)
+            points.append(NO_POINTS if face is None else face)
+    finally:
+        source.release()
+        vision.face_mesh.close()
+    return np.array(timestamps, dtype=np.float64), np.array(points, dtype=np.float64).reshape(-1, len(MOUTH_POINTS), 3)
+
+
+def analyze(
+    spec: str,
+    workers: int = 0,
+    chunk_seconds: float = 30.0,
+    fps: float = 0.0,
+    profile: str = "fast",
+    thresholds: Optional[EmotionThresholds] = None,
+) -> Timeline:
+    """
+    Analyze a whole recording.
+
+    Args:
+        spec: Video file or image directory.
+        workers: Processes to use (0 = one per CPU; 1 runs in this process).
+        chunk_seconds: Media seconds per chunk of work.
+        fps: Frames analyzed per second of media (0 = every frame).
+        profile: Vision profile name ("fast" or "accurate").
+        thresholds: Mouth-shape cut-offs (default: from Config).
+
+    Returns:
+        Timeline: Columns for every analyzed frame.
+    """
+    chunks = plan_chunks(spec, chunk_seconds, fps, profile)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        parts = [analyze_chunk(chunk) for chunk in chunks]
+    else:
+        # Spawned, not forked: a forked child inherits MediaPipe state it cannot use
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as pool:
+            parts = list(pool.map(analyze_chunk, chunks))
+
+    # Workers only extract landmarks; the whole recording is classified in one call
+    points = np.concatenate([part[1] for part in parts])
+    result = classify_landmarks(points, thresholds)
+    labels = np.where(np.isnan(result.smile_ratio), NO_FACE, result.labels)
+    return Timeline(
+        timestamps=np.concatenate([part[0] for part in parts]),
+        smile_ratio=result.smile_ratio.astype(np.float32),
+        mouth_open=result.mouth_open.astype(np.float32),
+        labels=labels.tolist(),
+    )
+
+
+def write_timeline(timeline: Timeline, path: str) -> None:
+    """Write a timeline as CSV, or as compressed columns if path ends in .npz."""
+    if path.endswith(".npz"):
+        codes = np.array([LABELS.index(label) for label in timeline.labels], dtype=np.uint8)
+        np.savez_compressed(
+            path,
+            timestamp=timeline.timestamps,
+            smile_ratio=timeline.smile_ratio,
+            mouth_open=timeline.mouth_open,
+            label=codes,
+            label_names=np.array(LABELS),
+        )
+        return
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "smile_ratio", "mouth_open", "label"])
+        for ts, smile, mouth, label in zip(timeline.timestamps, timeline.smile_ratio, timeline.mouth_open, timeline.labels):
+            writer.writerow([f"{ts:.3f}", "" if math.isnan(smile) else f"{smile:.5f}",
+                             "" if math.isnan(mouth) else f"{mouth:.5f}", label])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Write a per-frame emotion timeline for a recording.")
+    parser.add_argument("source", help="Video file or directory of images")
+    parser.add_argument("--out", required=True, help="Output file (.csv or .npz)")
+    parser.add_argument("--workers", type=int, default=0, help="Processes (0 = one per CPU)")
+    parser.add_argument("--chunk-seconds", type=float, default=30.0)
+    parser.add_argument("--fps", type=float, default=0.0, help="Frames analyzed per media second (0 = all)")
+    parser.add_argument("--profile", choices=("fast", "accurate"), default="fast")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    start = time.perf_counter()
+    timeline = analyze(args.source, args.workers, args.chunk_seconds, args.fps, args.profile)
+    write_timeline(timeline, args.out)
+    elapsed = time.perf_counter() - start
+    faces = sum(label != NO_FACE for label in timeline.labels)
+    logger.info(f"✅ {len(timeline.labels)} frames ({faces} with a face) in {elapsed:.1f}s "
+                f"({len(timeline.labels) / elapsed:.0f} fps) -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,105 +1,432 @@
-import cv2
-import mediapipe as mp
+"""
+Camera emotion detection for the desktop CLI (MediaPipe Face Mesh).
+A capture thread reads the camera into a one-slot buffer that always holds
+only the newest frame; an inference thread classifies that frame at up to
+VISION_TARGET_FPS. Frames that arrive while inference is busy or throttled
+replace each other instead of queueing, so the label comes from a recent
+frame and CPU cost follows the target rate rather than the camera's.
+Headless (VISION_HEADLESS, for servers without a display) nothing is drawn
+or shown; otherwise a preview thread redraws the debug window at
+VISION_PREVIEW_FPS, independent of both other threads.
+
+VISION_PROFILE=fast trades Face Mesh accuracy the classifier does not use
+for speed: no iris refinement, downscaled input, and cropping to the last
+face box so the full frame is only searched again when the face is lost.
+"""
+
+import logging
+import os
+import sys
 import threading
 import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from config import Config
+from emotion_geometry import MOUTH_POINTS, EmotionThresholds, classify_landmarks
+from frame_sources import open_source
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# Face crops are scaled to at most this many pixels across: the mesh model itself runs at 192x192
+ROI_INPUT_SIZE = 256
+# The face box only needs the outline (36 points), not all 468
+FACE_OVAL = sorted({i for edge in mp.solutions.face_mesh.FACEMESH_FACE_OVAL for i in edge})
+READ_BACKOFF_START = 0.01  # seconds; doubles per failed read up to VISION_READ_BACKOFF_MAX
+
+MOOD_COLORS = {
+    "happy": (0, 255, 0),
+    "surprise": (255, 165, 0),
+    "sad": (0, 0, 255),
+    "neutral": (255, 255, 0),
+}
+
+
+class VisionProfile(NamedTuple):
+    """Face Mesh settings traded against per-frame cost."""
+
+    name: str
+    refine_landmarks: bool  # iris refinement; the classifier reads only mouth points
+    input_width: int  # downscale wider frames to this width (0 = full resolution)
+    roi_tracking: bool  # crop to the last face box; search the full frame when lost
+    roi_margin: float  # margin around the face box, as a fraction of its size
+
+
+def vision_profile(name: Optional[str] = None) -> VisionProfile:
+    """
+    Build a named profile from Config.
+
+    Args:
+        name: "accurate" (full frames, refined mesh) or "fast"
+            (default: Config.VISION_PROFILE).
+
+    Returns:
+        VisionProfile: The settings.
+    """
+    name = name or Config.VISION_PROFILE
+    if name == "fast":
+        return VisionProfile("fast", False, Config.VISION_INPUT_WIDTH, True, Config.VISION_ROI_MARGIN)
+    return VisionProfile("accurate", True, 0, False, 0.0)
+
+
+def display_available() -> bool:
+    """False on Linux without an X11/Wayland display, where opening a window aborts the process."""
+    if not sys.platform.startswith("linux"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+class LatestFrame:
+    """One-slot frame buffer: put() overwrites an unread frame, get() takes the newest."""
 
-class VisionSystem:
     def __init__(self):
+        self._cond = threading.Condition()
+        self._frame: Optional[Tuple[Any, float]] = None
+        self._closed = False
+        self.dropped = 0  # frames overwritten before inference read them
+
+    def put(self, frame: Any, ts: float) -> None:
+        """Offer a frame captured at `ts`, dropping any frame not read yet."""
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = (frame, ts)
+            self._cond.notify()
+
+    def get(self, timeout: float) -> Optional[Tuple[Any, float]]:
+        """
+        Take the newest unread frame.
+
+        Args:
+            timeout: Seconds to wait when no new frame is buffered.
+
+        Returns:
+            (frame, capture timestamp), or None on timeout or after close().
+        """
+        with self._cond:
+            if self._frame is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._frame = self._frame, None
+            return item
+
+    def close(self) -> None:
+        """Wake a waiting reader; the capture side has stopped."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class VisionSystem:
+    def __init__(
+        self,
+        on_emotion=None,
+        source=None,
+        target_fps: Optional[float] = None,
+        headless: Optional[bool] = None,
+        preview_fps: Optional[float] = None,
+        profile: Optional[VisionProfile] = None,
+        thresholds: Optional[EmotionThresholds] = None,
+    ):
+        """
+        Args:
+            on_emotion: Optional callback(label, timestamp) run for every
+                classified frame with a face, e.g. EmotionTrajectory.update.
+            source: Frame source with cv2.VideoCapture's read/isOpened/release,
+                e.g. a frame_sources source (default: Config.VISION_SOURCE).
+            target_fps: Most frames classified per second; 0 classifies every
+                frame (default: Config.VISION_TARGET_FPS).
+            headless: Skip all drawing and windows (default: Config.VISION_HEADLESS,
+                or True when there is no display).
+            preview_fps: Debug window refresh rate when not headless
+                (default: Config.VISION_PREVIEW_FPS).
+            profile: Face Mesh cost/accuracy settings (default: vision_profile()).
+            thresholds: Mouth-shape cut-offs for the labels
+                (default: emotion_geometry.default_thresholds()).
+        """
         self.current_emotion = "neutral"
+        self.on_emotion = on_emotion
+        self.source = source
+        self.target_fps = Config.VISION_TARGET_FPS if target_fps is None else target_fps
+        self.read_backoff_max = Config.VISION_READ_BACKOFF_MAX
+        if headless is None:
+            headless = Config.VISION_HEADLESS or not display_available()
+        self.headless = headless
+        self.preview_fps = Config.VISION_PREVIEW_FPS if preview_fps is None else preview_fps
+        self.profile = profile or vision_profile()
+        self.thresholds = thresholds
         self.is_running = False
-        self.thread = None
-        
+        self.threads = []
+
+        self._frames = LatestFrame()
+        self._preview_frame = None  # newest captured frame, read by the preview thread
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.read_failures = 0
+        self.faces_lost = 0
+        self._roi: Optional[Tuple[int, int, int, int]] = None  # last face box (x0, y0, x1, y1) in pixels
+        self.last_score = 0.0  # smile ratio of the newest face
+        self.last_mouth_open = 0.0
+        self.label_ts = 0.0  # capture time of the frame behind current_emotion
+        self.frame_ts = 0.0  # capture time of the newest classified frame
+        self._infer_seconds = 0.0  # moving average of one inference
+
         # Initialize MediaPipe (The "Math" Brain)
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
             max_num_faces=1,
-            refine_landmarks=True,
+            refine_landmarks=self.profile.refine_landmarks,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
 
     def start(self):
-        """Starts the vision loop in a background thread."""
+        """Starts the capture and inference threads."""
         if self.is_running: return
-        
+
         self.is_running = True
-        self.thread = threading.Thread(target=self._update_loop, daemon=True)
-        self.thread.start()
+        self._frames = LatestFrame()
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="vision-capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="vision-inference", daemon=True),
+        ]
+        if not self.headless:
+            self.threads.append(threading.Thread(target=self._preview_loop, name="vision-preview", daemon=True))
+        for thread in self.threads:
+            thread.start()
         print("✅ Vision Module Started (MediaPipe)")
 
     def stop(self):
-        """Stops the vision loop safely."""
+        """Stops both threads safely."""
         self.is_running = False
-        if self.thread:
-            self.thread.join(timeout=2.0)
+        for thread in self.threads:
+            thread.join(timeout=2.0)
         print("🛑 Vision Module Stopped")
 
     def get_emotion(self):
         """Returns the latest detected emotion."""
         return self.current_emotion
 
-    def _update_loop(self):
-        """Internal loop that reads camera and calculates emotion."""
-        cap = cv2.VideoCapture(1)
-        if not cap.isOpened(): cap = cv2.VideoCapture(0)
+    def stats(self) -> Dict[str, Any]:
+        """Frame counts, inference cost and how old the newest classified frame is."""
+        return {
+            "profile": self.profile.name,
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self._frames.dropped,
+            "read_failures": self.read_failures,
+            "faces_lost": self.faces_lost,
+            "inference_ms": round(self._infer_seconds * 1000, 1),
+            "frame_age_ms": round((time.time() - self.frame_ts) * 1000) if self.frame_ts else None,
+        }
+
+    def _open_source(self):
+        if self.source is not None:
+            return self.source
+        return open_source(Config.VISION_SOURCE)
+
+    # ========== CAPTURE ==========
+
+    def _capture_loop(self):
+        """Read frames as fast as the camera delivers them; keep only the newest."""
+        try:
+            cap = self._open_source()
+        except OSError as e:
+            # A missing recording ends the pipeline like a missing camera does
+            logger.warning(f"⚠️ Cannot open vision source ({e}), emotion stays neutral")
+            self.is_running = False
+            self._frames.close()
+            return
+        if not cap.isOpened():
+            logger.warning("⚠️ No camera or recording available, emotion stays neutral")
+        backoff = 0.0
 
         while self.is_running and cap.isOpened():
             ret, frame = cap.read()
-            if not ret: continue
+            if not ret and not getattr(cap, "live", True):
+                break  # end of a recording
+            if not ret:
+                # Camera busy or unplugged: back off instead of spinning on read()
+                self.read_failures += 1
+                backoff = min(self.read_backoff_max, backoff * 2 if backoff else READ_BACKOFF_START)
+                time.sleep(backoff)
+                continue
+            backoff = 0.0
+            self.frames_read += 1
+            self._frames.put(frame, time.time())
+            self._preview_frame = frame
+
+        if self.read_failures:
+            logger.info(f"👁️ Camera reads failed {self.read_failures} times")
+        self.is_running = False
+        self._frames.close()
+        cap.release()
+
+    # ========== PREVIEW ==========
+
+    def _preview_loop(self):
+        """Redraw the debug window at preview_fps until stopped or 'q' is pressed."""
+        period = 1.0 / self.preview_fps
+        try:
+            while self.is_running:
+                start = time.perf_counter()
+                frame = self._preview_frame
+                if frame is not None and not self._show(frame):
+                    self.is_running = False
+                    break
+                time.sleep(max(0.0, period - (time.perf_counter() - start)))
+            cv2.destroyAllWindows()
+        except cv2.error as e:
+            # No display (or an OpenCV build without GUI): carry on headless
+            logger.warning(f"⚠️ Vision preview unavailable, running headless: {e}")
+
+    def _show(self, frame) -> bool:
+        """Draw the current label on the frame and show it; False when 'q' is pressed."""
+        # The frame may be under inference right now: draw on a copy
+        frame = frame.copy()
+        if self.label_ts:
+            # Visual Feedback
+            cv2.putText(frame, f"Mood: {self.current_emotion.upper()}", (20, 50),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, MOOD_COLORS[self.current_emotion], 2)
+
+            # Debug Score
+            cv2.putText(frame, f"Score: {self.last_score:.4f}", (20, 80),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200,200,200), 1)
+
+        cv2.imshow('Therapist Eyes (MediaPipe)', frame)
+        return cv2.waitKey(1) & 0xFF != ord('q')
+
+    # ========== INFERENCE ==========
+
+    def _inference_loop(self):
+        """Classify the newest frame, at most target_fps times per second."""
+        while self.is_running:
+            item = self._frames.get(timeout=0.5)
+            if item is None:
+                continue
+            frame, ts = item
+
+            start = time.perf_counter()
+            self.process_frame(frame, ts)
+            elapsed = time.perf_counter() - start
+            self._infer_seconds += (elapsed - self._infer_seconds) * 0.2
+
+            # Sit out the rest of the period; frames captured meanwhile are
+            # dropped, and when inference is slower than the period none are waited for
+            if self.target_fps > 0:
+                time.sleep(max(0.0, 1.0 / self.target_fps - elapsed))
 
-            # Convert to RGB for MediaPipe
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def _crop(self, frame) -> Tuple[Any, Tuple[int, int, int, int]]:
+        """The region to search: the tracked face box, or the whole frame."""
+        if self._roi is None:
+            return frame, (0, 0, frame.shape[1], frame.shape[0])
+        x0, y0, x1, y1 = self._roi
+        return frame[y0:y1, x0:x1], self._roi
+
+    def _track(self, landmarks, region: Tuple[int, int, int, int], frame_w: int, frame_h: int) -> None:
+        """
+        Set the next search region from this frame's face box plus a margin.
+
+        The region only moves once the face drifts into the outer half of the
+        margin (or changes size): every move shifts the face within the crop,
+        which breaks Face Mesh's own frame-to-frame tracking for one frame.
+        """
+        x0, y0, x1, y1 = region
+        outline = [landmarks[i] for i in FACE_OVAL]
+        xs = [p.x for p in outline]
+        ys = [p.y for p in outline]
+        left, right = x0 + min(xs) * (x1 - x0), x0 + max(xs) * (x1 - x0)
+        top, bottom = y0 + min(ys) * (y1 - y0), y0 + max(ys) * (y1 - y0)
+        margin = max(right - left, bottom - top) * self.profile.roi_margin
+
+        if self._roi is not None:
+            rx0, ry0, rx1, ry1 = self._roi
+            slack = margin / 2
+            inside = (
+                left - rx0 >= min(slack, left) and top - ry0 >= min(slack, top)
+                and rx1 - right >= min(slack, frame_w - right) and ry1 - bottom >= min(slack, frame_h - bottom)
+            )
+            if inside and (rx1 - rx0) <= (right - left + 2 * margin) * 1.5:
+                return
+        self._roi = (
+            max(0, int(left - margin)), max(0, int(top - margin)),
+            min(frame_w, int(right + margin)), min(frame_h, int(bottom + margin)),
+        )
+
+    def mouth_landmarks(self, frame) -> Optional[np.ndarray]:
+        """
+        Run Face Mesh on one BGR frame and return the mouth points.
+
+        Args:
+            frame: BGR image, as read from the camera.
+
+        Returns:
+            (4, 3) array of emotion_geometry.MOUTH_POINTS, normalized to the
+            full frame, or None when no face was found.
+        """
+        image, region = self._crop(frame)
+        limit = self.profile.input_width if self._roi is None else ROI_INPUT_SIZE
+        scale = limit / max(image.shape[:2]) if self._roi is not None else limit / image.shape[1]
+        if limit and scale < 1:
+            # Landmarks come back normalized, so scaling needs no correction
+            size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+
+        # Convert to RGB for MediaPipe
+        rgb_frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with metrics.span("vision"):
             results = self.face_mesh.process(rgb_frame)
-            
-            detected_emotion = "neutral"
-            color = (255, 255, 0)
-
-            if results.multi_face_landmarks:
-                for face_landmarks in results.multi_face_landmarks:
-                    # --- GEOMETRY LOGIC (The "Math") ---
-                    landmarks = face_landmarks.landmark
-                    
-                    # Points: 13=UpperLip, 14=LowerLip, 61=LeftCorner, 291=RightCorner
-                    upper_lip = landmarks[13].y
-                    lower_lip = landmarks[14].y
-                    left_corner = landmarks[61].y
-                    right_corner = landmarks[291].y
-                    
-                    # Ratios
-                    mouth_open_dist = lower_lip - upper_lip
-                    lip_center_y = (upper_lip + lower_lip) / 2
-                    corner_avg_y = (left_corner + right_corner) / 2
-                    smile_ratio = lip_center_y - corner_avg_y
-                    
-                    # Classification (Tuned for stability)
-                    if smile_ratio > 0.02: 
-                        detected_emotion = "happy"
-                        color = (0, 255, 0)
-                    elif mouth_open_dist > 0.05:
-                        detected_emotion = "surprise"
-                        color = (255, 165, 0)
-                    elif smile_ratio < -0.015:
-                        detected_emotion = "sad"
-                        color = (0, 0, 255)
-                    else:
-                        detected_emotion = "neutral"
-                        color = (255, 255, 0)
-
-                    # Update shared variable
-                    self.current_emotion = detected_emotion
-
-                    # Visual Feedback
-                    cv2.putText(frame, f"Mood: {self.current_emotion.upper()}", (20, 50), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-                    
-                    # Debug Score
-                    cv2.putText(frame, f"Score: {smile_ratio:.4f}", (20, 80), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200,200,200), 1)
-
-            cv2.imshow('Therapist Eyes (MediaPipe)', frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                self.is_running = False
-                break
+            if not results.multi_face_landmarks and self._roi is not None:
+                # Face Mesh drops its own track on a miss: search this crop from scratch
+                results = self.face_mesh.process(rgb_frame)
+        self.frames_processed += 1
 
-        cap.release()
-        cv2.destroyAllWindows()
\ No newline at end of file
+        if not results.multi_face_landmarks:
+            if self._roi is not None:
+                # Tracking lost: search the whole frame next time
+                self.faces_lost += 1
+                self._roi = None
+            return None
+
+        landmarks = results.multi_face_landmarks[0].landmark
+        frame_h, frame_w = frame.shape[:2]
+        if self.profile.roi_tracking:
+            self._track(landmarks, region, frame_w, frame_h)
+
+        # Back to full-frame terms (the thresholds are tuned on whole frames)
+        x0, y0, x1, y1 = region
+        return np.array([
+            ((x0 + landmarks[i].x * (x1 - x0)) / frame_w, (y0 + landmarks[i].y * (y1 - y0)) / frame_h, landmarks[i].z)
+            for i in MOUTH_POINTS
+        ])
+
+    def process_frame(self, frame, ts: float) -> Optional[str]:
+        """
+        Run Face Mesh on one BGR frame and update the label if a face is found.
+
+        Args:
+            frame: BGR image, as read from the camera.
+            ts: Capture time (epoch seconds).
+
+        Returns:
+            The detected label, or None when no face was found.
+        """
+        points = self.mouth_landmarks(frame)
+        self.frame_ts = ts
+        if points is None:
+            return None
+
+        result = classify_landmarks(points[np.newaxis], self.thresholds)
+        detected_emotion = str(result.labels[0])
+
+        # Update shared variable
+        self.current_emotion = detected_emotion
+        self.last_score = float(result.smile_ratio[0])
+        self.last_mouth_open = float(result.mouth_open[0])
+        self.label_ts = ts
+        if self.on_emotion:
+            self.on_emotion(detected_emotion, ts)
+        return detected_emotion
@@ -17,6 +17,7 @@ export interface ChatResponse {
   emotion: string;
   crisis_detected: boolean;
   playbook?: string;
+  fallback?: boolean;
   error?: string;
 }
 
@@ -99,6 +100,76 @@ class ApiService {
     }
   }
 
+  /**
+   * Send a message and receive the reply incrementally over Server-Sent Events.
+   * `onToken` fires for each partial chunk; the resolved value is the final
+   * payload, whose `response` replaces any partial text (e.g. on fallback).
+   */
+  async sendMessageStream(
+    message: string,
+    emotion: string = 'neutral',
+    onToken: (text: string) => void = () => {}
+  ): Promise<ChatResponse> {
+    try {
+      if (!this.sessionId) {
+        await this.startSession();
+      }
+
+      const response = await fetch(`${API_URL}/api/chat/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Accept': 'text/event-stream',
+        },
+        body: JSON.stringify({
+          session_id: this.sessionId,
+          message,
+          emotion,
+        }),
+      });
+
+      if (!response.ok || !response.body) {
+        const data = await response.json();
+        throw new Error(data.error || 'Failed to send message');
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let final: ChatResponse | null = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop() || '';
+
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = frame.match(/^data: (.*)$/m)?.[1];
+          if (!data) continue;
+
+          if (event === 'token') {
+            onToken(JSON.parse(data).text);
+          } else if (event === 'done') {
+            final = JSON.parse(data);
+          }
+        }
+      }
+
+      if (!final || !final.success) {
+        throw new Error(final?.error || 'Stream ended without a response');
+      }
+
+      return final;
+    } catch (error) {
+      console.error('Error streaming message:', error);
+      throw error;
+    }
+  }
+
   /**
    * Get session summary
    */